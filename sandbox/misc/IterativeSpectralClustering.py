@@ -37,7 +37,7 @@ class IterativeSpectralClustering(object):
         
         :param k4: The number of random projections to use with randomised SVD 
         
-        :param alg: The algorithm to use: "exact", "IASC", "nystrom", "randomisedSvd" or "efficientNystrom" clustering
+        :param alg: The algorithm to use: "exact", "IASC", "nystrom", "randomisedSvd", "streamRandomisedSvd" or "efficientNystrom" clustering
         
         :param T: The number of iterations before eigenvectors are recomputed in IASC 
         """
@@ -47,7 +47,7 @@ class IterativeSpectralClustering(object):
         Parameter.checkInt(k4, 1, float('inf'))
         Parameter.checkInt(T, 1, float('inf'))
         
-        if alg not in ["exact", "IASC", "nystrom", "efficientNystrom", "randomisedSvd"]: 
+        if alg not in ["exact", "IASC", "nystrom", "efficientNystrom", "randomisedSvd", "streamRandomisedSvd"]: 
             raise ValueError("Invalid algorithm : " + str(alg))
 
         self.k1 = k1
@@ -147,6 +147,8 @@ class IterativeSpectralClustering(object):
                 omega, Q = EfficientNystrom.eigWeight(subW, self.k2, self.k1)
             elif self.alg == "randomisedSvd": 
                 Q, omega, R = RandomisedSVD.svd(ABBA, self.k4)
+            elif self.alg == "streamRandomisedSvd": 
+                Q, omega, R = RandomisedSVD.streamSvd(RandomisedSVD.rowBlocks(ABBA), ABBA.shape, self.k4)
             else:
                 raise ValueError("Invalid Algorithm: " + str(self.alg))
 
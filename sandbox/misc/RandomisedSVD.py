@@ -82,4 +82,93 @@ class RandomisedSVD(object):
         
         return U, s, V 
         
-        
\ No newline at end of file
+    @staticmethod 
+    def streamSvd(blocks, shape, k, p=10, omega=None): 
+        """
+        Compute the rank k SVD of a matrix A in a single pass over consecutive blocks 
+        of its rows using the algorithm of Tropp et al., Practical sketching algorithms 
+        for low-rank matrix approximation, 2017. The column space is sketched with 
+        Y = A Omega and the row space with W = Psi A at the same time, so only one 
+        block of A is in memory at once. Returns U, s, V such that A ~ U s V.T. 
+        
+        :param blocks: An iterable of row blocks of A as arrays, sparse matrices or GeneralLinearOperators 
+        
+        :param shape: The shape of A 
+        
+        :param k: The number of singular values 
+        
+        :param p: The oversampling parameter 
+        
+        :param omega: An initial matrix to perform random projections onto with at least k columns 
+        """
+        Parameter.checkInt(k, 1, float("inf"))
+        Parameter.checkInt(p, 0, float("inf"))   
+        
+        m, n = shape 
+        if omega is None: 
+            omega = numpy.random.randn(n, k+p)
+        else: 
+            omega = numpy.c_[omega, numpy.random.randn(n, p)]
+        
+        l = omega.shape[1]
+        l2 = 2*l + 1 
+        Y = numpy.zeros((m, l))
+        Psi = numpy.zeros((m, l2))
+        W = numpy.zeros((l2, n))
+        i = 0 
+        
+        for block in blocks: 
+            b = block.shape[0]
+            if i+b > m: 
+                raise ValueError("Blocks have more than " + str(m) + " rows")
+            
+            Psi[i:i+b, :] = numpy.random.randn(b, l2)
+            
+            if isinstance(block, GeneralLinearOperator): 
+                Y[i:i+b, :] = block.matmat(omega)
+                W += block.rmatmat(Psi[i:i+b, :]).T 
+            else: 
+                Y[i:i+b, :] = block.dot(omega)
+                W += numpy.asarray(block.T.dot(Psi[i:i+b, :])).T 
+            i += b 
+                
+        if i != m: 
+            raise ValueError("Blocks have " + str(i) + " rows but expected " + str(m))
+        
+        Q, R = numpy.linalg.qr(Y)
+        del Y 
+        B = numpy.linalg.lstsq(Psi.T.dot(Q), W, rcond=-1)[0]
+        del Psi, W 
+        
+        U, s, V = numpy.linalg.svd(B, full_matrices=False)
+        V = V.T
+        U = Q.dot(U)
+        
+        return U[:, 0:k], s[0:k], V[:, 0:k] 
+
+    @staticmethod 
+    def rowBlocks(X, blockSize=1000): 
+        """
+        Iterate over consecutive blocks of blockSize rows of X, for use with streamSvd. 
+        X is an array, a scipy.sparse matrix or a tuple (data, indices, indptr, shape) 
+        of CSR arrays. In the latter case the arrays can be numpy.memmap objects, and 
+        only the non-zeros of one block are read at a time. 
+        """
+        Parameter.checkInt(blockSize, 1, float("inf"))
+        
+        if type(X) == tuple: 
+            data, indices, indptr, shape = X 
+            
+            for i in range(0, shape[0], blockSize): 
+                j = min(i+blockSize, shape[0])
+                start, end = indptr[i], indptr[j]
+                blockIndptr = numpy.array(indptr[i:j+1]) - start 
+                yield scipy.sparse.csr_matrix((numpy.array(data[start:end]), numpy.array(indices[start:end]), blockIndptr), shape=(j-i, shape[1]))
+        else: 
+            if hasattr(X, "toScipyCsr"): 
+                X = X.toScipyCsr()
+            elif scipy.sparse.issparse(X): 
+                X = X.tocsr()
+                
+            for i in range(0, X.shape[0], blockSize): 
+                yield X[i:i+blockSize, :]
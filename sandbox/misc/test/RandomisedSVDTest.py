@@ -1,5 +1,8 @@
 
 
+import os
+import shutil
+import tempfile
 import unittest
 import numpy
 import scipy.sparse 
@@ -105,7 +108,50 @@ class  RandomisedSVDTest(unittest.TestCase):
             U3, s3, V3 = RandomisedSVD.updateSvd(X, U, s, V, E, k)
             error4 = numpy.linalg.norm(XE - (U2*s2).dot(V2.T))
             self.assertEquals(error4, error2)
+
+    def testStreamSvd(self): 
+        m, n = 200, 80 
+        r = 5 
+        k = 5 
+        A = numpy.random.randn(m, r).dot(numpy.random.randn(r, n)) + numpy.random.randn(m, n)*0.01
+        
+        for blockSize in [1, 17, 1000]: 
+            U, s, V = RandomisedSVD.streamSvd(RandomisedSVD.rowBlocks(A, blockSize), A.shape, k)
+            
+            nptst.assert_array_almost_equal(U.T.dot(U), numpy.eye(k))
+            nptst.assert_array_almost_equal(V.T.dot(V), numpy.eye(k))
+            s2 = numpy.linalg.svd(A, compute_uv=False)
+            nptst.assert_array_almost_equal(s/s2[0:k], numpy.ones(k), 2)
+            self.assertTrue(numpy.linalg.norm(A - (U*s).dot(V.T)) <= 2*numpy.linalg.norm(s2[k:]))
+        
+        #Sparse blocks and an initial omega 
+        X = scipy.sparse.rand(m, n, 0.1, format="csr")
+        U, s, V = RandomisedSVD.streamSvd(RandomisedSVD.rowBlocks(X, 30), X.shape, 10, omega=numpy.random.randn(n, 20))
+        self.assertEquals(U.shape, (m, 10))
+        self.assertEquals(V.shape, (n, 10))
+        s2 = numpy.linalg.svd(X.toarray(), compute_uv=False)
+        self.assertTrue(numpy.linalg.norm(X.toarray() - (U*s).dot(V.T)) <= 2*numpy.linalg.norm(s2[10:]))
+        
+        self.assertRaises(ValueError, RandomisedSVD.streamSvd, RandomisedSVD.rowBlocks(A, 30), (m+1, n), k)
+        self.assertRaises(ValueError, RandomisedSVD.streamSvd, RandomisedSVD.rowBlocks(A, 30), (m-1, n), k)
+
+    def testRowBlocks(self): 
+        X = scipy.sparse.rand(53, 20, 0.2, format="csr")
+        
+        dirName = tempfile.mkdtemp()
+        arrays = []
+        for name in ["data", "indices", "indptr"]: 
+            fileName = os.path.join(dirName, name + ".npy")
+            numpy.save(fileName, getattr(X, name))
+            arrays.append(numpy.load(fileName, mmap_mode="r"))
+        
+        blocks = list(RandomisedSVD.rowBlocks(tuple(arrays) + (X.shape, ), 10))
+        self.assertEquals(len(blocks), 6)
+        nptst.assert_array_equal(scipy.sparse.vstack(blocks).toarray(), X.toarray())
         
+        blocks = list(RandomisedSVD.rowBlocks(X.toarray(), 10))
+        nptst.assert_array_equal(numpy.vstack(blocks), X.toarray())
+        shutil.rmtree(dirName)
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,6 +7,7 @@ from sandbox.util.Util import Util
 from sandbox.util.Evaluator import Evaluator 
 from sandbox.util.Parameter import Parameter
 from sandbox.util.Sampling import Sampling
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 import numpy
 import logging
 import gc
@@ -334,32 +335,30 @@ class AbstractPredictor(object):
             
         meanErrors = numpy.zeros(tuple(gridSize))
         m = 0
-        paramList = []
+        executor = ModelSelectExecutor(self, self.processes, self.chunkSize)
+        try: 
+            tasks = []
         
-        for trainInds, testInds in idx:
-            trainX, trainY = X[trainInds, :], y[trainInds]
-            testX, testY = X[testInds, :], y[testInds]
+            for trainInds, testInds in idx:
+                foldInd = executor.addFold(X[trainInds, :], y[trainInds], X[testInds, :], y[testInds])
             
-            indexIter = itertools.product(*gridInds)
+                indexIter = itertools.product(*gridInds)
             
-            for inds in indexIter: 
-                learner = self.copy()     
-                currentInd = 0             
+                for inds in indexIter: 
+                    params = {}
+                    currentInd = 0             
             
-                for key, val in paramDict.items():
-                    method = getattr(learner, key)
-                    method(val[inds[currentInd]])
-                    currentInd += 1                    
+                    for key, val in paramDict.items():
+                        params[key] = val[inds[currentInd]]
+                        currentInd += 1                    
                 
-                paramList.append((trainX, trainY, testX, testY, learner))
+                    tasks.append((foldInd, params))
             
-            m += 1 
+                m += 1 
             
-        if self.processes != 1: 
-            pool = multiprocessing.Pool(processes=self.processes, maxtasksperchild=100)
-            resultsIterator = pool.imap(computeTestError, paramList, self.chunkSize)
-        else: 
-            resultsIterator = itertools.imap(computeTestError, paramList)
+            resultsIterator = iter(executor.map(computeTestError, tasks))
+        finally: 
+            executor.close()
         
         for trainInds, testInds in idx:
             indexIter = itertools.product(*gridInds)
@@ -367,9 +366,6 @@ class AbstractPredictor(object):
                 error = resultsIterator.next()
                 meanErrors[inds] += error/float(folds)
 
-        if self.processes != 1:
-            pool.terminate()
-
         learner = self.getBestLearner(meanErrors, paramDict, X, y, idx)
 
         return learner, meanErrors
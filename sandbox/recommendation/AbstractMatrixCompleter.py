@@ -1,4 +1,5 @@
 from sandbox.util.Parameter import Parameter 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 import numpy 
 import multiprocessing
 import itertools 
@@ -45,42 +46,44 @@ class AbstractMatrixCompleter(object):
             
         meanErrors = numpy.zeros(tuple(gridSize))
         m = 0
-        paramList = []
+        executor = ModelSelectExecutor(self, self.processes, self.chunkSize)
+        try: 
+            tasks = []
         
-        rowInds, colInds = X.nonzero()
+            rowInds, colInds = X.nonzero()
         
-        for trainInds, testInds in idx:
-            trainX = scipy.sparse.lil_matrix(X.shape)
-            testX = scipy.sparse.lil_matrix(X.shape)
+            for trainInds, testInds in idx:
+                trainX = scipy.sparse.lil_matrix(X.shape)
+                testX = scipy.sparse.lil_matrix(X.shape)
             
-            for i in range(trainInds.shape[0]): 
-                trainX[rowInds[trainInds[i]], colInds[trainInds[i]]] = X[rowInds[trainInds[i]], colInds[trainInds[i]]]
+                for i in range(trainInds.shape[0]): 
+                    trainX[rowInds[trainInds[i]], colInds[trainInds[i]]] = X[rowInds[trainInds[i]], colInds[trainInds[i]]]
             
-            trainX = trainX.tocsr()
+                trainX = trainX.tocsr()
             
-            for i in range(testInds.shape[0]): 
-                testX[rowInds[testInds[i]], colInds[testInds[i]]] = X[rowInds[testInds[i]], colInds[testInds[i]]]
+                for i in range(testInds.shape[0]): 
+                    testX[rowInds[testInds[i]], colInds[testInds[i]]] = X[rowInds[testInds[i]], colInds[testInds[i]]]
                 
-            testX = testX.tocsr()
+                testX = testX.tocsr()
             
-            indexIter = itertools.product(*gridInds)
+                foldInd = executor.addFold(trainX, testX)
+                indexIter = itertools.product(*gridInds)
             
-            for inds in indexIter: 
-                learner = self.copy()     
-                currentInd = 0             
+                for inds in indexIter: 
+                    params = {}
+                    currentInd = 0             
             
-                for key, val in paramDict.items():
-                    method = getattr(learner, key)
-                    method(val[inds[currentInd]])
-                    currentInd += 1                    
+                    for key, val in paramDict.items():
+                        params[key] = val[inds[currentInd]]
+                        currentInd += 1                    
                 
-                paramList.append((trainX, testX, learner))
+                    tasks.append((foldInd, params))
             
-            m += 1 
+                m += 1 
             
-        pool = multiprocessing.Pool(processes=self.processes, maxtasksperchild=100)
-        resultsIterator = pool.imap(computeTestError, paramList, self.chunkSize)
-        #resultsIterator = itertools.imap(computeTestError, paramList)
+            resultsIterator = iter(executor.map(computeTestError, tasks))
+        finally: 
+            executor.close()
         
         for trainInds, testInds in idx:
             indexIter = itertools.product(*gridInds)
@@ -88,8 +91,6 @@ class AbstractMatrixCompleter(object):
                 error = resultsIterator.next()
                 meanErrors[inds] += error/float(folds)
 
-        pool.terminate()
-
         learner = self.getBestLearner(meanErrors, paramDict, X, idx)
 
         return learner, meanErrors
@@ -1,4 +1,8 @@
 import multiprocessing
+import numpy 
+import scipy.sparse 
+from sandbox.util.MCEvaluator import MCEvaluator 
+from sandbox.recommendation.MipsIndex import MipsIndex 
 
 class AbstractRecommender(object): 
     """
@@ -16,19 +20,122 @@ class AbstractRecommender(object):
         self.chunkSize = 1 
         self.metric = "f1"
         
+        #Parameters of the approximate top-k index used by predict 
+        self.mipsNumClusters = 100 
+        self.mipsNumProbes = 10 
+        
+        #The over-allocated arrays which hold factors grown by appendRows 
+        self.rowBuffers = {}
+        
+    def appendRows(self, name, newRows): 
+        """
+        Append newRows to the array attribute called name, for example U or V, and 
+        return the indices of the new rows. The attribute is a view of a buffer whose 
+        capacity is doubled when it is full, so appending takes amortised constant time 
+        per row. 
+        """
+        A = getattr(self, name)
+        buffer = self.rowBuffers.get(name, None)
+        numRows = A.shape[0]
+        numNewRows = newRows.shape[0]
+        
+        #Reallocate if the attribute was replaced, e.g. by learnModel, or the buffer is full 
+        if buffer is None or A.base is not buffer or buffer.shape[0] < numRows + numNewRows: 
+            buffer = numpy.empty((max(2*numRows, numRows + numNewRows), ) + A.shape[1:], A.dtype)
+            buffer[0:numRows] = A
+            self.rowBuffers[name] = buffer
+        
+        buffer[numRows:numRows+numNewRows] = newRows
+        setattr(self, name, buffer[0:numRows+numNewRows])
+        
+        return numpy.arange(numRows, numRows+numNewRows)
+        
+    def foldInUsers(self, X): 
+        """
+        Learn the factors of new users, the rows of the sparse matrix X of their 
+        interactions with the current items, keeping V fixed. The factors are appended 
+        to U and the indices of the new users are returned. 
+        """
+        if X.shape[1] != self.V.shape[0]: 
+            raise ValueError("Expected " + str(self.V.shape[0]) + " columns, not " + str(X.shape[1]))
+        
+        return self.appendRows("U", self.foldInU(self.foldInMatrix(X)))
+        
+    def foldInItems(self, X): 
+        """
+        Learn the factors of new items, the columns of the sparse matrix X of the 
+        interactions of the current users with them, keeping U fixed. The factors are 
+        appended to V and the indices of the new items are returned. 
+        """
+        if X.shape[0] != self.U.shape[0]: 
+            raise ValueError("Expected " + str(self.U.shape[0]) + " rows, not " + str(X.shape[0]))
+        
+        return self.appendRows("V", self.foldInV(self.foldInMatrix(self.foldInMatrix(X).T)))
+        
+    @staticmethod 
+    def foldInMatrix(X): 
+        """
+        Convert a scipy matrix or csarray to a csr_matrix with sorted indices, whose rows 
+        are the users or items to fold in. 
+        """
+        if hasattr(X, "toScipyCsr"): 
+            X = X.toScipyCsr()
+        
+        X = scipy.sparse.csr_matrix(X)
+        X.sort_indices()
+        return X 
+        
     def copyParams(self, learner): 
         learner.recommendSize = self.recommendSize
         learner.validationSize = self.validationSize
         learner.folds = self.folds 
         learner.numProcesses = self.numProcesses
         learner.chunkSize = self.chunkSize
+        learner.mipsNumClusters = self.mipsNumClusters 
+        learner.mipsNumProbes = self.mipsNumProbes 
         
         return learner 
         
+    def getMipsIndex(self): 
+        """
+        Return a MipsIndex over the rows of V, which is rebuilt if V has changed since 
+        the last call. 
+        """
+        index = getattr(self, "mipsIndex", None)
+        
+        if index == None or index.V is not self.V or index.numClusters != self.mipsNumClusters: 
+            index = MipsIndex(self.mipsNumClusters, self.mipsNumProbes).build(self.V)
+            self.mipsIndex = index 
+        
+        index.numProbes = self.mipsNumProbes
+        return index 
+        
+    def predictApprox(self, maxItems): 
+        """
+        Return the approximate top maxItems items for each user using a MipsIndex 
+        over the item factors. 
+        """
+        return self.getMipsIndex().recommendAtk(self.U, maxItems)
+        
+    def predictIter(self, maxItems, blockSize=1000, omegaList=None): 
+        """
+        Yield tuples (userBlock, orderedItems, scores) of the top maxItems items for 
+        blocks of blockSize users using the learnt factors U and V. 
+        """
+        return MCEvaluator.recommendAtkIter(self.U, self.V, maxItems, blockSize, omegaList)
+        
+    def predictToFile(self, maxItems, fileName, blockSize=1000, omegaList=None): 
+        """
+        Write the top maxItems items for every user to memory-mapped .npy files 
+        starting with fileName. See MCEvaluator.recommendAtkToFile. 
+        """
+        return MCEvaluator.recommendAtkToFile(self.U, self.V, maxItems, fileName, blockSize, omegaList)
+        
     def __str__(self): 
         outputStr = " recommendSize=" + str(self.recommendSize) + " validationSize=" + str(self.validationSize) 
         outputStr += " folds=" + str(self.folds) + " numProcesses=" + str(self.numProcesses)
         outputStr += " chunkSize=" + str(self.chunkSize)
+        outputStr += " mipsNumClusters=" + str(self.mipsNumClusters) + " mipsNumProbes=" + str(self.mipsNumProbes)
 
         
         return outputStr 
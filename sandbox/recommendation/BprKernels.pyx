@@ -0,0 +1,168 @@
+#cython: profile=False
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: nonecheck=False
+#cython: cdivision=True
+import cython
+cimport numpy
+import numpy
+from cython.parallel import prange
+from libc.stdlib cimport malloc, free
+from sandbox.util.CythonUtils cimport RandomState, randomInt, newStream, aliasChoice
+
+"""
+Stochastic gradient updates of Bayesian Personalised Ranking (Rendle et al., 2009)
+on the CSR arrays indPtr and colInds of the positive items of each user. Each thread
+samples (user, positive item, negative item) triples from its own random stream and
+writes to U and V without locking, as in Hogwild (Niu et al., 2011).
+"""
+
+cdef extern from "math.h" nogil:
+    double exp(double x)
+
+cdef struct BprParams:
+    unsigned int k, n, maxNegTries
+    double gamma, lmbdaUser, lmbdaPos, lmbdaNeg
+
+cdef inline bint contains(unsigned int* colInds, unsigned int start, unsigned int end, unsigned int j) nogil:
+    """
+    Binary search for j in the sorted colInds[start:end].
+    """
+    cdef unsigned int mid
+
+    while start < end:
+        mid = (start + end)/2
+        if colInds[mid] < j:
+            start = mid + 1
+        elif colInds[mid] > j:
+            end = mid
+        else:
+            return True
+    return False
+
+cdef inline unsigned int sampleNegative(unsigned int* colInds, unsigned int start, unsigned int end, double* aliasProbs, unsigned int* aliases, unsigned int n, unsigned int maxNegTries, RandomState* state) nogil:
+    """
+    Return an item which is not in the sorted colInds[start:end], chosen uniformly or
+    with the alias table if aliasProbs is not NULL, or n if none is found in
+    maxNegTries draws.
+    """
+    cdef unsigned int tries, q
+
+    for tries in range(maxNegTries):
+        if aliasProbs != NULL:
+            q = aliasChoice(aliasProbs, aliases, n, state)
+        else:
+            q = randomInt(state, n)
+
+        if not contains(colInds, start, end, q):
+            return q
+    return n
+
+cdef void bprSteps(double* U, double* V, unsigned int* indPtr, unsigned int* colInds, unsigned int* users, unsigned int numUsers, double* aliasProbs, unsigned int* aliases, unsigned int numSteps, BprParams* params, RandomState* state) nogil:
+    """
+    Run numSteps updates with users chosen uniformly from users, a positive item chosen
+    uniformly from those of the user and a negative item chosen uniformly, or with the
+    alias table if aliasProbs is not NULL.
+    """
+    cdef unsigned int k = params.k
+    cdef unsigned int s, kk, i, p, q, start, end
+    cdef double x, z, ui, vp, vq
+
+    for s in range(numSteps):
+        i = users[randomInt(state, numUsers)]
+        start = indPtr[i]
+        end = indPtr[i+1]
+        p = colInds[start + randomInt(state, end-start)]
+
+        if end - start == params.n:
+            continue
+
+        q = sampleNegative(colInds, start, end, aliasProbs, aliases, params.n, params.maxNegTries, state)
+        if q == params.n:
+            continue
+
+        x = 0
+        for kk in range(k):
+            x += U[i*k+kk]*(V[p*k+kk] - V[q*k+kk])
+        z = 1/(1+exp(x))
+
+        for kk in range(k):
+            ui = U[i*k+kk]
+            vp = V[p*k+kk]
+            vq = V[q*k+kk]
+            U[i*k+kk] = ui + params.gamma*(z*(vp-vq) - params.lmbdaUser*ui)
+            V[p*k+kk] = vp + params.gamma*(z*ui - params.lmbdaPos*vp)
+            V[q*k+kk] = vq + params.gamma*(-z*ui - params.lmbdaNeg*vq)
+
+def updateBpr(unsigned int[::1] indPtr, unsigned int[::1] colInds, double[:, ::1] U, double[:, ::1] V, double[::1] aliasProbs, unsigned int[::1] aliases, unsigned int numSteps, double gamma, double lmbdaUser, double lmbdaPos, double lmbdaNeg, unsigned int numThreads=1, unsigned int maxNegTries=100):
+    """
+    Run numSteps BPR updates of U and V in place split evenly over numThreads threads.
+    The column indices of each row must be sorted. If aliasProbs is empty then the
+    negative items are uniform, otherwise they are sampled with the table made by
+    CythonUtils.aliasTable. A triple is skipped if no negative item is found in
+    maxNegTries draws.
+    """
+    cdef BprParams params
+    cdef unsigned int[::1] users = numpy.array(numpy.flatnonzero(numpy.diff(indPtr)), numpy.uint32)
+    cdef unsigned int numUsers = users.shape[0]
+    cdef unsigned int stepsPerThread, t
+    cdef double* aliasProbsPtr = NULL
+    cdef unsigned int* aliasesPtr = NULL
+    cdef RandomState* states
+
+    if U.shape[0] != indPtr.shape[0]-1 or U.shape[1] != V.shape[1]:
+        raise ValueError("U and V do not match indPtr")
+    if aliasProbs.shape[0] != 0 and (aliasProbs.shape[0] != V.shape[0] or aliases.shape[0] != V.shape[0]):
+        raise ValueError("The alias table must have one entry per item")
+    if numUsers == 0 or numSteps == 0:
+        return
+
+    params.k = U.shape[1]
+    params.n = V.shape[0]
+    params.maxNegTries = maxNegTries
+    params.gamma = gamma
+    params.lmbdaUser = lmbdaUser
+    params.lmbdaPos = lmbdaPos
+    params.lmbdaNeg = lmbdaNeg
+
+    if aliasProbs.shape[0] != 0:
+        aliasProbsPtr = &aliasProbs[0]
+        aliasesPtr = &aliases[0]
+
+    numThreads = max(numThreads, 1)
+    stepsPerThread = (numSteps + numThreads - 1)/numThreads
+    states = <RandomState*>malloc(numThreads*sizeof(RandomState))
+    if states == NULL:
+        raise MemoryError()
+
+    for t in range(numThreads):
+        newStream(&states[t])
+
+    try:
+        for t in prange(numThreads, nogil=True, num_threads=numThreads, schedule="static"):
+            bprSteps(&U[0, 0], &V[0, 0], &indPtr[0], &colInds[0], &users[0], numUsers, aliasProbsPtr, aliasesPtr, stepsPerThread, &params, &states[t])
+    finally:
+        free(states)
+
+def sampleNegatives(unsigned int[::1] indPtr, unsigned int[::1] colInds, unsigned int[::1] rowInds, unsigned int n, unsigned int maxNegTries=100):
+    """
+    Return an item chosen uniformly from range(n) for each row in rowInds which is not
+    one of the sorted column indices of that row, with the rejection sampling of
+    updateBpr. The item is n if none is found in maxNegTries draws.
+    """
+    cdef unsigned int[::1] negInds = numpy.zeros(rowInds.shape[0], numpy.uint32)
+    cdef unsigned int* colIndsPtr = NULL
+    cdef unsigned int s, i
+    cdef RandomState state
+
+    if rowInds.shape[0] != 0 and numpy.max(rowInds) >= indPtr.shape[0]-1:
+        raise ValueError("Row index out of range of indPtr")
+    if colInds.shape[0] != 0:
+        colIndsPtr = &colInds[0]
+
+    newStream(&state)
+    for s in range(rowInds.shape[0]):
+        i = rowInds[s]
+        negInds[s] = sampleNegative(colIndsPtr, indPtr[i], indPtr[i+1], NULL, NULL, n, maxNegTries, &state)
+
+    return numpy.asarray(negInds)
@@ -1,19 +1,24 @@
 """
-Wrapper to use gamboviol implementation of BPR.
+Bayesian Personalised Ranking learnt with the Hogwild updates of BprKernels.
 """
 
 import numpy 
 import logging
 import multiprocessing
+import scipy.special 
 from sandbox.util.MCEvaluator import MCEvaluator 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 from sandbox.util.Sampling import Sampling
-from bprCython import AllUserUniformItem, BPRArgs, BPR 
+from sandbox.util.SparseUtils import SparseUtils
+from sandbox.util.CythonUtils import aliasTable
+from sandbox.recommendation.BprKernels import updateBpr, sampleNegatives
 from sandbox.recommendation.RecommenderUtils import computeTestMRR, computeTestF1
 from sandbox.recommendation.AbstractRecommender import AbstractRecommender
 
 class BprRecommender(AbstractRecommender): 
     """
-    An interface to the BPR recommender system. 
+    The BPR recommender system, learnt by stochastic gradient ascent over sampled 
+    (user, positive item, negative item) triples. 
     """
     
     def __init__(self, k, lmbdaUser=0.1, lmbdaPos=0.1, lmbdaNeg=0.1, gamma=0.1, numProcesses=None): 
@@ -29,7 +34,11 @@ class BprRecommender(AbstractRecommender):
                 
         self.maxIterations = 25
         self.numAucSamples = 5
+        self.foldInIterations = 100 #Stochastic updates of each new user or item in foldInUsers and foldInItems 
         self.recordStep = 5
+        self.numThreads = 1 #Threads which update U and V without locking in learnModel 
+        self.negativeExp = 0.0 #Negative items are sampled with probability popularity**negativeExp
+        self.omegaPtr = None #The (indPtr, colInds) of the positive items of the training users, used by foldInV 
         
         #Model selection parameters 
         self.ks = 2**numpy.arange(3, 8)
@@ -40,23 +49,106 @@ class BprRecommender(AbstractRecommender):
         self.gammas = 2.0**-numpy.arange(1, 20, 4)
         
     def learnModel(self, X, U=None, V=None):
-        args = BPRArgs()
-        args.learning_rate = self.gamma
-        args.user_regularization = self.lmbdaUser
-        args.negative_item_regularization = self.lmbdaPos 
-        args.positive_item_regularization = self.lmbdaNeg
-        
-        model = BPR(self.k, args)
-        model.numAucSamples = self.numAucSamples
-        model.recordStep = self.recordStep 
-    
-        sampler = AllUserUniformItem()
-        user_factors, item_factors = model.train(X, sampler, self.maxIterations)
+        """
+        Learn the factors U and V from the sparse matrix X of positive items, which 
+        can be an InteractionStore whose arrays are used without a copy. Each 
+        iteration makes nnz(X) updates split over numThreads threads. The initial 
+        factors can be given with U and V. 
+        """
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        m, n = X.shape
+        
+        if U is None or V is None: 
+            U = numpy.random.randn(m, self.k)*0.1
+            V = numpy.random.randn(n, self.k)*0.1
         
-        self.U = user_factors
-        self.V = item_factors
+        U = numpy.array(U, numpy.float)
+        V = numpy.array(V, numpy.float)
+        
+        if self.negativeExp != 0: 
+            itemCounts = numpy.bincount(colInds, minlength=n) + 1.0
+            aliasProbs, aliases = aliasTable(itemCounts**self.negativeExp)
+        else: 
+            aliasProbs, aliases = numpy.zeros(0), numpy.zeros(0, numpy.uint32)
+        
+        for i in range(self.maxIterations): 
+            if i % self.recordStep == 0: 
+                aucApprox = MCEvaluator.localAUCApprox((indPtr, colInds), U, V, 0.0, self.numAucSamples)
+                logging.debug("Iteration " + str(i) + " AUC~" + str(aucApprox))
+            
+            updateBpr(indPtr, colInds, U, V, aliasProbs, aliases, colInds.shape[0], self.gamma, self.lmbdaUser, self.lmbdaPos, self.lmbdaNeg, self.numThreads)
+        
+        self.U = U
+        self.V = V
+        self.omegaPtr = (indPtr, colInds)
     
-    def predict(self, maxItems): 
+    def foldInU(self, X): 
+        """
+        Learn the factors of the users in the rows of the csr_matrix X with V fixed. At 
+        each step every new user is updated with the BPR loss of one of its items 
+        against an item chosen uniformly at random from the ones it does not have. 
+        """
+        U = numpy.zeros((X.shape[0], self.V.shape[1]))
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        
+        for s in range(self.foldInIterations): 
+            rowInds, posInds = self.sampleRows(X)
+            negInds = sampleNegatives(indPtr, colInds, numpy.array(rowInds, numpy.uint32), self.V.shape[0])
+            valid = negInds != self.V.shape[0]
+            rowInds, posInds, negInds = rowInds[valid], posInds[valid], negInds[valid]
+            
+            deltaV = self.V[posInds, :] - self.V[negInds, :]
+            z = scipy.special.expit(-(U[rowInds, :]*deltaV).sum(1))
+            U[rowInds, :] += self.gamma*(z[:, None]*deltaV - self.lmbdaUser*U[rowInds, :])
+            
+        return U 
+        
+    def foldInV(self, X): 
+        """
+        Learn the factors of the items in the rows of the csr_matrix X, whose columns are 
+        the users, with U fixed. At each step every new item is updated with the BPR loss 
+        of one of its users, ranking it against an item chosen uniformly at random from 
+        the ones the user does not have in the training matrix. 
+        """
+        if self.omegaPtr is None: 
+            raise ValueError("Learn the model before folding in items")
+        
+        V = numpy.zeros((X.shape[0], self.U.shape[1]))
+        indPtr, colInds = self.omegaPtr
+        #Users folded in after learning have no training items 
+        indPtr = numpy.array(numpy.r_[indPtr, numpy.repeat(indPtr[-1], self.U.shape[0]+1-indPtr.shape[0])], numpy.uint32)
+        
+        for s in range(self.foldInIterations): 
+            rowInds, userInds = self.sampleRows(X)
+            negInds = sampleNegatives(indPtr, colInds, numpy.array(userInds, numpy.uint32), self.V.shape[0])
+            valid = negInds != self.V.shape[0]
+            rowInds, userInds, negInds = rowInds[valid], userInds[valid], negInds[valid]
+            
+            Ui = self.U[userInds, :]
+            z = scipy.special.expit(-(Ui*(V[rowInds, :] - self.V[negInds, :])).sum(1))
+            V[rowInds, :] += self.gamma*(z[:, None]*Ui - self.lmbdaPos*V[rowInds, :])
+            
+        return V 
+        
+    @staticmethod 
+    def sampleRows(X): 
+        """
+        Return the nonempty rows of the csr_matrix X and one random column in each of them. 
+        """
+        counts = numpy.diff(X.indptr)
+        rowInds = numpy.flatnonzero(counts)
+        colInds = X.indices[X.indptr[rowInds] + numpy.array(numpy.random.rand(rowInds.shape[0])*counts[rowInds], numpy.int)]
+        
+        return rowInds, colInds 
+
+    def predict(self, maxItems, approximate=False): 
+        """
+        Return the top maxItems items for each user. If approximate is True then 
+        use a MipsIndex over the item factors, see mipsNumClusters and mipsNumProbes. 
+        """
+        if approximate: 
+            return self.predictApprox(maxItems)
+        
         return MCEvaluator.recommendAtk(self.U, self.V, maxItems)
         
     def modelSelect(self, X, colProbs=None): 
@@ -68,28 +160,22 @@ class BprRecommender(AbstractRecommender):
         testMetrics = numpy.zeros((self.ks.shape[0], self.lmbdaUsers.shape[0], self.lmbdaItems.shape[0], self.gammas.shape[0], len(trainTestXs)))
         
         logging.debug("Performing model selection with test leave out per row of " + str(self.validationSize))
-        paramList = []        
-        
-        for i, k in enumerate(self.ks): 
-            for j, lmbdaUser in enumerate(self.lmbdaUsers): 
-                for s, lmbdaItem in enumerate(self.lmbdaItems): 
-                    for t, gamma in enumerate(self.gammas):
-                        for icv, (trainX, testX) in enumerate(trainTestXs):
-                            learner = self.copy()
-                            learner.k = k  
-                            learner.lmbdaUser = lmbdaUser 
-                            learner.lmbdaPos = lmbdaItem
-                            learner.lmbdaNeg = lmbdaItem
-                            learner.gamma = gamma
-                        
-                            paramList.append((trainX, testX, learner))
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            foldInds = [executor.addFold(trainX, testX) for (trainX, testX) in trainTestXs]
+            tasks = []        
+        
+            for i, k in enumerate(self.ks): 
+                for j, lmbdaUser in enumerate(self.lmbdaUsers): 
+                    for s, lmbdaItem in enumerate(self.lmbdaItems): 
+                        for t, gamma in enumerate(self.gammas):
+                            for foldInd in foldInds:
+                                params = {"k": k, "lmbdaUser": lmbdaUser, "lmbdaPos": lmbdaItem, "lmbdaNeg": lmbdaItem, "gamma": gamma}
+                                tasks.append((foldInd, params))
             
-        if self.numProcesses != 1: 
-            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=100)
-            resultsIterator = pool.imap(computeTestF1, paramList, self.chunkSize)
-        else: 
-            import itertools
-            resultsIterator = itertools.imap(computeTestF1, paramList)
+            resultsIterator = iter(executor.map(computeTestF1, tasks))
+        finally: 
+            executor.close()
         
         for i, k in enumerate(self.ks): 
             for j, lmbdaUser in enumerate(self.lmbdaUsers): 
@@ -97,9 +183,6 @@ class BprRecommender(AbstractRecommender):
                     for t, gamma in enumerate(self.gammas):
                         for icv, (trainX, testX) in enumerate(trainTestXs):        
                             testMetrics[i, j, s, t, icv] = resultsIterator.next()
-                
-        if self.numProcesses != 1: 
-            pool.terminate()
         
         meanTestMetrics = numpy.mean(testMetrics, 4)
         stdTestMetrics = numpy.std(testMetrics, 4)
@@ -128,6 +211,9 @@ class BprRecommender(AbstractRecommender):
         learner.maxIterations = self.maxIterations 
         learner.numAucSamples = self.numAucSamples
         learner.recordStep = self.recordStep
+        learner.foldInIterations = self.foldInIterations
+        learner.numThreads = self.numThreads
+        learner.negativeExp = self.negativeExp
         
         return learner 
 
@@ -140,6 +226,8 @@ class BprRecommender(AbstractRecommender):
         outputStr += " maxIterations=" + str(self.maxIterations)
         outputStr += " numAucSamples=" + str(self.numAucSamples)
         outputStr += " recordStep=" + str(self.recordStep)
+        outputStr += " numThreads=" + str(self.numThreads)
+        outputStr += " negativeExp=" + str(self.negativeExp)
         outputStr += super(BprRecommender, self).__str__()
         
         return outputStr   
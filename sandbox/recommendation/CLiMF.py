@@ -10,6 +10,7 @@ import logging
 import multiprocessing
 import itertools
 from sandbox.util.MCEvaluator import MCEvaluator 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 from sandbox.util.PathDefaults import PathDefaults
 from sandbox.util.Sampling import Sampling
 from sandbox.util.SparseUtils import SparseUtils
@@ -46,12 +47,14 @@ class CLiMF(AbstractRecommender):
         self.lmbdas = 2.0**-numpy.arange(1, 20, 4)
         self.gammas = 2.0**-numpy.arange(1, 20, 4)
         self.verbose=1
+        self.initSeed = None #If not None, initUV draws the same factors for every call with a given k
         
     def initUV(self, X, k=None):
         if k == None:
             k=self.k 
-        U = 0.01*numpy.random.random_sample((X.shape[0],k))
-        V = 0.01*numpy.random.random_sample((X.shape[1],k))
+        randomState = numpy.random.RandomState(self.initSeed) if self.initSeed is not None else numpy.random
+        U = 0.01*randomState.random_sample((X.shape[0],k))
+        V = 0.01*randomState.random_sample((X.shape[1],k))
         return U,V
 
     def learnModel(self, X, U=None, V=None):
@@ -64,12 +67,20 @@ class CLiMF(AbstractRecommender):
 
         num_train_sample_users = X.shape[0]
         train_sample_users = numpy.array(random.sample(xrange(X.shape[0]),num_train_sample_users), dtype=numpy.int32)
-        sample_user_data = numpy.array([numpy.array(X.getrow(i).indices, dtype=numpy.int32) for i in train_sample_users])
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        sample_user_data = numpy.array([numpy.array(colInds[indPtr[i]:indPtr[i+1]], dtype=numpy.int32) for i in train_sample_users])
         
         safe_climf_fast(data, self.U, self.V, self.lmbda, self.gamma, self.U.shape[1], 
                    self.max_iters, False, 0, train_sample_users, sample_user_data, self.verbose)
     
-    def predict(self, maxItems): 
+    def predict(self, maxItems, approximate=False): 
+        """
+        Return the top maxItems items for each user. If approximate is True then 
+        use a MipsIndex over the item factors, see mipsNumClusters and mipsNumProbes. 
+        """
+        if approximate: 
+            return self.predictApprox(maxItems)
+        
         return MCEvaluator.recommendAtk(self.U, self.V, maxItems)
     
     def modelSelect(self, X, colProbs=None):
@@ -87,27 +98,23 @@ class CLiMF(AbstractRecommender):
         testAucs = numpy.zeros((len(self.ks), len(self.lmbdas), len(self.gammas), len(trainTestXs)))
         
         logging.debug("Performing model selection")
-        paramList = []        
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            foldInds = [executor.addFold(scipy.sparse.csr_matrix(trainX, dtype=numpy.float64), scipy.sparse.csr_matrix(testX, dtype=numpy.float64)) for (trainX, testX, testOmegaList) in datas]
+            tasks = []        
         
-        for i, k in enumerate(self.ks): 
-            U, V = self.initUV(X, k)
-            for lmbda in self.lmbdas:
-                for gamma in self.gammas:
-                    for (trainX, testX, testOmegaList) in datas:
-                        learner = self.copy()
-                        learner.k = k
-                        learner.U = U.copy()
-                        learner.V = V.copy()
-                        learner.lmbda = lmbda
-                        learner.gamma = gamma
-                    
-                        paramList.append((scipy.sparse.csr_matrix(trainX, dtype=numpy.float64), scipy.sparse.csr_matrix(testX, dtype=numpy.float64), learner))
+            #Each task rebuilds the same initial U and V for its k from initSeed 
+            initSeed = numpy.random.randint(0, 2**31-1)
+        
+            for i, k in enumerate(self.ks): 
+                for lmbda in self.lmbdas:
+                    for gamma in self.gammas:
+                        for foldInd in foldInds:
+                            tasks.append((foldInd, {"k": k, "initSeed": initSeed, "lmbda": lmbda, "gamma": gamma}))
             
-        if self.numProcesses != 1: 
-            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=100)
-            resultsIterator = pool.imap(computeTestF1, paramList, self.chunkSize)
-        else: 
-            resultsIterator = itertools.imap(computeTestF1, paramList)
+            resultsIterator = iter(executor.map(computeTestF1, tasks))
+        finally: 
+            executor.close()
         
         for i_k in range(len(self.ks)):
             for i_lmbda in range(len(self.lmbdas)):
@@ -115,9 +122,6 @@ class CLiMF(AbstractRecommender):
                     for i_cv in range(len(trainTestXs)):             
                         testAucs[i_k, i_lmbda, i_gamma, i_cv] = resultsIterator.next()
         
-        if self.numProcesses != 1: 
-            pool.terminate()
-        
         meanTestMetrics = numpy.mean(testAucs, 3)
         stdTestMetrics = numpy.std(testAucs, 3)
         
@@ -141,6 +145,7 @@ class CLiMF(AbstractRecommender):
         self.copyParams(learner)
         learner.max_iters = self.max_iters
         learner.verbose = self.verbose
+        learner.initSeed = self.initSeed
         
         return learner 
 
@@ -18,8 +18,13 @@ An iterative version of matrix factoisation using frobenius norm penalisation.
 """
 
 class IterativeSGDNorm2Reg(object): 
-    def __init__(self, k, lmbda, eps=0.000001, tmax=100000, gamma=1): 
+    def __init__(self, k, lmbda, eps=0.000001, tmax=100000, gamma=1, numBlocks=0): 
+        """
+        The numBlocks is the number of row and column blocks of the stratified 
+        parallel SGD used for each matrix, or 0 for sequential passes. 
+        """
         self.baseLearner = SGDNorm2Reg(k, lmbda, eps, tmax, gamma)
+        self.baseLearner.numBlocks = numBlocks
         
     def learnModel(self, XIterator): 
         
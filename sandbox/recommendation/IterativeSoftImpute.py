@@ -1,4 +1,3 @@
-import gc 
 import numpy
 import logging
 import os 
@@ -7,7 +6,6 @@ import scipy.sparse.linalg
 import sandbox.util.SparseUtils as ExpSU
 import numpy.testing as nptst 
 import multiprocessing 
-from sppy import csarray 
 from sandbox.misc.RandomisedSVD import RandomisedSVD
 from sandbox.util.MCEvaluator import MCEvaluator
 from sandbox.util.Util import Util
@@ -16,84 +14,63 @@ from sandbox.recommendation.AbstractMatrixCompleter import AbstractMatrixComplet
 from sandbox.util.SparseUtilsCython import SparseUtilsCython
 from sandbox.misc.SVDUpdate import SVDUpdate
 from sandbox.util.LinOperatorUtils import LinOperatorUtils
+from sandbox.util.SparseResidualOperator import SparseResidualOperator
 from sandbox.util.SparseUtils import SparseUtils
 from sandbox.util.MCEvaluatorCython import MCEvaluatorCython
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 from sandbox.util.Sampling import Sampling 
 from sppy.linalg.GeneralLinearOperator import GeneralLinearOperator
 
-def learnPredictMSE(args): 
+def pathMetric(learner, Z, trainX, testX, testInds): 
     """
-    A function to train on a training set and test on a test set, for a number 
-    of values of rho. 
+    The validation metric of the factorisation Z = (U, s, V) learnt on trainX. 
     """
-    learner, trainX, testX, rhos = args 
-    logging.debug("k=" + str(learner.getK()))
-    logging.debug(learner) 
-    
-    testInds = testX.nonzero()
-    trainXIter = []
-    testIndList = []    
-    
-    for rho in rhos: 
-        trainXIter.append(trainX)
-        testIndList.append(testInds)
-    
-    trainXIter = iter(trainXIter)
-
-    ZIter = learner.learnModel(trainXIter, iter(rhos))
-    predXIter = learner.predict(ZIter, testIndList)
-    
-    errors = numpy.zeros(rhos.shape[0])
-    for j, predX in enumerate(predXIter): 
-        errors[j] = MCEvaluator.rootMeanSqError(testX, predX)
-        logging.debug("Error = " + str(errors[j]))
-        del predX 
-        gc.collect()
+    if learner.metric == "mse": 
+        predX = learner.predictOne(Z, testInds)
+        return MCEvaluator.rootMeanSqError(testX, predX)
         
-    return errors 
-
-def learnPredictRanking(args): 
+    U, s, V = Z
+    U = numpy.ascontiguousarray(U*s)
+    V = numpy.ascontiguousarray(V)
+    testOrderedItems = MCEvaluatorCython.recommendAtk(U, V, learner.recommendSize, trainX)
+    
+    if learner.metric == "mrr": 
+        return MCEvaluator.mrrAtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
+    elif learner.metric == "f1": 
+        return MCEvaluator.f1AtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
+    else: 
+        raise ValueError("Unknown metric " + learner.metric)
+
+def learnPredictPath(args): 
     """
-    A function to train on a training set and test on a test set, for a number 
-    of values of rho. 
+    Compute the validation metric along the warm started path of descending rhos 
+    for a fold of a ModelSelectExecutor. The path stops once the metric gets worse 
+    learner.pathPatience times in a row, and the remaining rhos are given the last 
+    metric. 
     """
-    learner, trainX, testX, rhos = args 
-    logging.debug("k=" + str(learner.getK()))
-    logging.debug(learner) 
-    
+    trainX, testX, rhos, learner = args 
     testInds = testX.nonzero()
-    trainXIter = []
-    testIndList = []    
-    
-    for rho in rhos: 
-        trainXIter.append(trainX)
-        testIndList.append(testInds)
-    
-    trainXIter = iter(trainXIter)
-
-    ZIter = learner.learnModel(trainXIter, iter(rhos))
+    logging.debug("k=" + str(learner.getK()))
     
+    ZIter = learner.learnModel(itertools.repeat(trainX, rhos.shape[0]), iter(rhos))
     metrics = numpy.zeros(rhos.shape[0])
+    sign = 1 if learner.metric == "mse" else -1
+    numWorse = 0 
     
     for j, Z in enumerate(ZIter): 
-        U, s, V = Z
-        U = U*s
-        U = numpy.ascontiguousarray(U)
-        V = numpy.ascontiguousarray(V)
+        metrics[j] = pathMetric(learner, Z, trainX, testX, testInds)
+        logging.debug("Metric = " + str(metrics[j]))
         
-        testOrderedItems = MCEvaluatorCython.recommendAtk(U, V, learner.recommendSize, trainX)
-        
-        if learner.metric == "mrr": 
-            metrics[j] = MCEvaluator.mrrAtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
-            logging.debug("MRR@" + str(learner.recommendSize) +  ": " + str('%.4f' % metrics[j]) + " " + str(learner))
-        elif learner.metric == "f1": 
-            metrics[j] = MCEvaluator.mrrAtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
-            logging.debug("F1@" + str(learner.recommendSize) +  ": " + str('%.4f' % metrics[j]) + " " + str(learner))
+        if j != 0 and sign*metrics[j] > sign*metrics[j-1]: 
+            numWorse += 1 
         else: 
-            raise ValueError("Unknown metric " + learner.metric)
-            
-        gc.collect()
+            numWorse = 0 
         
+        if learner.pathPatience != 0 and numWorse == learner.pathPatience: 
+            logging.debug("Stopping path at rho=" + str(rhos[j]))
+            metrics[j+1:] = metrics[j]
+            break 
+            
     return metrics 
 
 class IterativeSoftImpute(AbstractMatrixCompleter):
@@ -127,12 +104,15 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
         else:
             self.kmax = None
 
+        self.dtype = numpy.float64 #Use numpy.float32 to store the factors in single precision 
         self.eps = eps
         self.k = k
         self.logStep = logStep
         self.maxIterations = 30
         self.metric = "mse"
         self.numProcesses = multiprocessing.cpu_count()
+        #Stop a rho path after the validation metric worsens this many times in a row, 0 to never stop 
+        self.pathPatience = 0 
         self.postProcess = postProcess 
         self.postProcessSamples = 10**6
         self.p = p
@@ -165,6 +145,8 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
             def __init__(self, XIterator, iterativeSoftImpute):
                 self.tol = 10**-6
                 self.j = 0
+                #The top right singular vector of the last matrix 
+                self.maxSV = None 
                 self.XIterator = XIterator
                 self.iterativeSoftImpute = iterativeSoftImpute
                 self.rhos = rhos 
@@ -192,43 +174,41 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
                 if not scipy.sparse.isspmatrix_csc(X):
                     raise ValueError("X must be a csc_matrix not " + str(type(X)))
                     
-                #Figure out what lambda should be 
+                #Figure out what lambda should be, warm starting from the previous matrix 
                 #PROPACK has problems with convergence 
-                Y = scipy.sparse.csc_matrix(X, dtype=numpy.float)
-                U, s, V = ExpSU.SparseUtils.svdArpack(Y, 1, kmax=20)
-                del Y
-                #U, s, V = SparseUtils.svdPropack(X, 1, kmax=20)
-                maxS = s[0]
+                maxS, self.maxSV = ExpSU.SparseUtils.spectralNorm(X, self.maxSV)
                 logging.debug("Largest singular value : " + str(maxS))
 
                 (n, m) = X.shape
+                dtype = self.iterativeSoftImpute.dtype
 
                 if self.j == 0:
-                    self.oldU = numpy.zeros((n, 1))
-                    self.oldS = numpy.zeros(1)
-                    self.oldV = numpy.zeros((m, 1))
+                    self.oldU = numpy.zeros((n, 1), dtype)
+                    self.oldS = numpy.zeros(1, dtype)
+                    self.oldV = numpy.zeros((m, 1), dtype)
                 else:
                     oldN = self.oldU.shape[0]
                     oldM = self.oldV.shape[0]
 
                     if self.iterativeSoftImpute.updateAlg == "initial":
                         if n > oldN:
-                            self.oldU = Util.extendArray(self.oldU, (n, self.oldU.shape[1]))
+                            self.oldU = numpy.array(Util.extendArray(self.oldU, (n, self.oldU.shape[1])), dtype)
                         elif n < oldN:
                             self.oldU = self.oldU[0:n, :]
 
                         if m > oldM:
-                            self.oldV = Util.extendArray(self.oldV, (m, self.oldV.shape[1]))
+                            self.oldV = numpy.array(Util.extendArray(self.oldV, (m, self.oldV.shape[1])), dtype)
                         elif m < oldN:
                             self.oldV = self.oldV[0:m, :]
                     elif self.iterativeSoftImpute.updateAlg == "zero":
-                        self.oldU = numpy.zeros((n, 1))
-                        self.oldS = numpy.zeros(1)
-                        self.oldV = numpy.zeros((m, 1))
+                        self.oldU = numpy.zeros((n, 1), dtype)
+                        self.oldS = numpy.zeros(1, dtype)
+                        self.oldV = numpy.zeros((m, 1), dtype)
                     else:
                         raise ValueError("Unknown SVD update algorithm: " + self.updateAlg)
 
-                rowInds, colInds = X.nonzero()
+                #The residual on the non-zeros of X is updated in place each iteration
+                residualOp = SparseResidualOperator(X)
 
                 gamma = self.iterativeSoftImpute.eps + 1
                 i = 0
@@ -240,28 +220,25 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
                         logging.debug("Maximum number of iterations reached")
                         break 
                     
-                    ZOmega = SparseUtilsCython.partialReconstructPQ((rowInds, colInds), self.oldU*self.oldS, self.oldV)
-                    Y = X - ZOmega
-                    #Y = Y.tocsc()
-                    #del ZOmega
-                    Y = csarray(Y, storagetype="row")
-                    gc.collect()
+                    residualOp.update(self.oldU, self.oldS, self.oldV)
                     
                     #os.system('taskset -p 0xffffffff %d' % os.getpid())
 
                     if self.iterativeSoftImpute.svdAlg=="propack":
-                        L = LinOperatorUtils.sparseLowRankOp(Y, self.oldU, self.oldS, self.oldV, parallel=False)                        
+                        L = residualOp.asLinearOperator()
                         newU, newS, newV = SparseUtils.svdPropack(L, k=self.iterativeSoftImpute.k, kmax=self.iterativeSoftImpute.kmax)
                     elif self.iterativeSoftImpute.svdAlg=="arpack":
-                        L = LinOperatorUtils.sparseLowRankOp(Y, self.oldU, self.oldS, self.oldV, parallel=False)                        
+                        L = residualOp.asLinearOperator()
                         newU, newS, newV = SparseUtils.svdArpack(L, k=self.iterativeSoftImpute.k, kmax=self.iterativeSoftImpute.kmax)
                     elif self.iterativeSoftImpute.svdAlg=="svdUpdate":
-                        newU, newS, newV = SVDUpdate.addSparseProjected(self.oldU, self.oldS, self.oldV, Y, self.iterativeSoftImpute.k)
+                        newU, newS, newV = SVDUpdate.addSparseProjected(self.oldU, self.oldS, self.oldV, residualOp.residual(), self.iterativeSoftImpute.k)
                     elif self.iterativeSoftImpute.svdAlg=="rsvd":
-                        L = LinOperatorUtils.sparseLowRankOp(Y, self.oldU, self.oldS, self.oldV, parallel=True)
+                        L = residualOp.asLinearOperator()
                         newU, newS, newV = RandomisedSVD.svd(L, self.iterativeSoftImpute.k, p=self.iterativeSoftImpute.p, q=self.iterativeSoftImpute.q)
+                    elif self.iterativeSoftImpute.svdAlg=="streamRsvd":
+                        newU, newS, newV = RandomisedSVD.streamSvd(residualOp.rowBlocks(), X.shape, self.iterativeSoftImpute.k, p=self.iterativeSoftImpute.p)
                     elif self.iterativeSoftImpute.svdAlg=="rsvdUpdate": 
-                        L = LinOperatorUtils.sparseLowRankOp(Y, self.oldU, self.oldS, self.oldV, parallel=True)
+                        L = residualOp.asLinearOperator()
                         if self.j == 0: 
                             newU, newS, newV = RandomisedSVD.svd(L, self.iterativeSoftImpute.k, p=self.iterativeSoftImpute.p, q=self.iterativeSoftImpute.q)
                         else: 
@@ -269,12 +246,12 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
                     elif self.iterativeSoftImpute.svdAlg=="rsvdUpdate2":
                         
                         if self.j == 0: 
-                            L = LinOperatorUtils.sparseLowRankOp(Y, self.oldU, self.oldS, self.oldV, parallel=True)
+                            L = residualOp.asLinearOperator()
                             newU, newS, newV = RandomisedSVD.svd(L, self.iterativeSoftImpute.k, p=self.iterativeSoftImpute.p, q=self.iterativeSoftImpute.q)
                         else: 
                             #Need linear operator which is U s V 
                             L = LinOperatorUtils.lowRankOp(self.oldU, self.oldS, self.oldV)
-                            Y = GeneralLinearOperator.asLinearOperator(Y, parallel=True)
+                            Y = residualOp.residualOperator()
                             newU, newS, newV = RandomisedSVD.updateSvd(L, self.oldU, self.oldS, self.oldV, Y, self.iterativeSoftImpute.k, p=self.iterativeSoftImpute.p)
                     else:
                         raise ValueError("Unknown SVD algorithm: " + self.iterativeSoftImpute.svdAlg)
@@ -312,9 +289,10 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
                         thetaS = numpy.linalg.norm(newS - self.oldS)**2/numpy.linalg.norm(newS)**2
                         self.iterativeSoftImpute.measures[i, :] = numpy.array([gamma, theta1, theta2, thetaS])
 
-                    self.oldU = newU.copy()
-                    self.oldS = newS.copy()
-                    self.oldV = newV.copy()
+                    #The SVD is computed in double precision but the factors are stored as dtype
+                    self.oldU = numpy.array(newU, dtype)
+                    self.oldS = numpy.array(newS, dtype)
+                    self.oldV = numpy.array(newV, dtype)
 
                     logging.debug("Iteration " + str(i) + " gamma="+str(gamma))
                     i += 1
@@ -332,7 +310,7 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
 
                 logging.debug("Number of iterations for rho="+str(self.iterativeSoftImpute.rho) + ": " + str(i))
                 self.j += 1
-                return (newU, newS, newV)
+                return (numpy.asarray(newU, dtype), numpy.asarray(newS, dtype), numpy.asarray(newV, dtype))
 
         return ZIterator(XIterator, self)
 
@@ -365,6 +343,29 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
     
         return Xhat
 
+    def pathMetrics(self, trainTestXs, rhos, ks): 
+        """
+        Compute the validation metrics for each (fold, k) pair as a warm started path 
+        of descending rhos, using a ModelSelectExecutor with numProcesses processes. 
+        Returns an array of metrics of shape (len(rhos), len(ks), len(trainTestXs)). 
+        """
+        if self.metric not in ["mse", "f1", "mrr"]: 
+            raise ValueError("Unknown metric: " + self.metric)
+            
+        learner = self.copy()
+        learner.updateAlg = "initial" 
+        executor = ModelSelectExecutor(learner, self.numProcesses)
+        foldInds = [executor.addFold(scipy.sparse.csc_matrix(trainX, dtype=numpy.float), scipy.sparse.csc_matrix(testX, dtype=numpy.float), rhos) for trainX, testX in trainTestXs]
+        tasks = [(foldInd, {"setK": k}) for foldInd in foldInds for k in ks]
+        
+        try: 
+            results = executor.map(learnPredictPath, tasks)
+        finally: 
+            executor.close()
+        
+        metrics = numpy.array(results).reshape(len(trainTestXs), ks.shape[0], rhos.shape[0])
+        return numpy.transpose(metrics, (2, 1, 0))
+
     def modelSelect(self, X, rhos, ks, cvInds):
         """
         Pick a value of rho based on a single matrix X. We do cross validation
@@ -375,15 +376,8 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
         if (numpy.flipud(numpy.sort(rhos)) != rhos).all(): 
             raise ValueError("rhos must be in descending order")    
 
-        errors = numpy.zeros((rhos.shape[0], ks.shape[0], len(cvInds)))
+        trainTestXs = []
         
-        if self.metric == "mse": 
-            metricFuction = learnPredictMSE
-        elif self.metric == "f1" or self.metric == "mrr": 
-            metricFuction = learnPredictRanking
-        else: 
-            raise ValueError("Unknown metric: " + self.metric)
-            
         for i, (trainInds, testInds) in enumerate(cvInds):
             Util.printIteration(i, 1, len(cvInds), "Fold: ")
             trainX = SparseUtils.submatrix(X, trainInds)
@@ -391,27 +385,9 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
 
             assert trainX.nnz == trainInds.shape[0]
             assert testX.nnz == testInds.shape[0]
-            #nptst.assert_array_almost_equal((testX+trainX).data, X.data)
+            trainTestXs.append((trainX, testX))
 
-            paramList = []
-        
-            for m, k in enumerate(ks): 
-                learner = self.copy()
-                learner.updateAlg="initial" 
-                learner.setK(k)
-                paramList.append((learner, trainX, testX, rhos)) 
-            
-            if self.numProcesses != 1: 
-                pool = multiprocessing.Pool(processes=multiprocessing.cpu_count()/2, maxtasksperchild=10)
-                results = pool.imap(metricFuction, paramList)
-            else: 
-                results = itertools.imap(metricFuction, paramList)
-            
-            for m, rhoErrors in enumerate(results): 
-                errors[:, m, i] = rhoErrors
-            
-            if self.numProcesses != 1: 
-                pool.terminate()
+        errors = self.pathMetrics(trainTestXs, rhos, ks)
 
         meanMetrics = errors.mean(2)
         stdMetrics = errors.std(2)
@@ -442,39 +418,7 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
             raise ValueError("rhos must be in descending order")    
 
         trainTestXs = Sampling.shuffleSplitRows(X, self.folds, self.validationSize, csarray=False, rowMajor=False, colProbs=colProbs)
-        metrics = numpy.zeros((rhos.shape[0], ks.shape[0], len(cvInds)))
-        
-        if self.metric == "mse": 
-            metricFuction = learnPredictMSE
-        elif self.metric == "f1" or self.metric == "mrr": 
-            metricFuction = learnPredictRanking
-        else: 
-            raise ValueError("Unknown metric: " + self.metric)
-            
-            
-        paramList = []
-        
-        for i, (trainX, testX) in enumerate(trainTestXs):
-            Util.printIteration(i, 1, len(cvInds), "Fold: ")
-
-            for m, k in enumerate(ks): 
-                learner = self.copy()
-                learner.updateAlg="initial" 
-                learner.setK(k)
-                paramList.append((learner, trainX, testX, rhos)) 
-            
-        if self.numProcesses != 1: 
-            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=10)
-            resultsIter = pool.imap(metricFuction, paramList)
-        else: 
-            resultsIter = itertools.imap(metricFuction, paramList)
-        
-        for i, (trainX, testX) in enumerate(trainTestXs):
-            for m, k in enumerate(ks):
-                metrics[:, m, i] = resultsIter.next()
-        
-        if self.numProcesses != 1: 
-            pool.terminate()
+        metrics = self.pathMetrics(trainTestXs[0:len(cvInds)], rhos, ks)
 
         meanMetrics = metrics.mean(2)
         stdMetrics = metrics.std(2)
@@ -546,10 +490,12 @@ class IterativeSoftImpute(AbstractMatrixCompleter):
         Return a new copied version of this object.
         """
         iterativeSoftImpute = IterativeSoftImpute(rho=self.rho, eps=self.eps, k=self.k, svdAlg=self.svdAlg, updateAlg=self.updateAlg, logStep=self.logStep, kmax=self.kmax, postProcess=self.postProcess, weighted=self.weighted, p=self.p, q=self.q)
+        iterativeSoftImpute.dtype = self.dtype 
         iterativeSoftImpute.recommendSize = self.recommendSize 
         iterativeSoftImpute.maxIterations = self.maxIterations 
         iterativeSoftImpute.metric = self.metric
         iterativeSoftImpute.numProcesses = self.numProcesses
+        iterativeSoftImpute.pathPatience = self.pathPatience
         iterativeSoftImpute.postProcessSamples = self.postProcessSamples
         iterativeSoftImpute.qu = self.qu
         iterativeSoftImpute.verbose = self.verbose 
@@ -0,0 +1,117 @@
+#cython: profile=False
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: nonecheck=False
+#cython: cdivision=True
+import cython
+cimport numpy
+import numpy
+from cython.parallel import prange, parallel
+from libc.stdlib cimport malloc, calloc, free
+from sandbox.util.CythonUtils cimport worse, siftDown, sortHeap
+
+"""
+Top-k selection over the rows of a product of two CSR matrices A B without forming
+the product. Each row of A B is accumulated in a per-thread sparse accumulator of
+length n (Gustavson's algorithm) and only its k largest elements are kept.
+"""
+
+cdef extern from "math.h":
+    double INFINITY
+
+cdef void topkProductRow(int r, int* indPtrA, int* colIndsA, double* valsA, int* indPtrB, int* colIndsB, double* valsB, int* exclIndPtr, int* exclColInds, unsigned int k, double* acc, int* seen, int* touched, int* items, double* scores) nogil:
+    """
+    Write the k largest elements of row r of A B, apart from the columns of row r of
+    the exclusion matrix, into scores and items in descending order padded with -1.
+    The arrays seen and touched have length n and seen holds the last row written to
+    each column plus one.
+    """
+    cdef int ii, jj, l, numTouched = 0
+    cdef unsigned int t
+    cdef double x
+
+    for t in range(k):
+        scores[t] = -INFINITY
+        items[t] = -1
+
+    #Excluded columns are marked as seen by row -r-1
+    for ii in range(exclIndPtr[r], exclIndPtr[r+1]):
+        seen[exclColInds[ii]] = -r-1
+
+    for ii in range(indPtrA[r], indPtrA[r+1]):
+        x = valsA[ii]
+        for jj in range(indPtrB[colIndsA[ii]], indPtrB[colIndsA[ii]+1]):
+            l = colIndsB[jj]
+            if seen[l] == -r-1:
+                continue
+            if seen[l] != r+1:
+                seen[l] = r+1
+                acc[l] = 0
+                touched[numTouched] = l
+                numTouched += 1
+            acc[l] += x*valsB[jj]
+
+    for ii in range(numTouched):
+        l = touched[ii]
+        if worse(scores[0], items[0], acc[l], l):
+            scores[0] = acc[l]
+            items[0] = l
+            siftDown(scores, items, k, 0)
+
+    sortHeap(scores, items, k)
+
+def topkProduct(int[::1] indPtrA, int[::1] colIndsA, double[::1] valsA, int[::1] indPtrB, int[::1] colIndsB, double[::1] valsB, unsigned int n, int[::1] exclIndPtr, int[::1] exclColInds, unsigned int k, int startRow, int endRow, unsigned int numThreads=1):
+    """
+    Find the k largest elements of rows startRow:endRow of the product of the CSR
+    matrices A and B, which has n columns, ignoring the columns of each row given by
+    the CSR exclusion matrix (exclIndPtr, exclColInds). Structural zeros of A B are
+    never selected so rows with fewer than k nonzeros are padded with -1. Returns
+    the items and scores as arrays of shape (endRow-startRow, k). The rows are split
+    dynamically over numThreads threads, each with accumulators of length n.
+    """
+    cdef int numRows = max(endRow - startRow, 0)
+    cdef numpy.ndarray[int, ndim=2, mode="c"] items = numpy.zeros((numRows, k), numpy.int32)
+    cdef numpy.ndarray[double, ndim=2, mode="c"] scores = numpy.zeros((numRows, k), numpy.float)
+    cdef int* itemsPtr
+    cdef double* scoresPtr
+    cdef int* colIndsAPtr = NULL
+    cdef double* valsAPtr = NULL
+    cdef int* colIndsBPtr = NULL
+    cdef double* valsBPtr = NULL
+    cdef int* exclColIndsPtr = NULL
+    cdef double* acc
+    cdef int* seen
+    cdef int* touched
+    cdef int r
+
+    if startRow < 0 or endRow > indPtrA.shape[0]-1 or endRow > exclIndPtr.shape[0]-1:
+        raise ValueError("Rows " + str(startRow) + ":" + str(endRow) + " out of range")
+    if numRows == 0 or k == 0 or n == 0:
+        items[:] = -1
+        return items, scores
+
+    if colIndsA.shape[0] != 0:
+        colIndsAPtr = &colIndsA[0]
+        valsAPtr = &valsA[0]
+    if colIndsB.shape[0] != 0:
+        colIndsBPtr = &colIndsB[0]
+        valsBPtr = &valsB[0]
+    if exclColInds.shape[0] != 0:
+        exclColIndsPtr = &exclColInds[0]
+
+    itemsPtr = &items[0, 0]
+    scoresPtr = &scores[0, 0]
+
+    with nogil, parallel(num_threads=max(numThreads, 1)):
+        acc = <double*>malloc(n*sizeof(double))
+        seen = <int*>calloc(n, sizeof(int))
+        touched = <int*>malloc(n*sizeof(int))
+
+        for r in prange(startRow, endRow, schedule="dynamic", chunksize=16):
+            topkProductRow(r, &indPtrA[0], colIndsAPtr, valsAPtr, &indPtrB[0], colIndsBPtr, valsBPtr, &exclIndPtr[0], exclColIndsPtr, k, acc, seen, touched, itemsPtr + (r-startRow)*k, scoresPtr + (r-startRow)*k)
+
+        free(acc)
+        free(seen)
+        free(touched)
+
+    return items, scores
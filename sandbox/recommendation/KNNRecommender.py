@@ -9,11 +9,12 @@ Created on Sun Mar  9 15:59:28 2014
 import numpy 
 import logging
 import multiprocessing 
+import scipy.sparse 
 from sandbox.util.SparseUtils import SparseUtils
 from sandbox.util.SparseUtilsCython import SparseUtilsCython
 from sandbox.util.Sampling import Sampling 
 from sandbox.util.Util import Util 
-from mrec.item_similarity.knn import CosineKNNRecommender
+from sandbox.recommendation.KNNKernels import topkProduct
 from sandbox.util.MCEvaluator import MCEvaluator 
 
 def computePrecision(args): 
@@ -33,7 +34,9 @@ def computePrecision(args):
 
 class KNNRecommender(object): 
     """
-    A wrapper for the mrec class CosineKNNRecommender. 
+    Item-based nearest neighbour recommendation with cosine similarity. Only the k 
+    most similar items to each item are stored, in the CSR matrix W, and users are 
+    scored by summing the rows of W for their items. 
     """
     
     def __init__(self, k): 
@@ -43,15 +46,56 @@ class KNNRecommender(object):
         self.numAucSamples = 100
         self.numProcesses = multiprocessing.cpu_count()
         self.chunkSize = 1
+        self.blockSize = 10000 #Number of items whose neighbours are found per call to topkProduct
+        self.numThreads = 1 #Threads used for the similarities and predictions 
         
     def learnModel(self, X): 
+        """
+        Find the k nearest neighbours of each item of the sparse matrix X, whose rows 
+        are users and columns are items, without forming X^T X. X can also be a 
+        csarray or an InteractionStore. 
+        """
+        if hasattr(X, "toScipyCsr"): 
+            X = X.toScipyCsr()
+        
+        X = scipy.sparse.csr_matrix(X, dtype=numpy.float)
+        X.sort_indices()
         self.X = X 
-        self.learner = CosineKNNRecommender(self.k)
-        self.learner.fit(X)
+        m, n = X.shape 
+        
+        norms = numpy.sqrt(numpy.array(X.multiply(X).sum(0)).ravel())
+        norms[norms == 0] = 1 
+        Xn = scipy.sparse.csr_matrix(X.dot(scipy.sparse.diags(1/norms, 0)))
+        Xt = Xn.T.tocsr()
+        
+        A = (numpy.array(Xt.indptr, numpy.int32), numpy.array(Xt.indices, numpy.int32), Xt.data)
+        B = (numpy.array(Xn.indptr, numpy.int32), numpy.array(Xn.indices, numpy.int32), Xn.data)
+        diagonal = numpy.arange(n+1, dtype=numpy.int32)
+        indPtr = [numpy.zeros(1, numpy.int)]
+        neighbours = []
+        similarities = []
+        
+        for startItem in range(0, n, self.blockSize): 
+            endItem = min(startItem + self.blockSize, n)
+            items, scores = topkProduct(A[0], A[1], A[2], B[0], B[1], B[2], n, diagonal, diagonal[0:n], self.k, startItem, endItem, self.numThreads)
+            
+            mask = items != -1
+            indPtr.append(indPtr[-1][-1] + numpy.cumsum(mask.sum(1)))
+            neighbours.append(items[mask])
+            similarities.append(scores[mask])
+        
+        self.W = scipy.sparse.csr_matrix((numpy.concatenate(similarities), numpy.concatenate(neighbours), numpy.concatenate(indPtr)), shape=(n, n))
     
     def predict(self, maxItems):
-        orderedItems = self.learner.batch_recommend_items(self.X, maxItems, return_scores=False)
-        orderedItems = numpy.array(orderedItems)
+        """
+        Return the top maxItems items for each user, excluding those in X, as an 
+        array padded with -1 for users with fewer candidate items. 
+        """
+        indPtr = numpy.array(self.X.indptr, numpy.int32)
+        colInds = numpy.array(self.X.indices, numpy.int32)
+        W = self.W 
+        
+        orderedItems, scores = topkProduct(indPtr, colInds, self.X.data, numpy.array(W.indptr, numpy.int32), numpy.array(W.indices, numpy.int32), W.data, W.shape[1], indPtr, colInds, maxItems, 0, self.X.shape[0], self.numThreads)
         return orderedItems 
         
     def modelSelect(self, X): 
@@ -109,11 +153,14 @@ class KNNRecommender(object):
         learner.ks = self.ks
         learner.folds = self.folds 
         learner.numAucSamples = self.numAucSamples
+        learner.blockSize = self.blockSize
+        learner.numThreads = self.numThreads
         
         return learner 
 
     def __str__(self): 
         outputStr = "KnnRecommender: k=" + str(self.k) 
         outputStr += " numAucSamples=" + str(self.numAucSamples)
+        outputStr += " blockSize=" + str(self.blockSize) + " numThreads=" + str(self.numThreads)
         
         return outputStr         
\ No newline at end of file
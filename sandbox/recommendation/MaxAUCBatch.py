@@ -0,0 +1,158 @@
+import numpy
+import scipy.sparse
+import scipy.special
+
+class MaxAUCBatch(object):
+    """
+    Mini-batch stochastic updates of the MaxAUC objectives with pairwise losses. Each
+    batch is a block of users with numAucSamples positive items per user and one sample
+    of numNegatives items which is shared by the whole block. The scores of the negative
+    items and their contributions to the gradients of U and V are then dense matrix
+    products, which use BLAS, rather than one dot product per pair.
+    """
+    def __init__(self, k=8, lmbdaU=0.0, lmbdaV=1.0, normalise=True, numAucSamples=10, numNegatives=100, startAverage=30, rho=0.5, loss="hinge"):
+        if loss not in ["hinge", "logistic", "sigmoid", "tanh"]:
+            raise ValueError("Unsupported loss for mini-batch updates: " + loss)
+
+        self.batchSize = 100
+        self.eta = 0
+        self.k = k
+        self.lmbdaU = lmbdaU
+        self.lmbdaV = lmbdaV
+        self.loss = loss
+        self.maxNormU = 100
+        self.maxNormV = 100
+        self.normalise = normalise
+        self.numAucSamples = numAucSamples
+        self.numNegatives = numNegatives
+        self.rho = rho
+        self.startAverage = startAverage
+
+    def derivative(self, gamma):
+        """
+        The derivative h(gamma) of the pairwise loss of gamma = u_i^T(v_p - v_q), negated
+        so that it is non-negative.
+        """
+        if self.loss == "hinge" or self.loss == "tanh":
+            return numpy.maximum(0, 1-gamma)
+        elif self.loss == "logistic":
+            return scipy.special.expit(-self.rho*gamma)
+        else:
+            return scipy.special.expit(-self.rho*gamma)*scipy.special.expit(self.rho*gamma)
+
+    def scale(self, zeta, normGq):
+        r"""
+        The scale of the sum over the negative items given zeta = \sum_q gq[q] h(gamma)^2.
+        """
+        if self.loss == "hinge":
+            return numpy.ones(zeta.shape)
+        elif self.loss == "tanh":
+            return self.rho*(1 - numpy.tanh(0.5*self.rho*zeta/numpy.maximum(normGq, 10**-12))**2)
+        else:
+            return self.rho*numpy.ones(zeta.shape)
+
+    def sampleBatch(self, X, indPtr, colInds, rowInds, permutedColInds, gp, gq):
+        """
+        Sample numAucSamples positive items with replacement for each row in rowInds and
+        numNegatives items from permutedColInds. Returns the positive items P, their
+        weights gp[P] (zero for rows without positives), the negative items Q and their
+        weights gq[Q] for each row, which are zero where an item is positive for a row.
+        """
+        numRows = rowInds.shape[0]
+        starts = numpy.array(indPtr[rowInds], numpy.int)
+        counts = numpy.array(indPtr[rowInds+1], numpy.int) - starts
+
+        offsets = numpy.array(numpy.random.rand(numRows, self.numAucSamples)*counts[:, None], numpy.int)
+        posInds = numpy.minimum(starts[:, None] + offsets, max(colInds.shape[0]-1, 0))
+        P = numpy.array(colInds[posInds], numpy.int) if colInds.shape[0] != 0 else numpy.zeros((numRows, self.numAucSamples), numpy.int)
+        posWeights = gp[P] * (counts[:, None] != 0)
+
+        Q = numpy.array(permutedColInds[numpy.random.randint(0, permutedColInds.shape[0], self.numNegatives)], numpy.int)
+        negWeights = gq[Q] * numpy.logical_not(X[rowInds, :][:, Q].toarray())
+
+        return P, posWeights, Q, negWeights
+
+    def derivativeUV(self, X, indPtr, colInds, U, V, rowInds, permutedColInds, gp, gq):
+        """
+        Find approximations of delta phi/delta U for the rows in rowInds and delta phi/delta V
+        for the items sampled for them. Returns dU, the items and dV.
+        """
+        m = U.shape[0]
+        n = V.shape[0]
+        numRows = rowInds.shape[0]
+        P, posWeights, Q, negWeights = self.sampleBatch(X, indPtr, colInds, rowInds, permutedColInds, gp, gq)
+
+        UB = U[rowInds, :]
+        VP = V[P, :]
+        VQ = V[Q, :]
+
+        #The scores of the positive items, then of the negative items in one product
+        uivps = numpy.einsum("ij,isj->is", UB, VP)
+        uivqs = UB.dot(VQ.T)
+
+        hGamma = self.derivative(uivps[:, :, None] - uivqs[:, None, :])
+        nu = negWeights[:, None, :]*hGamma
+        zeta = (nu*hGamma).sum(2)
+        normGq = negWeights.sum(1)[:, None]
+        normGp = posWeights.sum(1)[:, None]
+
+        c = numpy.zeros(posWeights.shape)
+        nonZero = numpy.logical_and(normGq != 0, normGp != 0)[:, 0]
+        c[nonZero, :] = self.scale(zeta[nonZero, :], normGq[nonZero, :])*posWeights[nonZero, :]/(normGq[nonZero, :]*normGp[nonZero, :])
+
+        #A[i, s, t] is the weight of the pair (P[i, s], Q[t]) for row i
+        A = c[:, :, None]*nu
+        WQ = numpy.array(A.sum(1), U.dtype)
+        WP = numpy.array(A.sum(2), U.dtype)
+
+        dU = (WQ.dot(VQ) - numpy.einsum("is,isj->ij", WP, VP))/m + (self.lmbdaU/m)*UB
+
+        #Sum the gradients of repeated items with a sparse matrix of ones
+        dVQ = WQ.T.dot(UB)
+        dVP = -(WP[:, :, None]*UB[:, None, :]).reshape(numRows*P.shape[1], UB.shape[1])
+        items, inverse = numpy.unique(numpy.r_[Q, P.ravel()], return_inverse=True)
+        scatter = scipy.sparse.csr_matrix((numpy.ones(inverse.shape[0], U.dtype), (inverse, numpy.arange(inverse.shape[0]))), shape=(items.shape[0], inverse.shape[0]))
+        dV = scatter.dot(numpy.r_[dVQ, dVP])/numRows + (self.lmbdaV/n)*V[items, :]
+
+        if self.normalise:
+            dU /= numpy.maximum(numpy.sqrt((dU**2).sum(1)), 10**-12)[:, None]
+            dV /= numpy.maximum(numpy.sqrt((dV**2).sum(1)), 10**-12)[:, None]
+
+        return dU, items, dV
+
+    def updateRows(self, U, muU, rowInds, dU, sigma, maxNorm, ind):
+        """
+        Compute U[rowInds, :] -= sigma*dU, project the rows onto the ball of radius maxNorm
+        and update their averages in muU.
+        """
+        newU = U[rowInds, :] - sigma*dU
+        norms = numpy.sqrt((newU**2).sum(1))
+        overNorm = norms >= maxNorm
+        newU[overNorm, :] *= (maxNorm/norms[overNorm])[:, None]
+        U[rowInds, :] = newU
+
+        if ind > self.startAverage:
+            muU[rowInds, :] = muU[rowInds, :]*(ind/(ind+self.eta+1.0)) + newU*((1.0+self.eta)/(ind+self.eta+1.0))
+        else:
+            muU[rowInds, :] = newU
+
+    def updateUVApprox(self, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, ind, numIterations, sigmaU, sigmaV):
+        """
+        Run mini-batch updates of U and V in place over numIterations rows of U taken in
+        the order of permutedRowInds, with negative items sampled from permutedColInds.
+        """
+        m = U.shape[0]
+        n = V.shape[0]
+        batchSize = max(min(self.batchSize, permutedRowInds.shape[0]), 1)
+        X = scipy.sparse.csr_matrix((numpy.ones(colInds.shape[0], numpy.bool), colInds, indPtr), shape=(m, n))
+
+        if permutedRowInds.shape[0] == 0 or permutedColInds.shape[0] == 0:
+            return
+
+        for s in range(0, numIterations, batchSize):
+            rowInds = numpy.array(permutedRowInds[numpy.arange(s, min(s+batchSize, numIterations)) % permutedRowInds.shape[0]], numpy.int)
+            rowInds = numpy.unique(rowInds)
+
+            dU, items, dV = self.derivativeUV(X, indPtr, colInds, U, V, rowInds, permutedColInds, gp, gq)
+            self.updateRows(U, muU, rowInds, dU, sigmaU, self.maxNormU, ind)
+            self.updateRows(V, muV, items, dV, sigmaV, self.maxNormV, ind)
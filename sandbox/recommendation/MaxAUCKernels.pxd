@@ -0,0 +1,21 @@
+cimport numpy
+
+ctypedef double (*lossDerivative)(double gamma, double rho) nogil
+ctypedef double (*lossScale)(double zeta, double normGq, double rho) nogil
+
+cdef struct AUCLoss:
+    lossDerivative derivative
+    lossScale scale
+    bint useZeta
+    double rho
+
+cdef AUCLoss hingeLoss(double rho)
+cdef AUCLoss logisticLoss(double rho)
+cdef AUCLoss sigmoidLoss(double rho)
+cdef AUCLoss tanhLoss(double rho)
+
+cdef numpy.ndarray derivativeUiApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, double[:, ::1] U, double[:, ::1] V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, unsigned int i)
+cdef numpy.ndarray derivativeViApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, double[:, ::1] U, double[:, ::1] V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, unsigned int j)
+cdef updateUVApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, muU, muV, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int ind, unsigned int numIterations, double sigmaU, double sigmaV)
+cdef foldInUKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, double[::1] sigmas)
+cdef foldInVKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, unsigned int start, double[::1] sigmas)
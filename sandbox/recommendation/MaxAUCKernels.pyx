@@ -0,0 +1,510 @@
+#cython: profile=False
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: nonecheck=False
+#cython: cdivision=True
+from __future__ import print_function
+import cython
+cimport numpy
+import numpy
+from libc.stdlib cimport malloc, free
+from cython cimport floating
+from sandbox.util.CythonUtils cimport RandomState, randomInt, newStream, inverseChoiceArrayPtr, uniformChoicePtr
+
+"""
+The stochastic gradient updates shared by the MaxAUC learners with pairwise losses.
+A loss is given by the derivative h(gamma) of the pairwise loss of gamma = u_i^T(v_p - v_q)
+and a scale applied to the sum over the negative items, which depends on
+zeta = \sum_q gq[q] h(gamma)^2 for the tanh loss. The updates work on typed memoryviews
+with scratch buffers allocated once per call, and run without the GIL. The factors
+can be float or double. Dot products are computed in the type of the factors and the
+gradients are accumulated in double precision.
+"""
+
+cdef extern from "math.h" nogil:
+    double exp(double x)
+    double tanh(double x)
+    double sqrt(double x)
+    double fmax(double x, double y)
+
+cdef struct UpdateParams:
+    unsigned int k, m, n, numAucSamples, numRowSamples, startAverage
+    double lmbdaU, lmbdaV, maxNormU, maxNormV, eta
+    bint normalise
+
+cdef struct Scratch:
+    double* deltaTheta
+    double* deltaBeta
+    double* uivqs
+    unsigned int* omegaiSample
+    unsigned int* omegaBari
+    unsigned int* rowInds
+    unsigned int numRowInds
+    RandomState state
+
+cdef double hingeDerivative(double gamma, double rho) nogil:
+    return fmax(0, 1-gamma)
+
+cdef double logisticDerivative(double gamma, double rho) nogil:
+    cdef double zeta = exp(-rho*gamma)
+    return zeta/(1+zeta)
+
+cdef double sigmoidDerivative(double gamma, double rho) nogil:
+    cdef double zeta = exp(-rho*gamma)
+    return zeta/((1+zeta)*(1+zeta))
+
+cdef double unitScale(double zeta, double normGq, double rho) nogil:
+    return 1
+
+cdef double rhoScale(double zeta, double normGq, double rho) nogil:
+    return rho
+
+cdef double tanhScale(double zeta, double normGq, double rho) nogil:
+    cdef double t
+    if normGq != 0:
+        zeta /= normGq
+    t = tanh(0.5*rho*zeta)
+    return rho*(1 - t*t)
+
+cdef AUCLoss makeLoss(lossDerivative derivative, lossScale scale, bint useZeta, double rho):
+    cdef AUCLoss loss
+    loss.derivative = derivative
+    loss.scale = scale
+    loss.useZeta = useZeta
+    loss.rho = rho
+    return loss
+
+cdef AUCLoss hingeLoss(double rho):
+    return makeLoss(hingeDerivative, unitScale, False, rho)
+
+cdef AUCLoss logisticLoss(double rho):
+    return makeLoss(logisticDerivative, rhoScale, False, rho)
+
+cdef AUCLoss sigmoidLoss(double rho):
+    return makeLoss(sigmoidDerivative, rhoScale, False, rho)
+
+cdef AUCLoss tanhLoss(double rho):
+    return makeLoss(hingeDerivative, tanhScale, True, rho)
+
+cdef inline double dotRows(floating[:, ::1] U, unsigned int i, floating[:, ::1] V, unsigned int j, unsigned int k) nogil:
+    """
+    Compute the dot product between U[i, :] and V[j, :]
+    """
+    cdef floating result = 0
+    cdef unsigned int s
+    for s in range(k):
+        result += U[i, s]*V[j, s]
+    return result
+
+cdef inline void axpyRow(double a, floating[:, ::1] V, unsigned int j, double* y, unsigned int k) nogil:
+    """
+    Compute y += a*V[j, :]
+    """
+    cdef unsigned int s
+    for s in range(k):
+        y[s] += a*V[j, s]
+
+cdef inline double norm(double* x, unsigned int k) nogil:
+    cdef double result = 0
+    cdef unsigned int s
+    for s in range(k):
+        result += x[s]*x[s]
+    return sqrt(result)
+
+cdef inline void zero(double* x, unsigned int k) nogil:
+    cdef unsigned int s
+    for s in range(k):
+        x[s] = 0
+
+cdef inline void normalise(double* x, unsigned int k) nogil:
+    cdef double normX = norm(x, k)
+    cdef unsigned int s
+    if normX != 0:
+        for s in range(k):
+            x[s] /= normX
+
+cdef inline void stepRow(floating[:, ::1] U, unsigned int i, double* dUi, double sigma, double maxNorm, unsigned int k) nogil:
+    """
+    Compute U[i, :] -= sigma*dUi and project onto the ball of radius maxNorm.
+    """
+    cdef unsigned int s
+    cdef double normUi = 0
+
+    for s in range(k):
+        U[i, s] -= sigma*dUi[s]
+        normUi += <double>U[i, s]*U[i, s]
+    normUi = sqrt(normUi)
+
+    if normUi >= maxNorm:
+        for s in range(k):
+            U[i, s] *= maxNorm/normUi
+
+cdef inline void updateRow(floating[:, ::1] U, floating[:, ::1] muU, unsigned int i, double* dUi, double sigma, double maxNorm, unsigned int ind, UpdateParams* params) nogil:
+    """
+    Compute U[i, :] -= sigma*dUi, project onto the ball of radius maxNorm and update the
+    average muU[i, :].
+    """
+    cdef unsigned int s, k = params.k
+    cdef double a, b
+
+    stepRow(U, i, dUi, sigma, maxNorm, k)
+
+    if ind > params.startAverage:
+        a = ind/(ind+params.eta+1)
+        b = (1+params.eta)/(ind+params.eta+1)
+        for s in range(k):
+            muU[i, s] = muU[i, s]*a + U[i, s]*b
+    else:
+        for s in range(k):
+            muU[i, s] = U[i, s]
+
+cdef inline bint contains(unsigned int[::1] colInds, unsigned int start, unsigned int end, unsigned int j) nogil:
+    cdef unsigned int t
+    for t in range(start, end):
+        if colInds[t] == j:
+            return True
+    return False
+
+cdef inline unsigned int inverseChoice(unsigned int[::1] colInds, unsigned int start, unsigned int end, unsigned int[::1] permutedColInds, RandomState* state) nogil:
+    """
+    Find a random element of permutedColInds not in colInds[start:end]
+    """
+    return inverseChoiceArrayPtr(&colInds[start], end - start, &permutedColInds[0], permutedColInds.shape[0], state)
+
+cdef inline unsigned int uniformChoice(unsigned int[::1] colInds, unsigned int start, unsigned int end, unsigned int numSamples, unsigned int* sample, RandomState* state) nogil:
+    """
+    Write numSamples random elements of colInds[start:end] into sample and return the
+    number written. If there are at most numSamples elements then all are used.
+    """
+    return uniformChoicePtr(&colInds[start], end - start, numSamples, sample, state)
+
+cdef inline unsigned int sampleRows(Scratch* scratch, unsigned int numSamples) nogil:
+    """
+    Move a random sample of numSamples rows without replacement to the start of
+    scratch.rowInds using a partial Fisher-Yates shuffle.
+    """
+    cdef unsigned int s, t, temp
+    cdef unsigned int numRows = scratch.numRowInds
+
+    if numSamples > numRows:
+        numSamples = numRows
+
+    for s in range(numSamples):
+        t = s + randomInt(&scratch.state, numRows - s)
+        temp = scratch.rowInds[s]
+        scratch.rowInds[s] = scratch.rowInds[t]
+        scratch.rowInds[t] = temp
+
+    return numSamples
+
+cdef void derivativeUi(unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, unsigned int i, UpdateParams* params, AUCLoss* loss, Scratch* scratch) nogil:
+    """
+    Write an approximation of delta phi/delta u_i into scratch.deltaTheta.
+    """
+    cdef unsigned int p, q, s, t, numOmegai
+    cdef unsigned int k = params.k
+    cdef double uivp, uivq, hGamma, nu, zeta, normGp, normGq, c
+    cdef double* deltaTheta = scratch.deltaTheta
+    cdef double* deltaBeta = scratch.deltaBeta
+
+    numOmegai = uniformChoice(colInds, indPtr[i], indPtr[i+1], params.numAucSamples, scratch.omegaiSample, &scratch.state)
+    zero(deltaTheta, k)
+    normGp = 0
+
+    for s in range(numOmegai):
+        p = scratch.omegaiSample[s]
+        uivp = dotRows(U, i, V, p, k)
+        normGp += gp[p]
+
+        zero(deltaBeta, k)
+        zeta = 0
+        normGq = 0
+
+        for t in range(params.numAucSamples):
+            q = inverseChoice(colInds, indPtr[i], indPtr[i+1], permutedColInds, &scratch.state)
+            uivq = dotRows(U, i, V, q, k)
+            hGamma = loss.derivative(uivp - uivq, loss.rho)
+
+            nu = gq[q]*hGamma
+            zeta += nu*hGamma
+            normGq += gq[q]
+
+            axpyRow(nu, V, q, deltaBeta, k)
+            axpyRow(-nu, V, p, deltaBeta, k)
+
+        c = loss.scale(zeta, normGq, loss.rho)*gp[p]/normGq
+        for t in range(k):
+            deltaTheta[t] += c*deltaBeta[t]
+
+    if normGp != 0:
+        for t in range(k):
+            deltaTheta[t] /= params.m*normGp
+    axpyRow(params.lmbdaU/params.m, U, i, deltaTheta, k)
+
+    if params.normalise:
+        normalise(deltaTheta, k)
+
+cdef void derivativeVi(unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedColInds, unsigned int j, UpdateParams* params, AUCLoss* loss, Scratch* scratch) nogil:
+    """
+    Write an approximation of delta phi/delta v_j into scratch.deltaTheta using a
+    sample of the rows in scratch.rowInds.
+    """
+    cdef unsigned int i, p, q, r, s, t, numRows, numOmegai
+    cdef unsigned int k = params.k
+    cdef double uivp, uivq, hGamma, hGamma2, nu, kappa, zeta, betaScale, normGqi, normGpi
+    cdef double* deltaTheta = scratch.deltaTheta
+
+    numRows = sampleRows(scratch, params.numRowSamples)
+    zero(deltaTheta, k)
+
+    for r in range(numRows):
+        i = scratch.rowInds[r]
+
+        for s in range(params.numAucSamples):
+            scratch.omegaBari[s] = inverseChoice(colInds, indPtr[i], indPtr[i+1], permutedColInds, &scratch.state)
+            scratch.uivqs[s] = dotRows(U, i, V, scratch.omegaBari[s], k)
+
+        betaScale = 0
+
+        if contains(colInds, indPtr[i], indPtr[i+1], j):
+            p = j
+            uivp = dotRows(U, i, V, p, k)
+
+            normGqi = 0
+            zeta = 0
+            kappa = 0
+
+            for s in range(params.numAucSamples):
+                q = scratch.omegaBari[s]
+                hGamma = loss.derivative(uivp - scratch.uivqs[s], loss.rho)
+                nu = gq[q]*hGamma
+
+                kappa += nu
+                zeta += nu*hGamma
+                normGqi += gq[q]
+
+            if normGqi != 0:
+                kappa /= normGqi
+
+            if normGp[i] != 0:
+                betaScale -= loss.scale(zeta, normGqi, loss.rho)*kappa*gp[p]/normGp[i]
+        else:
+            q = j
+            uivq = dotRows(U, i, V, q, k)
+
+            normGpi = 0
+            kappa = 0
+            numOmegai = uniformChoice(colInds, indPtr[i], indPtr[i+1], params.numAucSamples, scratch.omegaiSample, &scratch.state)
+
+            for s in range(numOmegai):
+                p = scratch.omegaiSample[s]
+                uivp = dotRows(U, i, V, p, k)
+                hGamma = loss.derivative(uivp - uivq, loss.rho)
+                zeta = 0
+
+                if loss.useZeta:
+                    for t in range(params.numAucSamples):
+                        hGamma2 = loss.derivative(uivp - scratch.uivqs[t], loss.rho)
+                        zeta += gq[scratch.omegaBari[t]]*hGamma2*hGamma2
+
+                kappa += gp[p]*gq[q]*hGamma*loss.scale(zeta, normGq[i], loss.rho)
+                normGpi += gp[p]
+
+            if normGp[i]*normGpi != 0:
+                betaScale += kappa/(normGpi*normGq[i])
+
+        axpyRow(betaScale, U, i, deltaTheta, k)
+
+    if numRows != 0:
+        for t in range(k):
+            deltaTheta[t] /= numRows
+    axpyRow(params.lmbdaV/params.n, V, j, deltaTheta, k)
+
+    if params.normalise:
+        normalise(deltaTheta, k)
+
+cdef void updateUVApproxBlock(unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, floating[:, ::1] muU, floating[:, ::1] muV, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int ind, unsigned int startIteration, unsigned int endIteration, double sigmaU, double sigmaV, UpdateParams* params, AUCLoss* loss, Scratch* scratch) nogil:
+    cdef unsigned int i, j, s
+
+    for s in range(startIteration, endIteration):
+        i = permutedRowInds[s % permutedRowInds.shape[0]]
+        derivativeUi(indPtr, colInds, U, V, gp, gq, permutedColInds, i, params, loss, scratch)
+        updateRow(U, muU, i, scratch.deltaTheta, sigmaU, params.maxNormU, ind, params)
+
+        #Now update V
+        j = permutedColInds[s % permutedColInds.shape[0]]
+        derivativeVi(indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedColInds, j, params, loss, scratch)
+        updateRow(V, muV, j, scratch.deltaTheta, sigmaV, params.maxNormV, ind, params)
+
+cdef UpdateParams getParams(learner, unsigned int m, unsigned int n):
+    cdef UpdateParams params
+    params.k = learner.k
+    params.m = m
+    params.n = n
+    params.numAucSamples = learner.numAucSamples
+    params.numRowSamples = learner.numRowSamples
+    params.startAverage = learner.startAverage
+    params.lmbdaU = learner.lmbdaU
+    params.lmbdaV = learner.lmbdaV
+    params.maxNormU = learner.maxNormU
+    params.maxNormV = learner.maxNormV
+    params.eta = learner.eta
+    params.normalise = learner.normalise
+    return params
+
+cdef void allocScratch(Scratch* scratch, UpdateParams* params, unsigned int[::1] permutedRowInds) except *:
+    """
+    Allocate the buffers used by the updates. The rows are sampled by shuffling a copy of
+    permutedRowInds in place, and each call has its own random stream.
+    """
+    cdef unsigned int s
+
+    scratch.deltaTheta = <double*>malloc(params.k*sizeof(double))
+    scratch.deltaBeta = <double*>malloc(params.k*sizeof(double))
+    scratch.uivqs = <double*>malloc((params.numAucSamples+1)*sizeof(double))
+    scratch.omegaiSample = <unsigned int*>malloc((params.numAucSamples+1)*sizeof(unsigned int))
+    scratch.omegaBari = <unsigned int*>malloc((params.numAucSamples+1)*sizeof(unsigned int))
+    scratch.numRowInds = permutedRowInds.shape[0]
+    scratch.rowInds = <unsigned int*>malloc((scratch.numRowInds+1)*sizeof(unsigned int))
+    newStream(&scratch.state)
+
+    if scratch.deltaTheta == NULL or scratch.deltaBeta == NULL or scratch.uivqs == NULL or scratch.omegaiSample == NULL or scratch.omegaBari == NULL or scratch.rowInds == NULL:
+        freeScratch(scratch)
+        raise MemoryError()
+
+    for s in range(scratch.numRowInds):
+        scratch.rowInds[s] = permutedRowInds[s]
+
+cdef void freeScratch(Scratch* scratch):
+    free(scratch.deltaTheta)
+    free(scratch.deltaBeta)
+    free(scratch.uivqs)
+    free(scratch.omegaiSample)
+    free(scratch.omegaBari)
+    free(scratch.rowInds)
+
+cdef numpy.ndarray copyVector(double* x, unsigned int k):
+    cdef numpy.ndarray[double, ndim=1, mode="c"] y = numpy.empty(k)
+    cdef unsigned int s
+    for s in range(k):
+        y[s] = x[s]
+    return y
+
+cdef numpy.ndarray derivativeUiApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, double[:, ::1] U, double[:, ::1] V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, unsigned int i):
+    """
+    Find an approximation of delta phi/delta u_i for the given loss.
+    """
+    cdef UpdateParams params = getParams(learner, U.shape[0], V.shape[0])
+    cdef Scratch scratch
+    cdef unsigned int[::1] noRows = numpy.zeros(0, numpy.uint32)
+
+    allocScratch(&scratch, &params, noRows)
+    try:
+        with nogil:
+            derivativeUi(indPtr, colInds, U, V, gp, gq, permutedColInds, i, &params, &loss, &scratch)
+        return copyVector(scratch.deltaTheta, params.k)
+    finally:
+        freeScratch(&scratch)
+
+cdef numpy.ndarray derivativeViApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, double[:, ::1] U, double[:, ::1] V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, unsigned int j):
+    """
+    Find an approximation of delta phi/delta v_j for the given loss.
+    """
+    cdef UpdateParams params = getParams(learner, U.shape[0], V.shape[0])
+    cdef Scratch scratch
+
+    allocScratch(&scratch, &params, permutedRowInds)
+    try:
+        with nogil:
+            derivativeVi(indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedColInds, j, &params, &loss, &scratch)
+        return copyVector(scratch.deltaTheta, params.k)
+    finally:
+        freeScratch(&scratch)
+
+cdef updateUVApproxLoop(learner, AUCLoss* loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, floating[:, ::1] muU, floating[:, ::1] muV, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int ind, unsigned int numIterations, double sigmaU, double sigmaV):
+    """
+    Run numIterations stochastic updates of the rows of U and V. The GIL is only held to
+    print the progress every printStep iterations.
+    """
+    cdef UpdateParams params = getParams(learner, U.shape[0], V.shape[0])
+    cdef Scratch scratch
+    cdef unsigned int s, endIteration
+    cdef unsigned int printStep = max(learner.printStep, 1)
+    cdef bint newline = indPtr.shape[0] > 100000
+
+    allocScratch(&scratch, &params, permutedRowInds)
+    try:
+        for s in range(0, numIterations, printStep):
+            if newline:
+                print(str(s) + " of " + str(numIterations))
+            else:
+                print(str(s) + " ", end="")
+
+            endIteration = min(s + printStep, numIterations)
+            with nogil:
+                updateUVApproxBlock(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, s, endIteration, sigmaU, sigmaV, &params, loss, &scratch)
+    finally:
+        freeScratch(&scratch)
+
+cdef updateUVApproxKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, muU, muV, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int ind, unsigned int numIterations, double sigmaU, double sigmaV):
+    """
+    Run numIterations stochastic updates of U and V in place. The factors U, V, muU and
+    muV are C-contiguous arrays which are either all float32 or all float64.
+    """
+    if numpy.asarray(U).dtype == numpy.float32:
+        updateUVApproxLoop[float](learner, &loss, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV)
+    else:
+        updateUVApproxLoop[double](learner, &loss, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV)
+
+cdef foldInULoop(learner, AUCLoss* loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, double[::1] sigmas):
+    cdef UpdateParams params = getParams(learner, U.shape[0], V.shape[0])
+    cdef Scratch scratch
+    cdef unsigned int[::1] noRows = numpy.zeros(0, numpy.uint32)
+    cdef unsigned int i, s
+
+    allocScratch(&scratch, &params, noRows)
+    try:
+        with nogil:
+            for s in range(sigmas.shape[0]):
+                for i in range(U.shape[0]):
+                    derivativeUi(indPtr, colInds, U, V, gp, gq, permutedColInds, i, &params, loss, &scratch)
+                    stepRow(U, i, scratch.deltaTheta, sigmas[s], params.maxNormU, params.k)
+    finally:
+        freeScratch(&scratch)
+
+cdef foldInVLoop(learner, AUCLoss* loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, floating[:, ::1] U, floating[:, ::1] V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, unsigned int start, double[::1] sigmas):
+    cdef UpdateParams params = getParams(learner, U.shape[0], V.shape[0])
+    cdef Scratch scratch
+    cdef unsigned int j, s
+
+    allocScratch(&scratch, &params, permutedRowInds)
+    try:
+        with nogil:
+            for s in range(sigmas.shape[0]):
+                for j in range(start, V.shape[0]):
+                    derivativeVi(indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedColInds, j, &params, loss, &scratch)
+                    stepRow(V, j, scratch.deltaTheta, sigmas[s], params.maxNormV, params.k)
+    finally:
+        freeScratch(&scratch)
+
+cdef foldInUKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, double[::1] gp, double[::1] gq, unsigned int[::1] permutedColInds, double[::1] sigmas):
+    """
+    Learn U in place with V fixed, using one stochastic update of each row of U for each
+    step size in sigmas. U and V are C-contiguous arrays which are both float32 or both
+    float64.
+    """
+    if numpy.asarray(U).dtype == numpy.float32:
+        foldInULoop[float](learner, &loss, indPtr, colInds, U, V, gp, gq, permutedColInds, sigmas)
+    else:
+        foldInULoop[double](learner, &loss, indPtr, colInds, U, V, gp, gq, permutedColInds, sigmas)
+
+cdef foldInVKernel(learner, AUCLoss loss, unsigned int[::1] indPtr, unsigned int[::1] colInds, U, V, double[::1] gp, double[::1] gq, double[::1] normGp, double[::1] normGq, unsigned int[::1] permutedRowInds, unsigned int[::1] permutedColInds, unsigned int start, double[::1] sigmas):
+    """
+    Learn the rows of V from start onwards in place with U and the other rows fixed, using
+    one stochastic update of each row for each step size in sigmas. U and V are
+    C-contiguous arrays which are both float32 or both float64.
+    """
+    if numpy.asarray(U).dtype == numpy.float32:
+        foldInVLoop[float](learner, &loss, indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, start, sigmas)
+    else:
+        foldInVLoop[double](learner, &loss, indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, start, sigmas)
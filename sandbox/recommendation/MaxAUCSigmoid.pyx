@@ -7,8 +7,10 @@ import cython
 from cython.parallel import parallel, prange
 cimport numpy
 import numpy
-from sandbox.util.CythonUtils cimport dot, scale, choice, inverseChoice, inverseChoiceArray, uniformChoice, plusEquals, partialSum, square
+from cython cimport floating
+from sandbox.util.CythonUtils cimport dot, dotPtr, scale, choice, inverseChoice, inverseChoiceArray, uniformChoice, plusEquals, partialSum, square
 from sandbox.util.SparseUtilsCython import SparseUtilsCython
+from sandbox.recommendation.MaxAUCKernels cimport sigmoidLoss, derivativeUiApproxKernel, derivativeViApproxKernel, updateUVApproxKernel, foldInUKernel, foldInVKernel
 
 """
 A simple squared hinge loss version of the objective. 
@@ -97,7 +99,7 @@ cdef class MaxAUCSigmoid(object):
         else: 
             return objVector.sum()     
     
-    def objectiveApprox(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] allIndPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] allColInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V,  numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, bint full=False, bint reg=True):         
+    def objectiveApprox(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] allIndPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] allColInds, numpy.ndarray[floating, ndim=2, mode="c"] U, numpy.ndarray[floating, ndim=2, mode="c"] V,  numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, bint full=False, bint reg=True):         
         cdef unsigned int m = U.shape[0]
         cdef unsigned int n = V.shape[0]
         cdef unsigned int i, j, k, p, q
@@ -120,14 +122,14 @@ cdef class MaxAUCSigmoid(object):
             #omegaiSample = omegai
             
             for p in omegaiSample:
-                uivp = dot(U, i, V, p, self.k)
+                uivp = dotPtr(&U[i, 0], &V[p, 0], self.k)
                 kappa = 0 
                 normGq = 0
                 normGp += gp[p]
                 
                 for j in range(self.numAucSamples): 
                     q = inverseChoice(allOmegai, n) 
-                    uivq = dot(U, i, V, q, self.k)
+                    uivq = dotPtr(&U[i, 0], &V[q, 0], self.k)
                     gamma = uivp - uivq
                     hGamma = 1.0/(1 + exp(-self.rho*gamma))
                     
@@ -205,59 +207,7 @@ cdef class MaxAUCSigmoid(object):
         Find an approximation of delta phi/delta u_i using the simple objective without 
         sigmoid functions. 
         """
-        cdef unsigned int p, q, ind, j, s
-        cdef double uivp, uivq, gamma, kappa, hGamma,
-        cdef double normDeltaTheta, normGp, normGq, zeta, nu
-        cdef unsigned int m = U.shape[0], n = V.shape[0]
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] omegai 
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] omegaiSample
-        cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] deltaTheta = numpy.zeros(self.k, numpy.float)
-        cdef numpy.ndarray[numpy.int_t, ndim=1, mode="c"] indsQ = numpy.zeros(self.k, numpy.int)
-        cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] deltaBeta = numpy.zeros(self.k, numpy.float)
-             
-        omegai = colInds[indPtr[i]:indPtr[i+1]]
-        
-        #This ought to restrict omega to permutedColInds
-        #omegaiSample = numpy.intersect1d(omegai, permutedColInds, assume_unique=True)                
-        omegaiSample = uniformChoice(omegai, self.numAucSamples)   
-        normGp = 0
-        
-        for p in omegaiSample: 
-            uivp = dot(U, i, V, p, self.k)
-            normGp += gp[p]
-            
-            deltaBeta = numpy.zeros(self.k, numpy.float)
-            kappa = 0
-            zeta = 0 
-            normGq = 0
-            
-            for j in range(self.numAucSamples): 
-                q = inverseChoiceArray(omegai, permutedColInds) 
-                uivq = dot(U, i, V, q, self.k)
-                
-                gamma = uivp - uivq
-                zeta = exp(-self.rho*gamma)
-                hGamma = zeta/(1+zeta)**2 
-                
-                nu = gq[q]*hGamma
-                normGq += gq[q]
-                
-                deltaBeta += scale(V, q, nu, self.k) - scale(V, p, nu, self.k)
-             
-            deltaTheta += deltaBeta*gp[p]*self.rho/normGq
-         
-        if normGp != 0:
-            deltaTheta /= m*normGp
-        deltaTheta += scale(U, i, self.lmbdaU/m, self.k)
-                        
-        #Normalise gradient to have unit norm 
-        if self.normalise: 
-            normDeltaTheta = numpy.linalg.norm(deltaTheta)
-            
-            if normDeltaTheta != 0: 
-                deltaTheta = deltaTheta/normDeltaTheta
-        
-        return deltaTheta
+        return derivativeUiApproxKernel(self, sigmoidLoss(self.rho), indPtr, colInds, U, V, gp, gq, permutedColInds, i)
 
     def derivativeVi(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, unsigned int j): 
         """
@@ -345,95 +295,7 @@ cdef class MaxAUCSigmoid(object):
         """
         delta phi/delta v_i  using the hinge loss. 
         """
-        cdef unsigned int m = U.shape[0]
-        cdef unsigned int n = V.shape[0]
-        cdef unsigned int i, p, q, s, ell
-        cdef double uivp, uivq, uivell, betaScale, normTheta, gamma, kappa, hGamma, zeta, normGqi, normGpi, gamma2, hGamma2, nu
-        cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] deltaBeta = numpy.zeros(self.k, numpy.float)
-        cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] deltaTheta = numpy.zeros(self.k, numpy.float)
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] rowInds = numpy.random.choice(permutedRowInds, min(self.numRowSamples, permutedRowInds.shape[0]), replace=False)
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] omegai 
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] omegaiSample
-        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] omegaBari
-        cdef numpy.ndarray[double, ndim=1, mode="c"] uivqs = numpy.zeros(self.numAucSamples, numpy.float)
-        
-        for i in rowInds:
-            omegai = colInds[indPtr[i]:indPtr[i+1]]
-            #omegaBari = numpy.setdiff1d(numpy.arange(n, dtype=numpy.uint32), omegai, assume_unique=True)
-            
-            #Find an array not in omega but in permutedColInds 
-            omegaBari = numpy.zeros(self.numAucSamples, numpy.uint32)
-            for s in range(self.numAucSamples): 
-                omegaBari[s] = inverseChoiceArray(omegai, permutedColInds)
-                #Can compute uivqs here 
-                uivqs[s] = dot(U, i, V, omegaBari[s], self.k)
-
-            betaScale = 0
-            
-            if j in omegai:                 
-                p = j 
-                uivp = dot(U, i, V, p, self.k)
-                
-                normGqi = 0
-                zeta = 0
-                kappa = 0 
-                
-                for s, q in enumerate(omegaBari): 
-                    #uivq = dot(U, i, V, q, k)
-                    uivq = uivqs[s]
-                    gamma = uivp - uivq
-                    zeta = exp(-self.rho*gamma)
-                    hGamma = zeta/(1+zeta)**2  
-                    
-                    nu = gq[q]*hGamma                    
-                    
-                    kappa += nu
-                    normGqi += gq[q]
-                
-                if normGqi != 0: 
-                    kappa /= normGqi
-                    zeta /= normGqi
-                    
-                if normGp[i] != 0: 
-                    betaScale -= self.rho*kappa*gp[p]/normGp[i]
-            else:
-                q = j 
-                uivq = dot(U, i, V, q, self.k)
-                
-                normGpi = 0 
-                kappa = 0
-                
-                #This ought to restrict omega to permutedColInds
-                #omegaiSample = numpy.intersect1d(omegai, permutedColInds, assume_unique=True)
-                omegaiSample = uniformChoice(omegai, self.numAucSamples)
-                
-                for p in omegaiSample: 
-                    #for p in omegai: 
-                    uivp = dot(U, i, V, p, self.k)
-                    gamma = uivp - uivq  
-                    zeta = exp(-self.rho*gamma)
-                    hGamma = zeta/(1+zeta)**2 
-                                        
-                    kappa += gp[p]*gq[q]*hGamma
-                    normGpi += gp[p]                    
-                    
-                if normGp[i]*normGpi != 0: 
-                    betaScale += self.rho*kappa/(normGpi*normGq[i])
-            
-            deltaTheta += scale(U, i, betaScale, self.k) 
-        
-        deltaTheta /= rowInds.shape[0]
-        deltaTheta += scale(V, j, self.lmbdaV/n, self.k)
-        
-        #Make gradient unit norm
-        if self.normalise: 
-            normTheta = numpy.linalg.norm(deltaTheta)
-            
-            if normTheta != 0: 
-                deltaTheta = deltaTheta/normTheta
-        
-        return deltaTheta
-        
+        return derivativeViApproxKernel(self, sigmoidLoss(self.rho), indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, j)
 
     def updateU(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, double sigma):  
         """
@@ -449,49 +311,21 @@ cdef class MaxAUCSigmoid(object):
         
         U -= sigma*dU        
         
-    def updateUVApprox(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, numpy.ndarray[double, ndim=2, mode="c"] muU, numpy.ndarray[double, ndim=2, mode="c"] muV, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedRowInds,  numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedColInds, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, numpy.ndarray[double, ndim=1, mode="c"] normGp, numpy.ndarray[double, ndim=1, mode="c"] normGq, unsigned int ind, unsigned int numIterations, double sigmaU, double sigmaV): 
-        cdef unsigned int m = U.shape[0]
-        cdef unsigned int n = V.shape[0]    
-        cdef unsigned int i, j, s
-        cdef double normUi, normVj
-        cdef bint newline = indPtr.shape[0] > 100000
-        cdef numpy.ndarray[double, ndim=1, mode="c"] dUi = numpy.zeros(self.k)
-        cdef numpy.ndarray[double, ndim=1, mode="c"] dVj = numpy.zeros(self.k)
-    
-        for s in range(numIterations):
-            if s % self.printStep == 0: 
-                if newline:  
-                    print(str(s) + " of " + str(numIterations))
-                else: 
-                    print(str(s) + " ", end="")
-                            
-            i = permutedRowInds[s % permutedRowInds.shape[0]]   
-            
-            dUi = self.derivativeUiApprox(indPtr, colInds, U, V, gp, gq, permutedColInds, i)
-            plusEquals(U, i, -sigmaU*dUi, self.k)
-            normUi = numpy.linalg.norm(U[i,:])
-            
-            if normUi >= self.maxNormU: 
-                U[i,:] = scale(U, i, self.maxNormU/normUi, self.k)             
-            
-            if ind > self.startAverage: 
-                muU[i, :] = muU[i, :]*ind/float(ind+self.eta+1) + U[i, :]*(1+self.eta)/float(ind+self.eta+1)
-            else: 
-                muU[i, :] = U[i, :]
-                
-            #Now update V   
-            j = permutedColInds[s % permutedColInds.shape[0]]
-            dVj = self.derivativeViApprox(indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, j)
-            plusEquals(V, j, -sigmaV*dVj, self.k)
-            normVj = numpy.linalg.norm(V[j,:])  
-            
-            if normVj >= self.maxNormV: 
-                V[j,:] = scale(V, j, self.maxNormV/normVj, self.k)        
-            
-            if ind > self.startAverage: 
-                muV[j, :] = muV[j, :]*ind/float(ind+self.eta+1) + V[j, :]*(1+self.eta)/float(ind+self.eta+1)
-            else: 
-                muV[j, :] = V[j, :]
+    def updateUVApprox(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, U, V, muU, muV, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedRowInds,  numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedColInds, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, numpy.ndarray[double, ndim=1, mode="c"] normGp, numpy.ndarray[double, ndim=1, mode="c"] normGq, unsigned int ind, unsigned int numIterations, double sigmaU, double sigmaV): 
+        updateUVApproxKernel(self, sigmoidLoss(self.rho), indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV)
+
+    def foldInU(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, U, V, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedColInds, numpy.ndarray[double, ndim=1, mode="c"] sigmas): 
+        """
+        Learn U in place with V fixed, with an update of each row for each step size in sigmas. 
+        """
+        foldInUKernel(self, sigmoidLoss(self.rho), indPtr, colInds, U, V, gp, gq, permutedColInds, sigmas)
+
+    def foldInV(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, U, V, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, numpy.ndarray[double, ndim=1, mode="c"] normGp, numpy.ndarray[double, ndim=1, mode="c"] normGq, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedRowInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedColInds, unsigned int start, numpy.ndarray[double, ndim=1, mode="c"] sigmas): 
+        """
+        Learn the rows of V from start onwards in place with U fixed, with an update of each 
+        row for each step size in sigmas. 
+        """
+        foldInVKernel(self, sigmoidLoss(self.rho), indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, start, sigmas)
 
     def updateV(self, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, numpy.ndarray[double, ndim=1, mode="c"] gp, numpy.ndarray[double, ndim=1, mode="c"] gq, double sigma): 
         """
@@ -3,12 +3,17 @@ import itertools
 import logging
 import multiprocessing 
 import numpy 
+import os
+import Queue
+import traceback
+from multiprocessing.pool import ThreadPool
 import scipy.sparse
 import sharedmem 
 import sppy 
 import time
 from sandbox.misc.RandomisedSVD import RandomisedSVD
 from sandbox.recommendation.AbstractRecommender import AbstractRecommender
+from sandbox.recommendation.MaxAUCBatch import MaxAUCBatch
 from sandbox.recommendation.IterativeSoftImpute import IterativeSoftImpute 
 from sandbox.recommendation.MaxAUCTanh import MaxAUCTanh
 from sandbox.recommendation.MaxAUCHinge import MaxAUCHinge
@@ -17,8 +22,11 @@ from sandbox.recommendation.MaxAUCLogistic import MaxAUCLogistic
 from sandbox.recommendation.MaxAUCSigmoid import MaxAUCSigmoid
 from sandbox.recommendation.RecommenderUtils import computeTestMRR, computeTestF1
 from sandbox.recommendation.WeightedMf import WeightedMf
+from sandbox.util.CythonUtils import seedRandom, getRandomState, setRandomState
+from sandbox.util.InteractionStore import InteractionStore
 from sandbox.util.MCEvaluatorCython import MCEvaluatorCython 
 from sandbox.util.MCEvaluator import MCEvaluator 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 from sandbox.util.Sampling import Sampling 
 from sandbox.util.SparseUtilsCython import SparseUtilsCython
 from sandbox.util.SparseUtils import SparseUtils
@@ -34,86 +42,315 @@ def computeObjective(args):
     logging.debug("Final objective: " + str(obj) + " with t0=" + str(maxLocalAuc.t0) + " and alpha=" + str(maxLocalAuc.alpha))
     return obj
           
-def updateUVBlock(sharedArgs, methodArgs): 
+def computeObjectiveUV(args): 
     """
-    Compute the objective for a particular parameter set. Used to set a learning rate. 
+    Continue learning from the learner's U and V and return the objective along 
+    with the U and V of the last stochastic gradient step, from which a later call 
+    resumes. Used by successive halving to set a learning rate. 
     """
-    rowIsFree, colIsFree, iterationsPerBlock, gradientsPerBlock, U, V, muU, muV, lock = sharedArgs
-    learner, rowBlockSize, colBlockSize, indPtr, colInds, permutedRowInds, permutedColInds, gi, gp, gq, normGp, normGq, pid, loopInd, omegasList = methodArgs
-
-    while (iterationsPerBlock < learner.parallelStep).any(): 
-        #Find free block 
-        lock.acquire()
-        inds = numpy.argsort(numpy.ravel(iterationsPerBlock))
-        foundBlock = False        
-        
-        #Find the block with smallest number of updates which is free 
-        for i in inds: 
-            rowInd, colInd = numpy.unravel_index(i, iterationsPerBlock.shape)
-            
-            if rowIsFree[rowInd] and colIsFree[colInd]: 
-                rowIsFree[rowInd] = False
-                colIsFree[colInd] = False
-                foundBlock = True
-                break
-        
-        blockRowInds = permutedRowInds[rowInd*rowBlockSize:(rowInd+1)*rowBlockSize]
-        blockColInds = permutedColInds[colInd*colBlockSize:(colInd+1)*colBlockSize]
-        
-        ind = iterationsPerBlock[rowInd, colInd] + loopInd
-        sigmaU = learner.getSigma(ind, learner.alpha, muU.shape[0])
-        sigmaV = learner.getSigma(ind, learner.alpha, muU.shape[0])
+    X, testX, maxLocalAuc = args 
+    U, V, trainMeasures, testMeasures, iterations, totalTime = maxLocalAuc.singleLearnModel(X, verbose=True, U=maxLocalAuc.U, V=maxLocalAuc.V)
+    obj = trainMeasures[-1, 0]
+    logging.debug("Objective: " + str(obj) + " at iteration " + str(iterations) + " with t0=" + str(maxLocalAuc.t0) + " and alpha=" + str(maxLocalAuc.alpha))
+    return obj, maxLocalAuc.lastU, maxLocalAuc.lastV
+
+def computeTestMetricUV(args): 
+    """
+    Continue learning from the learner's U and V and return the test F1 or MRR 
+    (according to learner.metric) of the learnt model along with the U and V of 
+    the last stochastic gradient step, from which a later call resumes. Used by 
+    successive halving model selection. 
+    """
+    trainX, testX, learner = args 
+    U, V = learner.learnModel(trainX, U=learner.U, V=learner.V)
+    
+    testOrderedItems = MCEvaluatorCython.recommendAtk(U, V, learner.recommendSize, trainX)
+    
+    if learner.metric == "mrr": 
+        metric = MCEvaluator.mrrAtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
+    else: 
+        metric = MCEvaluator.f1AtK(SparseUtils.getOmegaListPtr(testX), testOrderedItems, learner.recommendSize) 
+        
+    logging.debug(learner.metric + "@" + str(learner.recommendSize) +  ": " + str('%.4f' % metric) + " at iteration " + str(learner.maxIterations) + " " + learner.modelParamsStr())
+    return metric, learner.lastU, learner.lastV
           
-        lock.release()
+def blockWorker(scheduler, learner, pid, randSeed): 
+    """
+    The loop run by each persistent worker process of a BlockScheduler. The worker 
+    waits for the start of an outer iteration, updates free blocks until each one 
+    has been visited parallelStep times and then signals that it is done. The 
+    sampling stream of the process is seeded with randSeed. An error is sent back 
+    as a (pid, traceback) pair so that the parent can raise it. 
+    """
+    seedRandom(randSeed)
     
-        #Now update U and V based on the block 
-        if foundBlock: 
-            ind = iterationsPerBlock[rowInd, colInd] + loopInd
-            sigmaU = learner.getSigma(ind, learner.alpha, muU.shape[0])
-            sigmaV = learner.getSigma(ind, learner.alpha, muU.shape[0])
-            numIterations = gradientsPerBlock[rowInd, colInd]
+    while True: 
+        loopInd = scheduler.taskQueue.get()
+        
+        if loopInd is None: 
+            break 
+        
+        try: 
+            scheduler.updateBlocks(learner, loopInd)
+        except Exception: 
+            scheduler.doneQueue.put((pid, traceback.format_exc()))
+            break 
             
-            indPtr2, colInds2 = omegasList[colInd]
+        scheduler.doneQueue.put((pid, None))
 
-            learner.updateUV(indPtr2, colInds2, U, V, muU, muV, blockRowInds, blockColInds, gp, gq, normGp, normGq, ind, sigmaU, sigmaV, numIterations)
-        else: 
-            time.sleep(3)
-
-        lock.acquire()
-        if foundBlock:
-            rowIsFree[rowInd] = True 
-            colIsFree[colInd] = True
-            iterationsPerBlock[rowInd, colInd] += 1
-        lock.release()
+def updateUVHogwild(args): 
+    """
+    Run a set of stochastic updates on the shared U and V without any locking. 
+    Used by the threads of MaxLocalAUC.hogwildUpdateUV. 
+    """
+    learnerCython, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV = args 
+    learnerCython.updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV)
+        
+def getRandState(prefix): 
+    """
+    The states of the numpy and C random number generators as a dictionary of 
+    arrays whose keys start with prefix, so that they can be stored in an npz file. 
+    """
+    name, keys, pos, hasGauss, cachedGaussian = numpy.random.get_state()
+    
+    randState = {}
+    randState[prefix + "Keys"] = keys 
+    randState[prefix + "Pos"] = numpy.array([pos, hasGauss])
+    randState[prefix + "Gauss"] = numpy.array([cachedGaussian])
+    randState[prefix + "CState"] = getRandomState()
+    return randState 
+    
+def setRandState(randState, prefix): 
+    """
+    Restore the random number generators from a dictionary written by getRandState. 
+    """
+    pos, hasGauss = randState[prefix + "Pos"]
+    numpy.random.set_state(("MT19937", randState[prefix + "Keys"], int(pos), int(hasGauss), float(randState[prefix + "Gauss"][0])))
+    setRandomState(randState[prefix + "CState"])
         
 def restrictOmega(indPtr, colInds, colIndsSubset): 
     """
     Take a set of nonzero indices for a matrix and restrict the columns to colIndsSubset. 
     """
     m = indPtr.shape[0]-1
-    newIndPtr = numpy.zeros(indPtr.shape[0], indPtr.dtype)
-    newColInds = array.array("I")
     colIndsSubset = numpy.array(colIndsSubset, numpy.int)
-    ptr = 0 
+    n = max(colInds.max()+1 if colInds.shape[0] != 0 else 0, colIndsSubset.max()+1 if colIndsSubset.shape[0] != 0 else 0)
+    
+    isSubsetCol = numpy.zeros(n, numpy.bool)
+    isSubsetCol[colIndsSubset] = True 
+    keep = isSubsetCol[colInds]
+    
+    rowInds = numpy.repeat(numpy.arange(m), numpy.diff(numpy.array(indPtr, numpy.int)))
+    newIndPtr = numpy.zeros(indPtr.shape[0], indPtr.dtype)
+    newIndPtr[1:] = numpy.cumsum(numpy.bincount(rowInds[keep], minlength=m))
+    newColInds = numpy.array(colInds[keep], dtype=colInds.dtype)   
     
-    for i in range(m): 
-        omegai = numpy.array(colInds[indPtr[i]:indPtr[i+1]], numpy.int)
-        
-        #newOmegai = numpy.intersect1d(omegai, colIndsSubset, assume_unique=True)
-        
-        #This way is 60% faster 
-        total = numpy.concatenate((omegai, colIndsSubset))
-        counts = numpy.bincount(total)
-        newOmegai = numpy.where(counts>1)[0]
-
-        newIndPtr[i] = ptr 
-        newIndPtr[i+1] = ptr + newOmegai.shape[0]
-        newColInds.extend(newOmegai)
-        ptr += newOmegai.shape[0]
-       
-    newColInds = numpy.array(newColInds, dtype=colInds.dtype)   
     return newIndPtr, newColInds
       
+class BlockScheduler(object): 
+    """
+    Keep the shared factors, the restriction of omega to each column block and a 
+    set of worker processes alive over all outer iterations of 
+    MaxLocalAUC.parallelLearnModel. Free (row block, column block) pairs are handed 
+    out under a condition variable. 
+    """
+    def __init__(self, learner, indPtr, colInds, U, V, gp, gq, normGp, normGq): 
+        """
+        :param learner: The MaxLocalAUC object with the learning parameters 
+        
+        :param indPtr: The row pointers of the training omega 
+        
+        :param colInds: The column indices of the training omega  
+        """
+        m, k = U.shape 
+        n = V.shape[0]
+        
+        self.learner = learner 
+        self.numProcesses = learner.numProcesses 
+        self.numBlocks = learner.numProcesses+1 
+        self.indPtr = indPtr 
+        self.colInds = colInds 
+        self.gp = gp 
+        self.gq = gq 
+        self.normGp = normGp 
+        self.normGq = normGq 
+        
+        self.rowBlockSize = int(numpy.ceil(float(m)/self.numBlocks))
+        self.colBlockSize = int(numpy.ceil(float(n)/self.numBlocks))
+        self.gradientsPerBlock = int(numpy.ceil(float(max(m, n))/(self.numBlocks**2)))
+        
+        #Create shared factors 
+        self.U = sharedmem.empty((m, k), dtype=U.dtype)
+        self.V = sharedmem.empty((n, k), dtype=V.dtype)
+        self.muU = sharedmem.empty((m, k), dtype=U.dtype)
+        self.muV = sharedmem.empty((n, k), dtype=V.dtype)
+        self.U[:] = U[:]
+        self.V[:] = V[:]
+        self.muU[:] = U[:]
+        self.muV[:] = V[:]
+        
+        self.rowIsFree = sharedmem.ones(self.numBlocks, dtype=numpy.bool)
+        self.colIsFree = sharedmem.ones(self.numBlocks, dtype=numpy.bool)
+        self.iterationsPerBlock = sharedmem.zeros((self.numBlocks, self.numBlocks), dtype=numpy.int)
+        
+        #The column blocks are fixed so that omega is only restricted once 
+        self.permutedRowInds = sharedmem.empty(m, dtype=numpy.uint32)
+        self.permutedColInds = sharedmem.empty(n, dtype=numpy.uint32)
+        self.permutedRowInds[:] = numpy.random.permutation(m)
+        self.permutedColInds[:] = numpy.random.permutation(n)
+        
+        self.omegasList = SparseUtilsCython.partitionOmega(indPtr, colInds, self.permutedColInds, self.numBlocks)
+        
+        self.condition = multiprocessing.Condition()
+        self.taskQueue = multiprocessing.Queue()
+        self.doneQueue = multiprocessing.Queue()
+        self.processList = []
+        self.pollTime = 1 #Seconds between checks that the workers are still alive 
+        
+    def acquireBlock(self): 
+        """
+        Wait for a free block which has been visited less than parallelStep times and 
+        mark its rows and columns as used. Returns None when all blocks are done. 
+        """
+        with self.condition: 
+            while True: 
+                remaining = self.iterationsPerBlock < self.learner.parallelStep
+                
+                if not remaining.any(): 
+                    return None 
+                
+                free = numpy.logical_and(numpy.outer(self.rowIsFree, self.colIsFree), remaining)
+                
+                if free.any(): 
+                    #Pick the free block with the smallest number of updates 
+                    counts = numpy.where(free, self.iterationsPerBlock, numpy.iinfo(numpy.int).max)
+                    rowInd, colInd = numpy.unravel_index(numpy.argmin(counts), counts.shape)
+                    self.rowIsFree[rowInd] = False
+                    self.colIsFree[colInd] = False
+                    return rowInd, colInd
+                
+                self.condition.wait()
+        
+    def releaseBlock(self, rowInd, colInd): 
+        with self.condition: 
+            self.rowIsFree[rowInd] = True 
+            self.colIsFree[colInd] = True
+            self.iterationsPerBlock[rowInd, colInd] += 1
+            self.condition.notify_all()
+        
+    def shuffle(self): 
+        """
+        Permute the rows, and the columns within each column block, in place. The 
+        column blocks themselves do not change so omegasList remains valid. 
+        """
+        self.permutedRowInds[:] = numpy.random.permutation(self.permutedRowInds)
+        
+        for i in range(self.numBlocks): 
+            blockColInds = self.permutedColInds[i*self.colBlockSize:(i+1)*self.colBlockSize]
+            blockColInds[:] = numpy.random.permutation(blockColInds)
+        
+    def start(self): 
+        """
+        Start the worker processes, each with its own copy of the learner. 
+        """
+        if self.numProcesses != 1: 
+            for pid in range(self.numProcesses): 
+                learner = self.learner.copy()
+                learner.learnerCython = self.learner.getCythonLearner()
+                randSeed = numpy.random.randint(0, 2**31-1)
+                process = multiprocessing.Process(target=blockWorker, args=(self, learner, pid, randSeed))
+                process.daemon = True
+                process.start()
+                self.processList.append(process)
+        else: 
+            self.localLearner = self.learner.copy()
+            self.localLearner.learnerCython = self.learner.getCythonLearner()
+        
+    def stop(self): 
+        for process in self.processList: 
+            self.taskQueue.put(None)
+        
+        for process in self.processList: 
+            process.join()
+            
+        self.processList = []
+        
+    def checkWorkers(self): 
+        """
+        Raise a RuntimeError, after killing the other workers, if a worker has exited. 
+        """
+        for process in self.processList: 
+            if not process.is_alive(): 
+                exitCode = process.exitcode
+                self.terminate()
+                raise RuntimeError("Block worker exited with code " + str(exitCode))
+        
+    def terminate(self): 
+        """
+        Kill the worker processes, for example after one of them has failed. 
+        """
+        for process in self.processList: 
+            process.terminate()
+            process.join()
+            
+        self.processList = []
+        
+    def updateBlocks(self, learner, loopInd): 
+        """
+        Update blocks of U and V until every block has been visited parallelStep times. 
+        """
+        m = self.U.shape[0]
+        
+        while True: 
+            block = self.acquireBlock()
+            
+            if block is None: 
+                break 
+            
+            rowInd, colInd = block 
+            blockRowInds = self.permutedRowInds[rowInd*self.rowBlockSize:(rowInd+1)*self.rowBlockSize]
+            blockColInds = self.permutedColInds[colInd*self.colBlockSize:(colInd+1)*self.colBlockSize]
+            
+            ind = int(self.iterationsPerBlock[rowInd, colInd] + loopInd)
+            sigmaU = learner.getSigma(ind, learner.alpha, m)
+            sigmaV = learner.getSigma(ind, learner.alpha, m)
+            indPtr2, colInds2 = self.omegasList[colInd]
+            
+            learner.updateUV(indPtr2, colInds2, self.U, self.V, self.muU, self.muV, blockRowInds, blockColInds, self.gp, self.gq, self.normGp, self.normGq, ind, sigmaU, sigmaV, self.gradientsPerBlock)
+            self.releaseBlock(rowInd, colInd)
+        
+    def updateUV(self, loopInd): 
+        """
+        Perform one outer iteration over all blocks and return when it is complete. 
+        """
+        self.shuffle()
+        self.iterationsPerBlock[:] = 0
+        self.rowIsFree[:] = True
+        self.colIsFree[:] = True 
+        
+        if self.numProcesses != 1: 
+            self.checkWorkers()
+            
+            for process in self.processList: 
+                self.taskQueue.put(loopInd)
+                
+            numDone = 0 
+            
+            while numDone < len(self.processList): 
+                try: 
+                    pid, error = self.doneQueue.get(timeout=self.pollTime)
+                except Queue.Empty: 
+                    self.checkWorkers()
+                    continue 
+                
+                if error is not None: 
+                    self.terminate()
+                    raise RuntimeError("Block worker " + str(pid) + " failed:\n" + error)
+                
+                numDone += 1 
+        else: 
+            self.updateBlocks(self.localLearner, loopInd)
+      
 class MaxLocalAUC(AbstractRecommender): 
     def __init__(self, k, w=0.9, alpha=0.05, eps=10**-6, lmbdaU=0.1, lmbdaV=0.1, maxIterations=50, stochastic=False, numProcesses=None): 
         """
@@ -135,12 +372,19 @@ class MaxLocalAUC(AbstractRecommender):
         super(MaxLocalAUC, self).__init__(numProcesses)
         
         self.alpha = alpha #Initial learning rate 
+        self.batchNegatives = 100 #Number of negative items shared by each mini-batch 
+        self.batchSize = 0 #Number of users in each mini-batch, use 0 for single user updates 
         self.beta = 0.75
         self.bound = False
+        self.checkpointFile = None #Write the training state to this npz file every checkpointStep iterations 
+        self.checkpointStep = 10
         self.delta = 0.05
+        self.dtype = numpy.float64 #Use numpy.float32 to store and update U and V in single precision 
         self.eps = eps 
         self.eta = 5
+        self.foldInIterations = 10 #Passes of stochastic updates over the new users or items in foldInUsers and foldInItems 
         self.folds = 2
+        self.hogwild = False #Lock-free stochastic updates using a pool of numProcesses threads 
         self.initialAlg = "rand"
         self.itemExpP = 0.0 #Sample from power law between 0 and 1 
         self.itemExpQ = 0.0    
@@ -167,7 +411,10 @@ class MaxLocalAUC(AbstractRecommender):
         self.reg = True
         self.rho = 1.0
         self.scaleAlpha = True
+        self.searchMode = "grid" #Use "halving" for successive halving or "warm" to warm start grid points in model selection 
+        self.halvingRate = 3 #Keep the top 1/halvingRate configurations at each rung of successive halving 
         self.startAverage = 30
+        self.startIteration = 0 #Iteration at which to resume the learning rate schedule 
         self.stochastic = stochastic
         self.t0 = 0.1 #Convergence speed - larger means we get to 0 faster
         self.validationUsers = 0.1
@@ -264,11 +511,75 @@ class MaxLocalAUC(AbstractRecommender):
         self.copyParams(maxLocalAuc)
 
         maxLocalAuc.__dict__.update(self.__dict__)
+        #A copy must not write over the checkpoint or the factor buffers of this learner 
+        maxLocalAuc.checkpointFile = None
+        maxLocalAuc.rowBuffers = {}
                             
         return maxLocalAuc    
         
+    def foldInU(self, X): 
+        """
+        Learn the factors of the users in the rows of the csr_matrix X with V fixed, 
+        using foldInIterations passes of the stochastic derivative of the loss in the 
+        Cython learner. 
+        """
+        m = X.shape[0]
+        indPtr = numpy.array(X.indptr, numpy.uint32)
+        colInds = numpy.array(X.indices, numpy.uint32)
+        permutedColInds = numpy.arange(self.V.shape[0], dtype=numpy.uint32)
+        sigmas = numpy.array([self.getSigma(s, self.alpha, m) for s in range(self.foldInIterations)], numpy.float64)
+        
+        learnerCython = self.getCythonLearner()
+        U = numpy.array(numpy.random.randn(m, self.k)*0.1, self.dtype)
+        V = numpy.ascontiguousarray(self.V, self.dtype)
+        learnerCython.foldInU(indPtr, colInds, U, V, self.gp, self.gq, permutedColInds, sigmas)
+        
+        return U
+        
+    def foldInV(self, X): 
+        """
+        Learn the factors of the items in the rows of the csr_matrix X, whose columns are 
+        the users, with U fixed. Only the interactions of X are known so the new items 
+        are ranked against the current items for their users, and against each other 
+        for the other users. 
+        """
+        m, n = self.U.shape[0], self.V.shape[0]
+        numItems = X.shape[0]
+        
+        #The omega list of the users over the current and new items 
+        Y = X.T.tocsr()
+        indPtr = numpy.array(Y.indptr, numpy.uint32)
+        colInds = numpy.array(Y.indices + n, numpy.uint32)
+        gp = numpy.r_[self.gp, numpy.ones(numItems)*self.gp.mean()]
+        gq = numpy.r_[self.gq, numpy.ones(numItems)*self.gq.mean()]
+        normGp, normGq = self.computeNormGpq(indPtr, colInds, gp, gq, m)
+        permutedRowInds = numpy.arange(m, dtype=numpy.uint32)
+        permutedColInds = numpy.arange(n + numItems, dtype=numpy.uint32)
+        sigmas = numpy.array([self.getSigma(s, self.alpha, m) for s in range(self.foldInIterations)], numpy.float64)
+        
+        learnerCython = self.getCythonLearner()
+        U = numpy.ascontiguousarray(self.U, self.dtype)
+        V = numpy.array(numpy.r_[self.V, numpy.random.randn(numItems, self.k)*0.1], self.dtype)
+        learnerCython.foldInV(indPtr, colInds, U, V, gp, gq, normGp, normGq, permutedRowInds, permutedColInds, n, sigmas)
+        
+        return numpy.array(V[n:, :], self.dtype)
+        
+    def foldInItems(self, X): 
+        """
+        Learn the factors of new items and append them to V. The new items take the mean 
+        of the item weights gp and gq. 
+        """
+        newInds = super(MaxLocalAUC, self).foldInItems(X)
+        self.appendRows("gp", numpy.ones(newInds.shape[0])*self.gp.mean())
+        self.appendRows("gq", numpy.ones(newInds.shape[0])*self.gq.mean())
+        
+        return newInds 
+        
     def getCythonLearner(self): 
         
+        if self.dtype != numpy.float64 and (self.loss == "square" or not self.stochastic): 
+            raise ValueError("Only stochastic updates with a pairwise loss support dtype " + numpy.dtype(self.dtype).name)
+        
         if self.loss == "tanh": 
             learnerCython = MaxAUCTanh(self.k, self.lmbdaU, self.lmbdaV, self.normalise, self.numAucSamples, self.numRowSamples, self.startAverage, self.rho)
         elif self.loss == "hinge": 
@@ -289,6 +600,15 @@ class MaxLocalAUC(AbstractRecommender):
             
         return learnerCython
         
+    def getBatchLearner(self): 
+        batchLearner = MaxAUCBatch(self.k, self.lmbdaU, self.lmbdaV, self.normalise, self.numAucSamples, self.batchNegatives, self.startAverage, self.rho, self.loss)
+        batchLearner.batchSize = self.batchSize 
+        batchLearner.eta = self.eta 
+        batchLearner.maxNormU = self.maxNormU
+        batchLearner.maxNormV = self.maxNormV
+        
+        return batchLearner 
+        
     def getEvaluationMethod(self): 
         if self.metric == "mrr":
             evaluationMethod = computeTestMRR
@@ -330,6 +650,10 @@ class MaxLocalAUC(AbstractRecommender):
             logging.debug("Initialising with Randomised SVD")
             U, s, V = RandomisedSVD.svd(X, self.k, self.p, self.q)
             U = U*s
+        elif self.initialAlg == "streamSvd":
+            logging.debug("Initialising with single pass randomised SVD")
+            U, s, V = RandomisedSVD.streamSvd(RandomisedSVD.rowBlocks(X), X.shape, self.k, self.p)
+            U = U*s
         elif self.initialAlg == "softimpute": 
             logging.debug("Initialising with softimpute")
             trainIterator = iter([X.toScipyCsc()])
@@ -345,20 +669,62 @@ class MaxLocalAUC(AbstractRecommender):
         else:
             raise ValueError("Unknown initialisation: " + str(self.initialAlg))  
          
-        U = numpy.ascontiguousarray(U)
-        V = numpy.ascontiguousarray(V) 
+        U = numpy.ascontiguousarray(U, self.dtype)
+        V = numpy.ascontiguousarray(V, self.dtype) 
 
         return U, V    
 
-    def learnModel(self, X, verbose=False, U=None, V=None, randSeed=None):
+    def learnModel(self, X, verbose=False, U=None, V=None, randSeed=None, resume=False):
+        """
+        Learn U and V for X, a sparse matrix or an InteractionStore. If resume is True 
+        and checkpointFile exists then training continues from the saved state, otherwise 
+        it starts from U and V when they are given. 
+        """
         if randSeed != None: 
             logging.warn("Seeding random number generator")   
             numpy.random.seed(randSeed)        
+            seedRandom(randSeed)
+        
+        #The validation split and item probabilities need the matrix in memory 
+        if isinstance(X, InteractionStore): 
+            X = X.toScipyCsr()
         
         if self.parallelSGD: 
+            if self.checkpointFile is not None or resume: 
+                raise ValueError("Checkpoints are only supported without parallelSGD")
             return self.parallelLearnModel(X, verbose, U, V)
         else: 
-            return self.singleLearnModel(X, verbose, U, V)
+            return self.singleLearnModel(X, verbose, U, V, resume)
+
+    def loadCheckpoint(self): 
+        """
+        Read the state written by saveCheckpoint as a dictionary, or return None if 
+        there is no checkpoint file. 
+        """
+        if self.checkpointFile is None or not os.path.exists(self.checkpointFile): 
+            return None 
+        
+        logging.debug("Resuming from checkpoint " + self.checkpointFile)
+        npzFile = numpy.load(self.checkpointFile)
+        checkpoint = dict(npzFile.items())
+        npzFile.close()
+        return checkpoint 
+
+    def saveCheckpoint(self, state): 
+        """
+        Write a dictionary of arrays to checkpointFile along with the current state of 
+        the random number generators. The file is written under a temporary name and 
+        then renamed so that a checkpoint is never left half written. 
+        """
+        state.update(getRandState("current"))
+        tempFileName = self.checkpointFile + ".tmp"
+        
+        with open(tempFileName, "wb") as tempFile: 
+            numpy.savez(tempFile, **state)
+            tempFile.flush()
+            os.fsync(tempFile.fileno())
+        
+        os.rename(tempFileName, self.checkpointFile)
         
     def learningRateSelect(self, X=None, meanMetrics=None): 
         """
@@ -372,7 +738,11 @@ class MaxLocalAUC(AbstractRecommender):
             paramDict = {"alpha": self.alphas}
             
         
-        if meanMetrics == None: 
+        if meanMetrics == None and self.searchMode == "halving": 
+            meanMetrics = self.successiveHalvingSearch(X, paramDict, computeObjectiveUV, minVal=True)
+        elif meanMetrics == None and self.searchMode == "warm": 
+            meanMetrics = self.warmStartSearch(X, paramDict, computeObjectiveUV, minVal=True)
+        elif meanMetrics == None: 
             meanMetrics = self.parallelGridSearch(X, paramDict, evaluationMethod, minVal=True)
         else: 
             resultDict, bestMetric = self.setBestLearner(meanMetrics, paramDict, minVal=True)
@@ -392,7 +762,11 @@ class MaxLocalAUC(AbstractRecommender):
         evaluationMethod = self.getEvaluationMethod() 
         paramDict = {"k": self.ks, "alpha": self.alphas, "maxNormU": self.maxNorms, "maxNormV": self.maxNorms}    
         
-        if meanMetrics == None: 
+        if meanMetrics == None and self.searchMode == "halving": 
+            meanMetrics = self.successiveHalvingSearch(X, paramDict, computeTestMetricUV, testX, minVal=minVal)
+        elif meanMetrics == None and self.searchMode == "warm": 
+            meanMetrics = self.warmStartSearch(X, paramDict, computeTestMetricUV, testX, minVal=minVal)
+        elif meanMetrics == None: 
             meanMetrics = self.parallelGridSearch(X, paramDict, evaluationMethod, testX, minVal=minVal)
         else: 
             resultDict, bestMetric = self.setBestLearner(meanMetrics, paramDict, minVal)
@@ -408,7 +782,11 @@ class MaxLocalAUC(AbstractRecommender):
         evaluationMethod = self.getEvaluationMethod() 
         paramDict = {"k": self.ks, "lmbda": self.lmbdas}       
         
-        if meanMetrics == None: 
+        if meanMetrics == None and self.searchMode == "halving": 
+            meanMetrics = self.successiveHalvingSearch(X, paramDict, computeTestMetricUV, testX, minVal=minVal)
+        elif meanMetrics == None and self.searchMode == "warm": 
+            meanMetrics = self.warmStartSearch(X, paramDict, computeTestMetricUV, testX, minVal=minVal)
+        elif meanMetrics == None: 
             meanMetrics = self.parallelGridSearch(X, paramDict, evaluationMethod, testX, minVal=minVal)
         else: 
             resultDict, bestMetric = self.setBestLearner(meanMetrics, paramDict, minVal)
@@ -452,24 +830,24 @@ class MaxLocalAUC(AbstractRecommender):
             gridInds.append(numpy.arange(paramDict[key].shape[0])) 
             
         meanMetrics = numpy.zeros(tuple(gridSize))
-        paramList = []
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            tasks = []
         
-        for icv, (trainX, testX) in enumerate(trainTestXs):
-            indexIter = itertools.product(*gridInds)
-            
-            for inds in indexIter: 
-                learner = self.copy()               
+            for icv, (trainX, testX) in enumerate(trainTestXs):
+                foldInd = executor.addFold(trainX, testX)
+                indexIter = itertools.product(*gridInds)
             
-                for i, (key, val) in enumerate(paramDict.items()):
-                    setattr(learner, key, val[inds[i]])
+                for inds in indexIter: 
+                    params = {}
+                    for i, (key, val) in enumerate(paramDict.items()):
+                        params[key] = val[inds[i]]
                 
-                paramList.append((trainX, testX, learner))
+                    tasks.append((foldInd, params))
             
-        if self.numProcesses != 1: 
-            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=100)
-            resultsIterator = pool.imap(evaluationMethod, paramList, self.chunkSize)
-        else: 
-            resultsIterator = itertools.imap(evaluationMethod, paramList)
+            resultsIterator = iter(executor.map(evaluationMethod, tasks))
+        finally: 
+            executor.close()
         
         for icv, (trainX, testX) in enumerate(trainTestXs):
             indexIter = itertools.product(*gridInds)
@@ -477,9 +855,153 @@ class MaxLocalAUC(AbstractRecommender):
                 metric = resultsIterator.next()
                 meanMetrics[inds] += metric/float(self.folds)
 
-        if self.numProcesses != 1:
-            pool.terminate()
+        resultDict, bestMetric = self.setBestLearner(meanMetrics, paramDict, minVal)
+        
+        return meanMetrics     
+
+    def successiveHalvingSearch(self, X, paramDict, evaluationMethod, testX=None, minVal=True):
+        """
+        Perform model selection with successive halving. All configurations are 
+        learnt for a small number of iterations, and then only the best 
+        1/halvingRate of them are learnt further, resuming from the U and V of their 
+        last stochastic gradient step, until the survivors reach maxIterations. The 
+        averaged factors restart from these U and V at each rung. The 
+        evaluationMethod returns a tuple (metric, U, V). Returns the grid of the last metric of each configuration. 
+        """
+        logging.debug("Successive halving search with params: " + str(paramDict))
+        
+        if testX==None:
+            trainTestXs = Sampling.shuffleSplitRows(X, self.folds, self.validationSize)
+        else: 
+            trainTestXs = [[X, testX]]        
+
+        gridSize = tuple(paramDict[key].shape[0] for key in paramDict.keys())
+        gridInds = [numpy.arange(size) for size in gridSize]
+        configs = list(itertools.product(*gridInds))
+        
+        numRungs = int(numpy.floor(numpy.log(len(configs))/numpy.log(self.halvingRate))) + 1
+        meanMetrics = numpy.zeros(gridSize)
+        lastRung = numpy.zeros(gridSize, numpy.int)
+        
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            foldInds = [executor.addFold(trainX, testX) for (trainX, testX) in trainTestXs]
+            stateInds = {}
+            startIteration = 0 
+        
+            for rung in range(numRungs): 
+                maxIterations = max(int(self.maxIterations*self.halvingRate**(rung - numRungs + 1)), 1)
+                logging.debug("Rung " + str(rung) + " with " + str(len(configs)) + " configurations and " + str(maxIterations) + " iterations")
+                tasks = []
+            
+                for inds in configs: 
+                    for foldInd in foldInds: 
+                        params = {"startIteration": startIteration, "maxIterations": maxIterations}
+                        
+                        if (inds, foldInd) in stateInds: 
+                            params["stateInd"] = stateInds[(inds, foldInd)]
+                        else: 
+                            params["U"], params["V"] = None, None
+                    
+                        for i, key in enumerate(paramDict.keys()):
+                            params[key] = paramDict[key][inds[i]]
+                        
+                        tasks.append((foldInd, params))
+            
+                resultsIterator = iter(executor.map(evaluationMethod, tasks))
+                states = {}
+            
+                for inds in configs: 
+                    meanMetrics[inds] = 0
+                    for foldInd in foldInds: 
+                        metric, U, V = resultsIterator.next()
+                        meanMetrics[inds] += metric/float(len(foldInds))
+                        states[(inds, foldInd)] = (U, V)
+                    lastRung[inds] = rung
+            
+                #Keep the best configurations 
+                configMetrics = numpy.array([meanMetrics[inds] for inds in configs])
+                if not minVal: 
+                    configMetrics = -configMetrics
+                numKeep = int(numpy.ceil(len(configs)/float(self.halvingRate)))
+                configs = [configs[i] for i in numpy.argsort(configMetrics, kind="mergesort")[0:numKeep]]
+                startIteration = maxIterations
+                
+                #Share the factors of the kept configurations with the next rung 
+                executor.clearStates()
+                stateInds = dict(((inds, foldInd), executor.addState(U=states[(inds, foldInd)][0], V=states[(inds, foldInd)][1])) for inds in configs for foldInd in foldInds)
+        finally: 
+            executor.close()
+        
+        #Only configurations which reached the last rung can be chosen 
+        finalMetrics = meanMetrics.copy()
+        finalMetrics[lastRung != numRungs-1] = numpy.inf if minVal else -numpy.inf
+        resultDict, bestMetric = self.setBestLearner(finalMetrics, paramDict, minVal)
+        
+        return meanMetrics     
 
+    def warmStartSearch(self, X, paramDict, evaluationMethod, testX=None, minVal=True):
+        """
+        Perform a grid search in which each configuration starts from the U and V 
+        learnt for its neighbour, the grid point with the previous value of one 
+        parameter. Points at the same distance from the first grid point are learnt 
+        in parallel, after the points they start from. Changing k changes the shape 
+        of U and V, so it is never warm started. The evaluationMethod returns a tuple 
+        (metric, U, V). Returns the grid of metrics. 
+        """
+        logging.debug("Warm start search with params: " + str(paramDict))
+        
+        if testX==None:
+            trainTestXs = Sampling.shuffleSplitRows(X, self.folds, self.validationSize)
+        else: 
+            trainTestXs = [[X, testX]]        
+
+        keys = paramDict.keys()
+        gridSize = tuple(paramDict[key].shape[0] for key in keys)
+        configs = list(itertools.product(*[numpy.arange(size) for size in gridSize]))
+        warmAxes = [i for i, key in enumerate(keys) if key != "k"]
+        distances = [sum(inds[i] for i in warmAxes) for inds in configs]
+        meanMetrics = numpy.zeros(gridSize)
+        
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            foldInds = [executor.addFold(trainX, testX) for (trainX, testX) in trainTestXs]
+            stateInds = {}
+        
+            for distance in range(max(distances)+1): 
+                wave = [inds for inds, d in zip(configs, distances) if d == distance]
+                tasks = []
+            
+                for inds in wave: 
+                    #Step back along the last warm started axis which is not at its start 
+                    axes = [i for i in warmAxes if inds[i] != 0]
+                    neighbour = inds[:axes[-1]] + (inds[axes[-1]]-1, ) + inds[axes[-1]+1:] if len(axes) != 0 else None
+                
+                    for foldInd in foldInds: 
+                        if (neighbour, foldInd) in stateInds: 
+                            params = {"stateInd": stateInds[(neighbour, foldInd)]}
+                        else: 
+                            params = {"U": None, "V": None}
+                    
+                        for i, key in enumerate(keys):
+                            params[key] = paramDict[key][inds[i]]
+                        
+                        tasks.append((foldInd, params))
+            
+                resultsIterator = iter(executor.map(evaluationMethod, tasks))
+                
+                #Share the factors of this wave with the next one 
+                executor.clearStates()
+                stateInds = {}
+            
+                for inds in wave: 
+                    for foldInd in foldInds: 
+                        metric, U, V = resultsIterator.next()
+                        meanMetrics[inds] += metric/float(len(foldInds))
+                        stateInds[(inds, foldInd)] = executor.addState(U=U, V=V)
+        finally: 
+            executor.close()
+            
         resultDict, bestMetric = self.setBestLearner(meanMetrics, paramDict, minVal)
         
         return meanMetrics     
@@ -512,8 +1034,11 @@ class MaxLocalAUC(AbstractRecommender):
         indPtr, colInds = SparseUtils.getOmegaListPtr(trainX)
         allIndPtr, allColInds = SparseUtils.getOmegaListPtr(X)
 
-        if U==None or V==None:
+        if U is None or V is None:
             U, V = self.initUV(trainX)
+        else: 
+            U = numpy.ascontiguousarray(U, self.dtype)
+            V = numpy.ascontiguousarray(V, self.dtype)
             
         if self.metric == "f1": 
             metricInd = 2 
@@ -523,72 +1048,60 @@ class MaxLocalAUC(AbstractRecommender):
             raise ValueError("Unknown metric: " + self.metric)
         
         bestMetric = 0 
-        bestU = 0 
-        bestV = 0
+        bestU = U.copy() 
+        bestV = V.copy()
         trainMeasures = []
         testMeasures = []        
-        loopInd = 0
+        loopInd = self.startIteration
         lastObj = 0 
         currentObj = lastObj - 2*self.eps
            
-        numBlocks = self.numProcesses+1 
         gi, gp, gq = self.computeGipq(X)
         normGp, normGq = self.computeNormGpq(indPtr, colInds, gp, gq, m)        
         
-        #Some shared variables
-        rowIsFree = sharedmem.ones(numBlocks, dtype=numpy.bool)
-        colIsFree = sharedmem.ones(numBlocks, dtype=numpy.bool)
-        
-        #Create shared factors 
-        U2 = sharedmem.zeros((m, self.k))
-        V2 = sharedmem.zeros((n, self.k))
-        muU2 = sharedmem.zeros((m, self.k))
-        muV2 = sharedmem.zeros((n, self.k))
-        
-        U2[:] = U[:]
-        V2[:] = V[:]
-        muU2[:] = U[:]
-        muV2[:] = V[:]
+        self.learnerCython = self.getCythonLearner()
+        scheduler = BlockScheduler(self, indPtr, colInds, U, V, gp, gq, normGp, normGq)
+        muU2 = scheduler.muU 
+        muV2 = scheduler.muV
         del U, V
         
-        rowBlockSize = int(numpy.ceil(float(m)/numBlocks))
-        colBlockSize = int(numpy.ceil(float(n)/numBlocks))
-        
-        lock = multiprocessing.Lock()        
         startTime = time.time()
-        loopInd = 0
-        iterationsPerBlock = sharedmem.zeros((numBlocks, numBlocks))
+        scheduler.start()
         
-        self.learnerCython = self.getCythonLearner()
-        nextRecord = 0 
+        try: 
+            nextRecord = loopInd 
 
-        while loopInd < self.maxIterations and abs(lastObj - currentObj) > self.eps:  
-            if loopInd >= nextRecord: 
-                if loopInd != 0: 
-                    print("")  
+            while loopInd < self.maxIterations and abs(lastObj - currentObj) > self.eps:  
+                if loopInd >= nextRecord: 
+                    if loopInd != 0: 
+                        print("")  
                     
-                printStr = self.recordResults(muU2, muV2, trainMeasures, testMeasures, loopInd, rowSamples, indPtr, colInds, testIndPtr, testColInds, allIndPtr, allColInds, gi, gp, gq, trainX, startTime)    
-                logging.debug(printStr) 
+                    printStr = self.recordResults(muU2, muV2, trainMeasures, testMeasures, loopInd, rowSamples, indPtr, colInds, testIndPtr, testColInds, allIndPtr, allColInds, gi, gp, gq, trainX, startTime)    
+                    logging.debug(printStr) 
                                 
-                if testIndPtr is not None and testMeasures[-1][metricInd] >= bestMetric: 
-                    bestMetric = testMeasures[-1][metricInd]
-                    bestU = muU2.copy() 
-                    bestV = muV2.copy() 
-                elif testIndPtr is None: 
-                    bestU = muU2.copy() 
-                    bestV = muV2.copy()  
+                    if testIndPtr is not None and testMeasures[-1][metricInd] >= bestMetric: 
+                        bestMetric = testMeasures[-1][metricInd]
+                        bestU = muU2.copy() 
+                        bestV = muV2.copy() 
+                    elif testIndPtr is None: 
+                        bestU = muU2.copy() 
+                        bestV = muV2.copy()  
                     
-                #Compute objective averaged over last 5 recorded steps 
-                trainMeasuresArr = numpy.array(trainMeasures)
-                lastObj = currentObj
-                currentObj = numpy.mean(trainMeasuresArr[-5:, 0])                       
+                    #Compute objective averaged over last 5 recorded steps 
+                    trainMeasuresArr = numpy.array(trainMeasures)
+                    lastObj = currentObj
+                    currentObj = numpy.mean(trainMeasuresArr[-5:, 0])                       
                     
-                nextRecord += self.recordStep
+                    nextRecord += self.recordStep
             
-            iterationsPerBlock = sharedmem.zeros((numBlocks, numBlocks))
-            self.parallelUpdateUV(X, U2, V2, muU2, muV2, numBlocks, rowBlockSize, colBlockSize, rowIsFree, colIsFree, indPtr, colInds, lock, gi, gp, gq, normGp, normGq, iterationsPerBlock, loopInd)    
-            loopInd += numpy.floor(iterationsPerBlock.mean())
-
+                scheduler.updateUV(loopInd)
+                loopInd += numpy.floor(scheduler.iterationsPerBlock.mean())
+        finally: 
+            scheduler.stop()
+            
+        #The iterate of the last step, from which learning can be resumed 
+        self.lastU = numpy.array(scheduler.U)
+        self.lastV = numpy.array(scheduler.V)
         totalTime = time.time() - startTime
         
         #Compute quantities for last U and V 
@@ -610,51 +1123,35 @@ class MaxLocalAUC(AbstractRecommender):
         else: 
             return self.U, self.V  
 
-    def parallelUpdateUV(self, X, U, V, muU, muV, numBlocks, rowBlockSize, colBlockSize, rowIsFree, colIsFree, indPtr, colInds, lock, gi, gp, gq, normGp, normGq, iterationsPerBlock, loopInd):
-        m, n = X.shape
-        gradientsPerBlock = sharedmem.zeros((numBlocks, numBlocks))
+    def hogwildUpdateUV(self, pool, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, sigmaU, sigmaV, numIterations): 
+        """
+        Perform numIterations stochastic updates of U and V using the numProcesses 
+        threads in pool, which write to U, V, muU and muV in place without locking. Each 
+        thread starts from a different offset of the row and column permutations so 
+        that the early updates are on disjoint rows and columns, however negative 
+        items and rows are still sampled from all of permutedColInds and permutedRowInds. 
+        """
+        numThreads = self.numProcesses 
+        rowStride = int(numpy.ceil(permutedRowInds.shape[0]/float(numThreads)))
+        colStride = int(numpy.ceil(permutedColInds.shape[0]/float(numThreads)))
+        iterationsPerThread = int(numpy.ceil(numIterations/float(numThreads)))
         
-        #Set up order of indices for stochastic methods 
-        permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
-        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
-
-        for i in range(numBlocks): 
-            for j in range(numBlocks):                 
-                gradientsPerBlock[i, j] = numpy.ceil(float(max(m, n))/(numBlocks**2))
+        paramList = []
+        for t in range(numThreads): 
+            threadRowInds = numpy.ascontiguousarray(numpy.roll(permutedRowInds, -t*rowStride))
+            threadColInds = numpy.ascontiguousarray(numpy.roll(permutedColInds, -t*colStride))
+            paramList.append((self.learnerCython, indPtr, colInds, U, V, muU, muV, threadRowInds, threadColInds, gp, gq, normGp, normGq, ind, iterationsPerThread, sigmaU, sigmaV))
         
-        assert gradientsPerBlock.sum() >= max(m,n)
-        #print(gradientsPerBlock.sum())
-
-        #Compute omega for each col block 
-        omegasList = []
-        for i in range(numBlocks): 
-            blockColInds = permutedColInds[i*colBlockSize:(i+1)*colBlockSize]
-            omegasList.append(restrictOmega(indPtr, colInds, blockColInds))
+        pool.map(updateUVHogwild, paramList)
 
-        processList = []        
+    def predict(self, maxItems, approximate=False): 
+        """
+        Return the top maxItems items for each user. If approximate is True then 
+        use a MipsIndex over the item factors, see mipsNumClusters and mipsNumProbes. 
+        """
+        if approximate: 
+            return self.predictApprox(maxItems)
         
-        if self.numProcesses != 1: 
-            for i in range(self.numProcesses):
-                learner = self.copy()
-                learner.learnerCython = self.getCythonLearner()
-                sharedArgs = rowIsFree, colIsFree, iterationsPerBlock, gradientsPerBlock, U, V, muU, muV, lock 
-                methodArgs = learner, rowBlockSize, colBlockSize, indPtr, colInds, permutedRowInds, permutedColInds, gi, gp, gq, normGp, normGq, i, loopInd, omegasList
-    
-                process = multiprocessing.Process(target=updateUVBlock, args=(sharedArgs, methodArgs))
-                process.start()
-                processList.append(process)
-            
-            for process in processList: 
-                process.join()
-                
-        else: 
-            learner = self.copy()
-            learner.learnerCython = self.getCythonLearner()
-            sharedArgs = rowIsFree, colIsFree, iterationsPerBlock, gradientsPerBlock, U, V, muU, muV, lock 
-            methodArgs = learner, rowBlockSize, colBlockSize, indPtr, colInds, permutedRowInds, permutedColInds, gi, gp, gq, normGp, normGq, 0, loopInd, omegasList
-            updateUVBlock(sharedArgs, methodArgs)
-            
-    def predict(self, maxItems): 
         return MCEvaluator.recommendAtk(self.U, self.V, maxItems)
 
     def recordResults(self, muU, muV, trainMeasures, testMeasures, loopInd, rowSamples, indPtr, colInds, testIndPtr, testColInds, allIndPtr, allColInds, gi, gp, gq, trainX, startTime): 
@@ -682,23 +1179,16 @@ class MaxLocalAUC(AbstractRecommender):
             printStr += " validation: obj~" + str('%.4f' % testMeasuresRow[0])
             printStr += " LAUC~" + str('%.4f' % testMeasuresRow[1])
 
-            try: 
-                for p in self.recommendSize: 
-                    f1Array, orderedItems = MCEvaluator.f1AtK((testIndPtr, testColInds), testOrderedItems, p, verbose=True)
-                    testMeasuresRow.append(f1Array[rowSamples].mean())
-            except: 
-                f1Array, orderedItems = MCEvaluator.f1AtK((testIndPtr, testColInds), testOrderedItems, self.recommendSize, verbose=True)
-                testMeasuresRow.append(f1Array[rowSamples].mean())
+            ks = numpy.array(self.recommendSize).ravel()
+            precisions, recalls, f1s, rrs, ndcgs = MCEvaluator.rankingMetricsAtK((testIndPtr, testColInds), testOrderedItems, ks)
+            
+            for i in range(ks.shape[0]): 
+                testMeasuresRow.append(f1s[rowSamples, i].mean())
 
             printStr += " f1@" + str(self.recommendSize) + "=" + str('%.4f' % testMeasuresRow[-1])                    
                    
-            try:
-                for p in self.recommendSize: 
-                    mrr, orderedItems = MCEvaluator.mrrAtK((testIndPtr, testColInds), testOrderedItems, p, verbose=True)
-                    testMeasuresRow.append(mrr[rowSamples].mean())
-            except: 
-                mrr, orderedItems = MCEvaluator.mrrAtK((testIndPtr, testColInds), testOrderedItems, self.recommendSize, verbose=True)
-                testMeasuresRow.append(mrr[rowSamples].mean())
+            for i in range(ks.shape[0]): 
+                testMeasuresRow.append(rrs[rowSamples, i].mean())
                 
             printStr += " mrr@" + str(self.recommendSize) + "=" + str('%.4f' % testMeasuresRow[-1])
             testMeasures.append(testMeasuresRow)
@@ -740,10 +1230,11 @@ class MaxLocalAUC(AbstractRecommender):
             
         return resultDict, bestMetric 
     
-    def singleLearnModel(self, X, verbose=False, U=None, V=None): 
+    def singleLearnModel(self, X, verbose=False, U=None, V=None, resume=False): 
         """
         Max local AUC with Frobenius norm penalty on V. Solve with (stochastic) gradient descent. 
-        The input is a sparse array. 
+        The input is a sparse array. If checkpointFile is set then the state is saved 
+        every checkpointStep iterations, and training resumes from it if resume is True. 
         """
         #Convert to a csarray for faster access 
         if scipy.sparse.issparse(X):
@@ -753,6 +1244,12 @@ class MaxLocalAUC(AbstractRecommender):
         
         m, n = X.shape        
         
+        #The validation split is repeated from the random state at the start of the run 
+        checkpoint = self.loadCheckpoint() if resume else None 
+        if checkpoint is not None: 
+            setRandState(checkpoint, "initial")
+        initialRandState = getRandState("initial")
+        
         #We keep a validation set in order to determine when to stop 
         if self.validationUsers != 0: 
             numValidationUsers = int(m*self.validationUsers)
@@ -773,8 +1270,14 @@ class MaxLocalAUC(AbstractRecommender):
         indPtr, colInds = SparseUtils.getOmegaListPtr(trainX)
         allIndPtr, allColInds = SparseUtils.getOmegaListPtr(X)
 
-        if type(U) != numpy.ndarray and type(V) != numpy.ndarray:
+        if checkpoint is not None: 
+            U = numpy.ascontiguousarray(checkpoint["U"], self.dtype)
+            V = numpy.ascontiguousarray(checkpoint["V"], self.dtype)
+        elif type(U) != numpy.ndarray and type(V) != numpy.ndarray:
             U, V = self.initUV(trainX)
+        else: 
+            U = numpy.ascontiguousarray(U, self.dtype)
+            V = numpy.ascontiguousarray(V, self.dtype)
             
         if self.metric == "f1": 
             metricInd = 2 
@@ -786,11 +1289,11 @@ class MaxLocalAUC(AbstractRecommender):
         muU = U.copy() 
         muV = V.copy()
         bestMetric = 0 
-        bestU = 0 
-        bestV = 0
+        bestU = U.copy() 
+        bestV = V.copy()
         trainMeasures = []
         testMeasures = []        
-        loopInd = 0
+        loopInd = self.startIteration
         lastObj = 0 
         currentObj = lastObj - 2*self.eps
         
@@ -801,43 +1304,87 @@ class MaxLocalAUC(AbstractRecommender):
         self.learnerCython = self.getCythonLearner()
         
         #Set up order of indices for stochastic methods 
-        permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
-        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+        if checkpoint is not None: 
+            permutedRowInds = checkpoint["permutedRowInds"]
+            permutedColInds = checkpoint["permutedColInds"]
+        else: 
+            permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
+            permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
         
         startTime = time.time()
+        
+        if checkpoint is not None: 
+            muU = numpy.ascontiguousarray(checkpoint["muU"], self.dtype)
+            muV = numpy.ascontiguousarray(checkpoint["muV"], self.dtype)
+            bestU = numpy.ascontiguousarray(checkpoint["bestU"], self.dtype)
+            bestV = numpy.ascontiguousarray(checkpoint["bestV"], self.dtype)
+            bestMetric, lastObj, currentObj, elapsedTime = checkpoint["scalars"]
+            loopInd = int(checkpoint["loopInd"])
+            trainMeasures = list(checkpoint["trainMeasures"])
+            testMeasures = list(checkpoint["testMeasures"])
+            startTime -= elapsedTime
+            setRandState(checkpoint, "current")
 
         gi, gp, gq = self.computeGipq(X)
         normGp, normGq = self.computeNormGpq(indPtr, colInds, gp, gq, m)
+        
+        #The threads persist over all iterations 
+        if self.hogwild and self.stochastic and self.batchSize == 0 and self.numProcesses != 1: 
+            pool = ThreadPool(processes=self.numProcesses)
+        else: 
+            pool = None
     
-        while loopInd < self.maxIterations and abs(lastObj - currentObj) > self.eps: 
-            sigmaU = self.getSigma(loopInd, self.alpha, m)
-            sigmaV = self.getSigma(loopInd, self.alpha, m)
+        try: 
+            while loopInd < self.maxIterations and abs(lastObj - currentObj) > self.eps: 
+                sigmaU = self.getSigma(loopInd, self.alpha, m)
+                sigmaV = self.getSigma(loopInd, self.alpha, m)
 
-            if loopInd % self.recordStep == 0: 
-                if loopInd != 0 and self.stochastic: 
-                    print("")  
+                if loopInd % self.recordStep == 0 or loopInd == self.startIteration: 
+                    if loopInd != 0 and self.stochastic: 
+                        print("")  
                     
-                printStr = self.recordResults(muU, muV, trainMeasures, testMeasures, loopInd, rowSamples, indPtr, colInds, testIndPtr, testColInds, allIndPtr, allColInds, gi, gp, gq, trainX, startTime)    
-                logging.debug(printStr) 
+                    printStr = self.recordResults(muU, muV, trainMeasures, testMeasures, loopInd, rowSamples, indPtr, colInds, testIndPtr, testColInds, allIndPtr, allColInds, gi, gp, gq, trainX, startTime)    
+                    logging.debug(printStr) 
                                 
-                if testIndPtr is not None and testMeasures[-1][metricInd] >= bestMetric: 
-                    bestMetric = testMeasures[-1][metricInd]
-                    logging.debug("Current best metric=" + str(bestMetric))
-                    bestU = muU.copy() 
-                    bestV = muV.copy() 
-                elif testIndPtr is None: 
-                    bestU = muU.copy() 
-                    bestV = muV.copy() 
-
-                #Compute objective averaged over last 5 recorded steps 
-                trainMeasuresArr = numpy.array(trainMeasures)
-                lastObj = currentObj
-                currentObj = numpy.mean(trainMeasuresArr[-5:, 0])   
+                    if testIndPtr is not None and testMeasures[-1][metricInd] >= bestMetric: 
+                        bestMetric = testMeasures[-1][metricInd]
+                        logging.debug("Current best metric=" + str(bestMetric))
+                        bestU = muU.copy() 
+                        bestV = muV.copy() 
+                    elif testIndPtr is None: 
+                        bestU = muU.copy() 
+                        bestV = muV.copy() 
+
+                    #Compute objective averaged over last 5 recorded steps 
+                    trainMeasuresArr = numpy.array(trainMeasures)
+                    lastObj = currentObj
+                    currentObj = numpy.mean(trainMeasuresArr[-5:, 0])   
                 
-            U  = numpy.ascontiguousarray(U)
-            self.updateUV(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, loopInd, sigmaU, sigmaV, numIterations)                       
-            loopInd += 1
+                U  = numpy.ascontiguousarray(U)
             
+                if pool is not None: 
+                    self.hogwildUpdateUV(pool, indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, loopInd, sigmaU, sigmaV, numIterations)
+                else: 
+                    self.updateUV(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, loopInd, sigmaU, sigmaV, numIterations)                       
+                loopInd += 1
+            
+                if self.checkpointFile is not None and loopInd % self.checkpointStep == 0: 
+                    state = {"U": U, "V": V, "muU": muU, "muV": muV, "bestU": bestU, "bestV": bestV, "loopInd": loopInd}
+                    state["scalars"] = numpy.array([bestMetric, lastObj, currentObj, time.time() - startTime])
+                    state["trainMeasures"] = numpy.array(trainMeasures)
+                    state["testMeasures"] = numpy.array(testMeasures)
+                    state["permutedRowInds"] = permutedRowInds
+                    state["permutedColInds"] = permutedColInds
+                    state.update(initialRandState)
+                    self.saveCheckpoint(state)
+        finally: 
+            if pool is not None: 
+                pool.terminate()
+            
+        #The iterate of the last step, from which learning can be resumed 
+        self.lastU = U 
+        self.lastV = V 
+        
         #Compute quantities for last U and V 
         totalTime = time.time() - startTime
         printStr = "\nFinished, time=" + str('%.1f' % totalTime) + " "
@@ -870,6 +1417,8 @@ class MaxLocalAUC(AbstractRecommender):
             
             muU[:] = U[:] 
             muV[:] = V[:]
+        elif self.batchSize != 0: 
+            self.getBatchLearner().updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, ind, numIterations, sigmaU, sigmaV)
         else: 
             self.learnerCython.updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, ind, numIterations, sigmaU, sigmaV)
 
@@ -0,0 +1,118 @@
+import numpy
+import logging
+import scipy.cluster.vq
+import scipy.sparse
+from sandbox.util.MCEvaluator import MCEvaluator
+
+class MipsIndex(object):
+    """
+    An inverted file index for maximum inner product search over the rows of an item
+    factor matrix V. The items are augmented with an extra coordinate so that they all
+    have the same norm, which turns the inner product search into a nearest neighbour
+    search, and then clustered with k-means. A query only scores the items in the
+    numProbes clusters closest to it, so increasing numProbes improves recall at the
+    expense of speed. With numProbes=numClusters the search is exact.
+    """
+    def __init__(self, numClusters=100, numProbes=10, maxIterations=10):
+        """
+        :param numClusters: The number of k-means clusters of items
+
+        :param numProbes: The number of clusters to search for each user
+
+        :param maxIterations: The number of k-means iterations used to build the index
+        """
+        self.numClusters = numClusters
+        self.numProbes = numProbes
+        self.maxIterations = maxIterations
+
+    def build(self, V):
+        """
+        Cluster the rows of V and store the items of each cluster contiguously.
+        """
+        self.V = V
+        n = V.shape[0]
+        numClusters = min(self.numClusters, n)
+
+        norms = numpy.sqrt((V**2).sum(1))
+        maxNorm = norms.max()
+        augmentedV = numpy.c_[V, numpy.sqrt(numpy.maximum(maxNorm**2 - norms**2, 0))]
+
+        logging.debug("Clustering " + str(n) + " items into " + str(numClusters) + " clusters")
+        centroids, labels = scipy.cluster.vq.kmeans2(augmentedV, numClusters, iter=self.maxIterations, minit="points")
+
+        #A query [u, 0] is closest to the centroid c maximising 2 u.c[:-1] - ||c||^2
+        self.centroids = numpy.ascontiguousarray(centroids[:, 0:-1])
+        self.centroidNorms = (centroids**2).sum(1)
+
+        self.clusterItems = numpy.array(numpy.argsort(labels, kind="mergesort"), numpy.int32)
+        self.clusterPtr = numpy.zeros(numClusters+1, numpy.int)
+        self.clusterPtr[1:] = numpy.cumsum(numpy.bincount(labels, minlength=numClusters))
+
+        return self
+
+    def recommendAtk(self, U, k, blockSize=1000, omegaList=None, verbose=False):
+        """
+        Find approximately the k largest elements of each row of U V^T, excluding the
+        items in omegaList which takes the same forms as in MCEvaluator.recommendAtk.
+        Rows with fewer than k candidate items are padded with -1.
+        """
+        m = U.shape[0]
+        numClusters = self.centroids.shape[0]
+        numProbes = min(self.numProbes, numClusters)
+        indPtr, colInds = MCEvaluator.omegaToPtr(omegaList, m)
+
+        orderedItems = numpy.zeros((m, k), numpy.int32)
+        scores = numpy.zeros((m, k))
+
+        for startRow in range(0, m, blockSize):
+            endRow = min(m, startRow+blockSize)
+            blockU = U[startRow:endRow, :]
+            numRows = endRow - startRow
+
+            centroidScores = 2*blockU.dot(self.centroids.T) - self.centroidNorms
+            if numProbes < numClusters:
+                probes = numpy.argpartition(-centroidScores, numProbes-1, axis=1)[:, 0:numProbes]
+            else:
+                probes = numpy.tile(numpy.arange(numClusters), (numRows, 1))
+
+            #Training items of the block as a sparse mask
+            blockIndPtr = indPtr[startRow:endRow+1] - indPtr[startRow]
+            blockColInds = colInds[indPtr[startRow]:indPtr[endRow]]
+            trainMask = scipy.sparse.csr_matrix((numpy.ones(blockColInds.shape[0], numpy.bool), blockColInds, blockIndPtr), shape=(numRows, self.V.shape[0]))
+
+            topScores = numpy.ones((numRows, k))*-numpy.inf
+            topItems = -numpy.ones((numRows, k), numpy.int32)
+
+            for c in range(numClusters):
+                users = numpy.nonzero((probes == c).any(1))[0]
+                items = self.clusterItems[self.clusterPtr[c]:self.clusterPtr[c+1]]
+
+                if users.shape[0] == 0 or items.shape[0] == 0:
+                    continue
+
+                clusterScores = blockU[users, :].dot(self.V[items, :].T)
+                if trainMask.nnz != 0: 
+                    clusterScores[trainMask[users, :][:, items].toarray()] = -numpy.inf
+
+                allScores = numpy.c_[topScores[users, :], clusterScores]
+                allItems = numpy.c_[topItems[users, :], numpy.tile(items, (users.shape[0], 1))]
+
+                if allScores.shape[1] > k:
+                    inds = numpy.argpartition(-allScores, k-1, axis=1)[:, 0:k]
+                else:
+                    inds = numpy.tile(numpy.arange(k), (users.shape[0], 1))
+
+                rowInds = numpy.arange(users.shape[0])[:, None]
+                topScores[users, :] = allScores[rowInds, inds]
+                topItems[users, :] = allItems[rowInds, inds]
+
+            topItems[topScores == -numpy.inf] = -1
+            inds = numpy.argsort(-topScores, axis=1, kind="mergesort")
+            rowInds = numpy.arange(numRows)[:, None]
+            orderedItems[startRow:endRow, :] = topItems[rowInds, inds]
+            scores[startRow:endRow, :] = topScores[rowInds, inds]
+
+        if verbose:
+            return orderedItems, scores
+        else:
+            return orderedItems
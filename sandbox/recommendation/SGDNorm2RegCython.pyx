@@ -7,8 +7,9 @@ from cython.operator cimport dereference as deref, preincrement as inc
 import cython
 import struct
 cimport numpy
+from cython.parallel import prange
 cdef extern from "math.h":
-    double sqrt(double x)
+    double sqrt(double x) nogil
     
 import numpy
 import numpy.random
@@ -33,6 +34,78 @@ cdef inline double norm2Diff(numpy.ndarray[double, ndim=2, mode="c"] M, numpy.nd
             norm += tmp*tmp
     return sqrt(norm)
 
+# one stochastic gradient step per known value of a cell of the grid, in a given order 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void updateCell(double* P, double* Q, int* omega0, int* omega1, double* nonzero, int* order, unsigned int start, unsigned int end, unsigned int k, double gamma, double lmbda, double t, double tStep, int t0) nogil:
+    cdef unsigned int ii, kk, u, i
+    cdef int ind
+    cdef double error, gradWeight, ge, gl, p, q
+    
+    for ii in range(start, end):
+        ind = order[ii]
+        u = omega0[ind]
+        i = omega1[ind]
+        
+        error = nonzero[ind]
+        for kk in range(k): 
+            error -= P[u*k+kk] * Q[i*k+kk]
+        gradWeight = gamma/sqrt(t+t0)
+        ge = gradWeight * error
+        gl = 1. - gradWeight * lmbda
+        for kk in range(k): 
+            p = P[u*k+kk]
+            q = Q[i*k+kk]
+            P[u*k+kk] = gl*p + ge*q
+            Q[i*k+kk] = gl*q + ge*p
+        t += tStep
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def stratifiedPass(numpy.ndarray[double, ndim=2, mode="c"] PP, numpy.ndarray[double, ndim=2, mode="c"] QQ, numpy.ndarray[int, ndim=1, mode="c"] omega0, numpy.ndarray[int, ndim=1, mode="c"] omega1, numpy.ndarray[double, ndim=1, mode="c"] nonzero, numpy.ndarray[int, ndim=1, mode="c"] order, numpy.ndarray[int, ndim=1, mode="c"] cellPtr, unsigned int numBlocks, double gamma, double lmbda, unsigned int t, unsigned int tmax, int t0): 
+    """
+    One epoch of stratified SGD (DSGD, Gemulla et al. 2011) over a numBlocks x numBlocks 
+    grid of the known values, whose indices are grouped by cell in order with cell c 
+    in order[cellPtr[c]:cellPtr[c+1]]. Each sub-epoch updates the numBlocks cells of a 
+    stratum in parallel, which share no rows or columns. Returns the number of 
+    gradient steps after the pass. 
+    """
+    cdef unsigned int B = numBlocks
+    cdef unsigned int k = PP.shape[1]
+    cdef unsigned int b, s, c, limit, total, start, end
+    cdef numpy.ndarray[int, ndim=1, mode="c"] subEpochs = numpy.array(numpy.random.permutation(B), numpy.int32)
+    cdef numpy.ndarray[int, ndim=1, mode="c"] cellInds = numpy.zeros(B, numpy.int32)
+    
+    if order.shape[0] == 0: 
+        return t 
+    
+    for s in subEpochs: 
+        total = 0 
+        for b in range(B): 
+            cellInds[b] = b*B + (b+s)%B
+            total += cellPtr[cellInds[b]+1] - cellPtr[cellInds[b]]
+        
+        if total == 0: 
+            continue 
+        
+        # stop due to limited time budget, when fewer steps are left than cells 
+        limit = total if t+total <= tmax else (tmax-t)/B
+        if limit == 0: 
+            break 
+        
+        for b in prange(B, nogil=True, schedule="dynamic"): 
+            start = cellPtr[cellInds[b]]
+            end = min(<unsigned int>cellPtr[cellInds[b]+1], start+limit)
+            updateCell(&PP[0, 0], &QQ[0, 0], &omega0[0], &omega1[0], &nonzero[0], &order[0], start, end, k, gamma, lmbda, t+b, B, t0)
+        
+        for b in range(B): 
+            t += min(<unsigned int>(cellPtr[cellInds[b]+1] - cellPtr[cellInds[b]]), limit)
+        
+        if t+B > tmax: 
+            break 
+            
+    return t 
+
 class SGDNorm2Reg(object):
     class ArithmeticError(ArithmeticError):
         def __init__(self):
@@ -55,6 +128,10 @@ class SGDNorm2Reg(object):
         
         # other parameters
         self.t0 = 1
+        # number of row and column blocks of the stratified parallel mode, 0 for sequential passes
+        self.numBlocks = 0
+        # number of gradient steps made by the last call to learnModel
+        self.t = 0
         
     def learnModel(self, X, P=None, Q=None, Z=None, storeAll=True, nTry=3, skipError=True): 
         """
@@ -133,6 +210,18 @@ class SGDNorm2Reg(object):
         cdef double error, deltaPNorm, deltaQNorm, ge, gl, tmp
         cdef numpy.ndarray[double, ndim=2, mode="c"] oldP = scipy.zeros((m,k))
         cdef numpy.ndarray[double, ndim=2, mode="c"] oldQ = scipy.zeros((n,k))
+        
+        # group the known values by cell of a grid of random row and column blocks
+        cdef unsigned int B = self.numBlocks
+        cdef numpy.ndarray[int, ndim=1, mode="c"] order, cellPtr
+        if B > 1:
+            omega0 = numpy.ascontiguousarray(omega0)
+            omega1 = numpy.ascontiguousarray(omega1)
+            nonzero = numpy.ascontiguousarray(nonzero)
+            cellInds = (numpy.random.permutation(m) % B)[omega0]*B + (numpy.random.permutation(n) % B)[omega1]
+            order = numpy.array(numpy.argsort(cellInds, kind="mergesort"), numpy.int32)
+            cellPtr = numpy.array(numpy.r_[0, numpy.cumsum(numpy.bincount(cellInds, minlength=B*B))], numpy.int32)
+        
         while True:
             if eps > 0:
                 oldP[:] = PP[:]
@@ -141,7 +230,14 @@ class SGDNorm2Reg(object):
             # do one pass on known values
             logging.debug("epoch " + str(nPass) + " (iteration " + str(t) + ")")
             nPass += 1
-            maxIter = min(nnz, tmax-t)
+            if B > 1:
+                # shuffle the visit order within each cell in place 
+                for c in range(B*B):
+                    numpy.random.shuffle(order[cellPtr[c]:cellPtr[c+1]])
+                t = stratifiedPass(PP, QQ, omega0, omega1, nonzero, order, cellPtr, B, gamma, lmbda, t, tmax, t0)
+                maxIter = 0
+            else:
+                maxIter = min(nnz, tmax-t)
             for ii in range(maxIter):
                 u = omega0[ii]
                 i = omega1[ii]
@@ -178,10 +274,11 @@ class SGDNorm2Reg(object):
                     break
             
             # stop due to limited time budget
-            if t >= tmax:
+            if t >= tmax or (B > 1 and t+B > tmax):
                 break
                 
         logging.debug("nb grad: " + str(t))
+        self.t = t
 
         if storeAll: 
             return ZList 
@@ -4,14 +4,17 @@ import logging
 import multiprocessing 
 from sandbox.recommendation.RecommenderUtils import computeTestMRR, computeTestF1
 from sandbox.util.Sampling import Sampling 
-from mrec.mf.wrmf import WRMFRecommender
+from sandbox.recommendation.WeightedMfKernels import updateFactors
 from sandbox.util.MCEvaluator import MCEvaluator 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
 from sandbox.recommendation.AbstractRecommender import AbstractRecommender
 
 
 class WeightedMf(AbstractRecommender): 
     """
-    A wrapper for the mrec class WRMFRecommender. 
+    Weighted matrix factorisation for implicit feedback, learnt with alternating 
+    least squares in which each row is updated with a few warm-started conjugate 
+    gradient steps. Set alg="mrec" to use the mrec class WRMFRecommender instead. 
     """
     
     def __init__(self, k, alpha=1, lmbda=0.015, maxIterations=20, w=0.9, numProcesses=None):
@@ -21,23 +24,89 @@ class WeightedMf(AbstractRecommender):
         #lmbda doesn't seem to make much difference at all 
         self.lmbda = lmbda 
         self.maxIterations = maxIterations 
+        self.alg = "cg" #Either "cg" or "mrec"
+        self.numCgSteps = 3 #Conjugate gradient steps per row in each sweep 
+        self.numThreads = 1 #Threads which update the rows in learnModel 
         
         self.ks = 2**numpy.arange(3, 8)
         self.lmbdas = 2.0**-numpy.arange(-1, 12, 2)
     
         
-    def learnModel(self, X): 
+    def learnModel(self, X, U=None, V=None): 
+        """
+        Learn the factors U and V of the sparse matrix X, which can also be a csarray 
+        or an InteractionStore. Each iteration updates every user and then every item, 
+        warm-started from the previous factors or from U and V when they are given. 
+        """
+        Xr = self.foldInMatrix(X)
+        
+        if self.alg == "mrec": 
+            from mrec.mf.wrmf import WRMFRecommender
+            learner = WRMFRecommender(self.k, self.alpha, self.lmbda, self.maxIterations)
+            
+            learner.fit(Xr)
+            self.U = learner.U 
+            self.V = learner.V 
+            
+            return self.U, self.V 
+        elif self.alg != "cg": 
+            raise ValueError("Unknown algorithm: " + str(self.alg))
+        
+        indPtr, colInds, vals = numpy.array(Xr.indptr, numpy.int32), numpy.array(Xr.indices, numpy.int32), numpy.array(Xr.data, numpy.float)
+        Xc = self.foldInMatrix(Xr.T)
+        indPtrT, rowInds, valsT = numpy.array(Xc.indptr, numpy.int32), numpy.array(Xc.indices, numpy.int32), numpy.array(Xc.data, numpy.float)
         
-        learner = WRMFRecommender(self.k, self.alpha, self.lmbda, self.maxIterations)
+        if U is None or V is None: 
+            U = numpy.random.randn(X.shape[0], self.k)*0.01
+            V = numpy.random.randn(X.shape[1], self.k)*0.01
         
-        learner.fit(X)
-        self.U = learner.U 
-        self.V = learner.V 
+        U = numpy.array(U, numpy.float)
+        V = numpy.array(V, numpy.float)
+        
+        for i in range(self.maxIterations): 
+            updateFactors(indPtr, colInds, vals, U, V, self.alpha, self.lmbda, self.numCgSteps, self.numThreads)
+            updateFactors(indPtrT, rowInds, valsT, V, U, self.alpha, self.lmbda, self.numCgSteps, self.numThreads)
+        
+        self.U = U 
+        self.V = V 
         
         return self.U, self.V 
 
-    def predict(self, maxItems): 
-        return MCEvaluator.recommendAtk(self.U, self.U, maxItems)
+    def foldInRows(self, X, W): 
+        """
+        Solve the weighted least squares problem of WRMF for the factors of the rows of 
+        the csr_matrix X with the factors W of its columns fixed. The confidence of 
+        X[i, j] is 1 + alpha*X[i, j] and the preference is 1 for the nonzero elements. 
+        """
+        WtW = W.T.dot(W)
+        regI = self.lmbda*numpy.eye(W.shape[1])
+        newFactors = numpy.zeros((X.shape[0], W.shape[1]))
+        
+        for i in range(X.shape[0]): 
+            inds = X.indices[X.indptr[i]:X.indptr[i+1]]
+            c = self.alpha*X.data[X.indptr[i]:X.indptr[i+1]]
+            Wi = W[inds, :]
+            
+            A = WtW + (Wi.T*c).dot(Wi) + regI
+            newFactors[i, :] = numpy.linalg.solve(A, Wi.T.dot(1 + c))
+        
+        return newFactors 
+        
+    def foldInU(self, X): 
+        return self.foldInRows(X, self.V)
+        
+    def foldInV(self, X): 
+        return self.foldInRows(X, self.U)
+
+    def predict(self, maxItems, approximate=False): 
+        """
+        Return the top maxItems items for each user. If approximate is True then 
+        use a MipsIndex over the item factors, see mipsNumClusters and mipsNumProbes. 
+        """
+        if approximate: 
+            return self.predictApprox(maxItems)
+        
+        return MCEvaluator.recommendAtk(self.U, self.V, maxItems)
         
     def modelSelect(self, X, colProbs=None): 
         """
@@ -56,32 +125,25 @@ class WeightedMf(AbstractRecommender):
             raise ValueError("Invalid metric: " + self.metric)        
         
         logging.debug("Performing model selection")
-        paramList = []        
-        
-        for i, k in enumerate(self.ks): 
-            for j, lmbda in enumerate(self.lmbdas): 
-                for icv, (trainX, testX) in enumerate(trainTestXs):                
-                    learner = self.copy()
-                    learner.k = k
-                    learner.lmbda = lmbda 
-                
-                    paramList.append((trainX.toScipyCsr(), testX.toScipyCsr(), learner))
+        executor = ModelSelectExecutor(self, self.numProcesses, self.chunkSize)
+        try: 
+            foldInds = [executor.addFold(trainX.toScipyCsr(), testX.toScipyCsr()) for (trainX, testX) in trainTestXs]
+            tasks = []        
+        
+            for i, k in enumerate(self.ks): 
+                for j, lmbda in enumerate(self.lmbdas): 
+                    for foldInd in foldInds:                
+                        tasks.append((foldInd, {"k": k, "lmbda": lmbda}))
             
-        if self.numProcesses != 1: 
-            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=100)
-            resultsIterator = pool.imap(evaluationMethod, paramList, self.chunkSize)
-        else: 
-            import itertools
-            resultsIterator = itertools.imap(evaluationMethod, paramList)
+            resultsIterator = iter(executor.map(evaluationMethod, tasks))
+        finally: 
+            executor.close()
         
         for i, k in enumerate(self.ks):
             for j, lmbda in enumerate(self.lmbdas):
                 for icv in range(len(trainTestXs)):             
                     testMetrics[i, j, icv] = resultsIterator.next()
         
-        if self.numProcesses != 1: 
-            pool.terminate()
-            
         meanTestMetrics= numpy.mean(testMetrics, 2)
         stdTestMetrics = numpy.std(testMetrics, 2)
         
@@ -101,12 +163,16 @@ class WeightedMf(AbstractRecommender):
         self.copyParams(learner)
         learner.ks = self.ks
         learner.lmbdas = self.lmbdas
+        learner.alg = self.alg
+        learner.numCgSteps = self.numCgSteps
+        learner.numThreads = self.numThreads
 
         return learner 
 
     def __str__(self): 
         outputStr = "WeightedMf: lmbda=" + str(self.lmbda) + " k=" + str(self.k) + " alpha=" + str(self.alpha)
         outputStr += " maxIterations=" + str(self.maxIterations)
+        outputStr += " alg=" + str(self.alg) + " numCgSteps=" + str(self.numCgSteps) + " numThreads=" + str(self.numThreads)
         outputStr += super(WeightedMf, self).__str__()
         
         return outputStr         
\ No newline at end of file
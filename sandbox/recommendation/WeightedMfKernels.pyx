@@ -0,0 +1,118 @@
+#cython: profile=False
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: nonecheck=False
+#cython: cdivision=True
+import cython
+cimport numpy
+import numpy
+from cython.parallel import prange, parallel
+from libc.stdlib cimport malloc, free
+
+"""
+Alternating least squares for implicit feedback (Hu et al., 2008) in which each row
+solve is replaced by a few steps of conjugate gradient warm-started from the current
+factors (Takacs et al., 2011). The confidence of a nonzero X[i, j] is 1 + alpha*X[i, j]
+with preference 1, and the zeros have confidence 1 and preference 0.
+"""
+
+cdef inline double dotK(double* x, double* y, unsigned int k) nogil:
+    cdef double result = 0
+    cdef unsigned int s
+    for s in range(k):
+        result += x[s]*y[s]
+    return result
+
+cdef void gramProduct(double* WtW, double* W, int* colInds, double* vals, unsigned int start, unsigned int end, double* x, double* out, double alpha, double lmbda, unsigned int k) nogil:
+    """
+    Compute out = (W^T W + W_i^T C_i W_i + lmbda I) x for the columns colInds[start:end]
+    of row i with confidences 1 + alpha*vals.
+    """
+    cdef unsigned int s, t, jj
+    cdef double* w
+    cdef double d
+
+    for s in range(k):
+        d = lmbda*x[s]
+        for t in range(k):
+            d += WtW[s*k+t]*x[t]
+        out[s] = d
+
+    for jj in range(start, end):
+        w = &W[colInds[jj]*k]
+        d = alpha*vals[jj]*dotK(w, x, k)
+        for s in range(k):
+            out[s] += d*w[s]
+
+cdef void conjugateGradient(double* u, double* WtW, double* W, int* colInds, double* vals, unsigned int start, unsigned int end, double alpha, double lmbda, unsigned int k, unsigned int numSteps, double* r, double* p, double* Ap) nogil:
+    """
+    Improve u with numSteps of conjugate gradient on the normal equations of the row with
+    columns colInds[start:end]. The arrays r, p and Ap are scratch space of size k.
+    """
+    cdef unsigned int s, jj, step
+    cdef double* w
+    cdef double c, a, rsOld, rsNew
+
+    #The residual r = W_i^T C_i p_i - A u
+    gramProduct(WtW, W, colInds, vals, start, end, u, Ap, alpha, lmbda, k)
+    for s in range(k):
+        r[s] = -Ap[s]
+    for jj in range(start, end):
+        w = &W[colInds[jj]*k]
+        c = 1 + alpha*vals[jj]
+        for s in range(k):
+            r[s] += c*w[s]
+
+    for s in range(k):
+        p[s] = r[s]
+    rsOld = dotK(r, r, k)
+
+    for step in range(numSteps):
+        if rsOld < 1e-20:
+            break
+
+        gramProduct(WtW, W, colInds, vals, start, end, p, Ap, alpha, lmbda, k)
+        a = rsOld/dotK(p, Ap, k)
+
+        for s in range(k):
+            u[s] += a*p[s]
+            r[s] -= a*Ap[s]
+
+        rsNew = dotK(r, r, k)
+        for s in range(k):
+            p[s] = r[s] + (rsNew/rsOld)*p[s]
+        rsOld = rsNew
+
+def updateFactors(int[::1] indPtr, int[::1] colInds, double[::1] vals, double[:, ::1] U, double[:, ::1] W, double alpha, double lmbda, unsigned int numSteps=3, unsigned int numThreads=1):
+    """
+    Update each row U[i, :] in place with numSteps of conjugate gradient towards the
+    weighted least squares solution for row i of the CSR matrix (indPtr, colInds, vals)
+    with the column factors W fixed. The Gram matrix W^T W is computed once and shared
+    and the rows are split dynamically over numThreads threads.
+    """
+    cdef unsigned int m = U.shape[0]
+    cdef unsigned int k = U.shape[1]
+    cdef int i
+    cdef double[:, ::1] WtW
+    cdef double* r
+    cdef double* p
+    cdef double* Ap
+
+    if indPtr.shape[0] != m+1 or W.shape[1] != k:
+        raise ValueError("U and W do not match the CSR matrix")
+    if m == 0 or k == 0:
+        return
+
+    WtW = numpy.ascontiguousarray(numpy.asarray(W).T.dot(W))
+
+    with nogil, parallel(num_threads=max(numThreads, 1)):
+        r = <double*>malloc(k*sizeof(double))
+        p = <double*>malloc(k*sizeof(double))
+        Ap = <double*>malloc(k*sizeof(double))
+
+        for i in prange(m, schedule="dynamic", chunksize=64):
+            conjugateGradient(&U[i, 0], &WtW[0, 0], &W[0, 0], &colInds[0], &vals[0], indPtr[i], indPtr[i+1], alpha, lmbda, k, numSteps, r, p, Ap)
+
+        free(r)
+        free(p)
+        free(Ap)
@@ -20,7 +20,7 @@ class BprRecommenderProfile(object):
         self.X, U, V = DatasetUtils.syntheticDataset1(u=0.2, sd=0.2)
         
         
-    def profileLearnModel(self):
+    def profileLearnModel(self, numThreads=1):
         #Profile full gradient descent 
         u = 0.2
         w = 1-u
@@ -30,10 +30,12 @@ class BprRecommenderProfile(object):
         learner.maxIterations = 10
         learner.recordStep = 10
         learner.numAucSamples = 5
+        learner.numThreads = numThreads
         print(learner)
         print(self.X.nnz)
                 
         ProfileUtils.profile('learner.learnModel(self.X)', globals(), locals())
         
 profiler = BprRecommenderProfile()
-profiler.profileLearnModel()  
\ No newline at end of file
+profiler.profileLearnModel()
+#profiler.profileLearnModel(numThreads=4)  
\ No newline at end of file
@@ -0,0 +1,39 @@
+import numpy
+import logging
+import sys
+import scipy.sparse
+from sandbox.util.ProfileUtils import ProfileUtils
+from sandbox.recommendation.KNNRecommender import KNNRecommender
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+class KNNRecommenderProfile(object):
+    def __init__(self):
+        numpy.random.seed(21)
+
+        #A sparse matrix with many items
+        m = 20000
+        n = 200000
+        self.k = 50
+        nnz = 2000000
+        self.X = scipy.sparse.csr_matrix((numpy.ones(nnz), (numpy.random.randint(0, m, nnz), numpy.random.randint(0, n, nnz))), shape=(m, n))
+
+    def profileLearnModel(self, numThreads=1):
+        learner = KNNRecommender(self.k)
+        learner.numThreads = numThreads
+        print(learner)
+        print(self.X.nnz)
+
+        ProfileUtils.profile('learner.learnModel(self.X)', globals(), locals())
+
+    def profilePredict(self, numThreads=1):
+        learner = KNNRecommender(self.k)
+        learner.numThreads = numThreads
+        learner.learnModel(self.X)
+
+        ProfileUtils.profile('learner.predict(20)', globals(), locals())
+
+profiler = KNNRecommenderProfile()
+profiler.profileLearnModel()
+#profiler.profileLearnModel(numThreads=4)
+#profiler.profilePredict()
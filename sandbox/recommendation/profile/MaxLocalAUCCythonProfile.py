@@ -1,9 +1,14 @@
 import numpy
 import logging
 import sys
+import time
 from sandbox.util.ProfileUtils import ProfileUtils
 from sandbox.recommendation.MaxLocalAUCCython import MaxLocalAUCCython
 from sandbox.recommendation.MaxLocalAUC import MaxLocalAUC
+from sandbox.recommendation.MaxAUCHinge import MaxAUCHinge
+from sandbox.recommendation.MaxAUCLogistic import MaxAUCLogistic
+from sandbox.recommendation.MaxAUCSigmoid import MaxAUCSigmoid
+from sandbox.recommendation.MaxAUCTanh import MaxAUCTanh
 from sandbox.util.SparseUtils import SparseUtils
 from sandbox.util.MCEvaluator import MCEvaluator
 from sandbox.util.Sampling import Sampling
@@ -121,7 +126,45 @@ class MaxLocalAUCCythonProfile(object):
                 
         ProfileUtils.profile('run()', globals(), locals())
 
+    def profileUpdateUVApprox(self):
+        """
+        Print the mean time of a single stochastic update of a row of U and V for 
+        each of the losses with double and single precision factors. 
+        """
+        k = 10
+        indPtr, colInds = SparseUtils.getOmegaListPtr(self.X)  
+
+        gp = numpy.random.rand(self.n)
+        gp /= gp.sum()        
+        gq = numpy.random.rand(self.n)
+        gq /= gq.sum()   
+        
+        permutedRowInds = numpy.array(numpy.random.permutation(self.m), numpy.uint32)
+        permutedColInds = numpy.array(numpy.random.permutation(self.n), numpy.uint32)   
+        
+        maxLocalAuc = MaxLocalAUC(k, w=0.9)
+        normGp, normGq = maxLocalAuc.computeNormGpq(indPtr, colInds, gp, gq, self.m)
+        
+        numIterations = 20000
+        
+        for learnerClass in [MaxAUCHinge, MaxAUCLogistic, MaxAUCSigmoid, MaxAUCTanh]: 
+            for dtype in [numpy.float64, numpy.float32]: 
+                learner = learnerClass(k)
+                learner.printStep = numIterations
+                
+                U = numpy.array(numpy.random.rand(self.m, k), dtype)
+                V = numpy.array(numpy.random.rand(self.n, k), dtype)
+                muU = U.copy()
+                muV = V.copy()
+                
+                startTime = time.time()
+                learner.updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, 0, numIterations, 0.1, 0.1)
+                updateTime = (time.time() - startTime)/numIterations
+                
+                print("\n" + learnerClass.__name__ + " " + numpy.dtype(dtype).name + ": " + str(updateTime*10**6) + " microseconds per update")
+
 profiler = MaxLocalAUCCythonProfile()
 #profiler.profileDerivativeVjApprox()
 profiler.profileDerivativeUiApprox()
-#profiler.profileObjective()
\ No newline at end of file
+#profiler.profileObjective()
+#profiler.profileUpdateUVApprox()
\ No newline at end of file
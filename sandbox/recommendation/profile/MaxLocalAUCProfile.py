@@ -2,6 +2,8 @@ import numpy
 import logging
 import sys
 import os
+import time
+import multiprocessing
 from sandbox.util.ProfileUtils import ProfileUtils
 from sandbox.recommendation.MaxLocalAUC import MaxLocalAUC, restrictOmega
 from sandbox.util.SparseUtils import SparseUtils
@@ -131,16 +133,68 @@ class MaxLocalAUCProfile(object):
 
         colIndsSubset = numpy.random.choice(n, 500, replace=False)
         
+        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+        numBlocks = 4
+        
         def run(): 
             for i in range(100): 
                 newIndPtr, newColInds = restrictOmega(indPtr, colInds, colIndsSubset)
-
+                omegasList = SparseUtilsCython.partitionOmega(indPtr, colInds, permutedColInds, numBlocks)
 
         ProfileUtils.profile('run()', globals(), locals())
 
+    def profileHogwildScaling(self): 
+        #Throughput of the lock-free threaded updates from 1 to N cores 
+        X, U, V = DatasetUtils.syntheticDataset1(u=0.01, m=10000, n=2000)
+        m, n = X.shape
+        
+        u = 0.2
+        w = 1-u
+        eps = 10**-6
+        alpha = 0.5
+        maxLocalAuc = MaxLocalAUC(self.k, w, alpha=alpha, eps=eps, stochastic=True)
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.recordStep = maxLocalAuc.maxIterations
+        maxLocalAuc.initialAlg = "rand"
+        maxLocalAuc.rate = "constant"
+        maxLocalAuc.hogwild = True
+        maxLocalAuc.validationUsers = 0.0
+        
+        numUpdates = maxLocalAuc.maxIterations*max(m, n)
+        
+        for numProcesses in range(1, multiprocessing.cpu_count()+1): 
+            maxLocalAuc.numProcesses = numProcesses
+            startTime = time.time()
+            maxLocalAuc.learnModel(X, randSeed=21)
+            totalTime = time.time() - startTime
+            logging.debug("numProcesses=" + str(numProcesses) + " time=" + str('%.2f' % totalTime) + " updates/s=" + str('%.1f' % (numUpdates/totalTime)))
+
+    def profileBatchConvergence(self): 
+        #Objective per epoch and time of the mini-batch updates against single user SGD 
+        X, U, V = DatasetUtils.syntheticDataset1(u=0.01, m=5000, n=2000)
+        
+        u = 0.2
+        w = 1-u
+        eps = 10**-6
+        alpha = 0.5
+        maxLocalAuc = MaxLocalAUC(64, w, alpha=alpha, eps=eps, stochastic=True)
+        maxLocalAuc.maxIterations = 20
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.initialAlg = "rand"
+        maxLocalAuc.rate = "constant"
+        maxLocalAuc.validationUsers = 0.0
+        maxLocalAuc.numProcesses = 1
+        
+        for batchSize in [0, 50, 200]: 
+            maxLocalAuc.batchSize = batchSize
+            U, V, trainMeasures, testMeasures, iterations, totalTime = maxLocalAuc.learnModel(X, verbose=True, randSeed=21)
+            logging.debug("batchSize=" + str(batchSize) + " time=" + str('%.2f' % totalTime) + " objectives=" + str(trainMeasures[:, 0]))
+
 profiler = MaxLocalAUCProfile()
 profiler.profileLearnModel()  
 #profiler.profileLearnModel2()
 #profiler.profileLocalAucApprox()
 #profiler.profileRandomChoice()
-#profiler.profileRestrictOmega()
\ No newline at end of file
+#profiler.profileRestrictOmega()
+#profiler.profileHogwildScaling()
+#profiler.profileBatchConvergence()
@@ -0,0 +1,54 @@
+import numpy
+import logging
+import sys
+import time
+from sandbox.util.ProfileUtils import ProfileUtils
+from sandbox.recommendation.MipsIndex import MipsIndex
+from sandbox.util.MCEvaluator import MCEvaluator
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+class MipsIndexProfile(object):
+    def __init__(self):
+        numpy.random.seed(21)        
+        
+        #Low rank factors with 1M items and clustered item vectors 
+        m = 2000
+        n = 1000000
+        self.k = 20 
+        self.maxItems = 10 
+        
+        self.U = numpy.random.randn(m, self.k)
+        centres = numpy.random.randn(1000, self.k)
+        self.V = centres[numpy.random.randint(0, 1000, n), :] + 0.3*numpy.random.randn(n, self.k)
+        
+    def profileRecommendAtk(self):
+        """
+        Report recall@k against the exact recommendAtk and the speedup for several 
+        numbers of probes. 
+        """
+        startTime = time.time()
+        exactItems = MCEvaluator.recommendAtk(self.U, self.V, self.maxItems)
+        exactTime = time.time() - startTime
+        logging.debug("Exact time=" + str('%.2f' % exactTime))
+        
+        startTime = time.time()
+        index = MipsIndex(numClusters=1000).build(self.V)
+        logging.debug("Build time=" + str('%.2f' % (time.time() - startTime)))
+        
+        for numProbes in [1, 5, 10, 20, 50, 100]: 
+            index.numProbes = numProbes 
+            startTime = time.time()
+            approxItems = index.recommendAtk(self.U, self.maxItems)
+            approxTime = time.time() - startTime
+            
+            recall = numpy.mean([numpy.intersect1d(exactItems[i, :], approxItems[i, :]).shape[0] for i in range(self.U.shape[0])])/float(self.maxItems)
+            logging.debug("numProbes=" + str(numProbes) + " recall@" + str(self.maxItems) + "=" + str('%.3f' % recall) + " time=" + str('%.2f' % approxTime) + " speedup=" + str('%.1f' % (exactTime/approxTime)))
+        
+    def profileRecommendAtk2(self):
+        index = MipsIndex(numClusters=1000, numProbes=10).build(self.V)
+        ProfileUtils.profile('index.recommendAtk(self.U, self.maxItems)', globals(), locals())
+
+profiler = MipsIndexProfile()
+profiler.profileRecommendAtk()  
+#profiler.profileRecommendAtk2()
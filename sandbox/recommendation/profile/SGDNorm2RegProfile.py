@@ -39,13 +39,14 @@ class SGDNorm2RegProfile(object):
         self.X = SparseUtils.generateSparseLowRank((n, m), self.r, nKnown)
         print(self.X.nnz)
         
-    def profileLearnModel(self, useProfiler=True, eps=10**(-6)):
+    def profileLearnModel(self, useProfiler=True, eps=10**(-6), numBlocks=0):
         k = 100
         lmbda = 0.001
         tmax=10**7
         gamma = 1
         
         learner = SGDNorm2Reg(k, lmbda, eps, tmax)
+        learner.numBlocks = numBlocks
         
         if useProfiler:
             ProfileUtils.profile('learner.learnModel(self.X, storeAll=False)', globals(), locals())
@@ -56,6 +57,7 @@ if __name__ == "__main__":
     profiler = SGDNorm2RegProfile()
     profiler.profileLearnModel()
 #    profiler.profileLearnModel(eps=-1.)
+#    profiler.profileLearnModel(numBlocks=8)
     # with n = 480000, m = 18000, self.r = 200, nKnown = 10**6, tmax=10**7, k=100
     # !! norm2 is negligible (4s) !!
     # 45s with Cython
@@ -0,0 +1,53 @@
+import numpy
+import logging
+import sys
+import time
+from sandbox.util.ProfileUtils import ProfileUtils
+from sandbox.recommendation.WeightedMf import WeightedMf
+from sandbox.util.SparseUtils import SparseUtils
+from sandbox.util.MCEvaluator import MCEvaluator
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+class WeightedMfProfile(object):
+    def __init__(self):
+        numpy.random.seed(21)
+
+        #Create a low rank matrix
+        m = 5000
+        n = 2000
+        self.k = 32
+        self.X = SparseUtils.generateSparseBinaryMatrix((m, n), 10, csarray=True).toScipyCsr()
+        self.X.sort_indices()
+        self.positiveArray = (numpy.array(self.X.indptr, numpy.uint32), numpy.array(self.X.indices, numpy.uint32))
+
+    def profileLearnModel(self, numThreads=1):
+        learner = WeightedMf(self.k, maxIterations=10)
+        learner.numThreads = numThreads
+        print(learner)
+        print(self.X.nnz)
+
+        ProfileUtils.profile('learner.learnModel(self.X)', globals(), locals())
+
+    def benchmarkMrec(self):
+        """
+        Compare the time and approximate AUC of the conjugate gradient updates against
+        the mrec WRMFRecommender on the same CSR matrix.
+        """
+        for alg, numThreads in [("mrec", 1), ("cg", 1), ("cg", 4)]:
+            numpy.random.seed(21)
+            learner = WeightedMf(self.k, maxIterations=10)
+            learner.alg = alg
+            learner.numThreads = numThreads
+
+            startTime = time.time()
+            U, V = learner.learnModel(self.X)
+            learnTime = time.time() - startTime
+
+            auc = MCEvaluator.localAUCApprox(self.positiveArray, U, V, 0.0)
+            logging.debug("alg=" + alg + " numThreads=" + str(numThreads) + " time=" + str('%.2f' % learnTime) + " AUC~" + str('%.3f' % auc))
+
+profiler = WeightedMfProfile()
+profiler.benchmarkMrec()
+#profiler.profileLearnModel()
+#profiler.profileLearnModel(numThreads=4)
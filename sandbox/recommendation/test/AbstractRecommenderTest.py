@@ -0,0 +1,104 @@
+import sys
+import numpy
+import unittest
+import logging
+import scipy.sparse
+import numpy.testing as nptst
+from sandbox.recommendation.AbstractRecommender import AbstractRecommender
+
+class LinearRecommender(AbstractRecommender):
+    """
+    A recommender whose folded in factors are the products of the interactions with
+    the fixed factors, so the shared fold-in code can be checked exactly.
+    """
+    def __init__(self, U, V):
+        super(LinearRecommender, self).__init__(1)
+        self.U = U
+        self.V = V
+
+    def foldInU(self, X):
+        return X.dot(self.V)
+
+    def foldInV(self, X):
+        return X.dot(self.U)
+
+class CsArray(object):
+    """
+    Stands in for a csarray, which foldInMatrix converts with toScipyCsr.
+    """
+    def __init__(self, X):
+        self.X = X
+        self.shape = X.shape
+
+    def toScipyCsr(self):
+        return self.X
+
+class AbstractRecommenderTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.random.seed(21)
+
+    def testAppendRows(self):
+        U = numpy.random.rand(10, 3)
+        learner = LinearRecommender(U, numpy.random.rand(5, 3))
+
+        newRows = numpy.random.rand(4, 3)
+        nptst.assert_array_equal(learner.appendRows("U", newRows), numpy.arange(10, 14))
+        nptst.assert_array_equal(learner.U, numpy.r_[U, newRows])
+        buffer = learner.rowBuffers["U"]
+        self.assertEquals(buffer.shape[0], 20)
+
+        #Rows are written into the spare capacity of the same buffer
+        newRows2 = numpy.random.rand(6, 3)
+        nptst.assert_array_equal(learner.appendRows("U", newRows2), numpy.arange(14, 20))
+        self.assertTrue(learner.U.base is buffer)
+        nptst.assert_array_equal(learner.U, numpy.r_[U, newRows, newRows2])
+
+        #A full buffer is doubled
+        learner.appendRows("U", newRows)
+        self.assertEquals(learner.rowBuffers["U"].shape[0], 40)
+        nptst.assert_array_equal(learner.U, numpy.r_[U, newRows, newRows2, newRows])
+
+        #A replaced attribute is copied to a new buffer
+        U2 = numpy.random.rand(3, 3)
+        learner.U = U2
+        learner.appendRows("U", newRows)
+        self.assertTrue(learner.U.base is not buffer)
+        nptst.assert_array_equal(learner.U, numpy.r_[U2, newRows])
+
+    def testFoldIn(self):
+        m = 20
+        n = 10
+        k = 3
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+        learner = LinearRecommender(U.copy(), V.copy())
+
+        X = scipy.sparse.rand(5, n, 0.3, format="csr")
+        newUsers = learner.foldInUsers(X)
+        nptst.assert_array_equal(newUsers, numpy.arange(m, m+5))
+        nptst.assert_array_equal(learner.U[0:m, :], U)
+        nptst.assert_array_almost_equal(learner.U[newUsers, :], X.dot(V))
+
+        #The columns of X are the new items, and the current users include the new ones
+        X = scipy.sparse.rand(m+5, 4, 0.3, format="csc")
+        newItems = learner.foldInItems(CsArray(X))
+        nptst.assert_array_equal(newItems, numpy.arange(n, n+4))
+        nptst.assert_array_equal(learner.V[0:n, :], V)
+        nptst.assert_array_almost_equal(learner.V[newItems, :], X.T.dot(learner.U))
+
+        self.assertRaises(ValueError, learner.foldInUsers, scipy.sparse.rand(2, n, 0.3, format="csr"))
+        self.assertRaises(ValueError, learner.foldInItems, scipy.sparse.rand(m, 2, 0.3, format="csr"))
+
+    def testFoldInMatrix(self):
+        X = scipy.sparse.csr_matrix((numpy.array([1.0, 2.0, 3.0]), numpy.array([2, 0, 1]), numpy.array([0, 2, 3])), shape=(2, 3))
+        self.assertFalse(X.has_sorted_indices)
+
+        for Y in [X, X.tocsc(), CsArray(X)]:
+            Z = AbstractRecommender.foldInMatrix(Y)
+            self.assertTrue(scipy.sparse.isspmatrix_csr(Z))
+            self.assertTrue(Z.has_sorted_indices)
+            nptst.assert_array_equal(Z.toarray(), X.toarray())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import os
 import sys
 from sandbox.recommendation.BprRecommender import BprRecommender 
+from sandbox.recommendation.BprKernels import sampleNegatives
 from sandbox.util.SparseUtils import SparseUtils
 import numpy
+import scipy.sparse
 import unittest
 import logging
 import numpy.linalg 
@@ -33,6 +35,37 @@ class BprRecommenderTest(unittest.TestCase):
         learner.learnModel(X)
         Z = learner.predict(n)
         
+    def testLearnModelThreads(self): 
+        m = 60 
+        n = 30 
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, 0.7, csarray=True).toScipyCsr()
+        Xd = X.toarray()
+        
+        for numThreads in [1, 4]: 
+            for negativeExp in [0.0, 1.0]: 
+                learner = BprRecommender(k, lmbdaUser=0.01, lmbdaPos=0.01, lmbdaNeg=0.01, gamma=0.1)
+                learner.maxIterations = 20
+                learner.numThreads = numThreads 
+                learner.negativeExp = negativeExp
+                learner.learnModel(X)
+                
+                self.assertEquals(learner.U.shape, (m, k))
+                self.assertEquals(learner.V.shape, (n, k))
+                self.assertTrue(numpy.isfinite(learner.U).all())
+                
+                #The positive items are ranked above the others 
+                Z = learner.U.dot(learner.V.T)
+                auc = numpy.mean([sklearn.metrics.roc_auc_score(Xd[i, :], Z[i, :]) for i in range(m) if 0 < Xd[i, :].sum() < n])
+                self.assertTrue(auc > 0.8)
+        
+        #Learning continues from the given factors 
+        U, V = learner.U.copy(), learner.V.copy()
+        learner.maxIterations = 0 
+        learner.learnModel(X, U, V)
+        nptst.assert_array_equal(learner.U, U)
+        nptst.assert_array_equal(learner.V, V)
+        
     def testModelSelect(self): 
         m = 50 
         n = 50 
@@ -62,6 +95,46 @@ class BprRecommenderTest(unittest.TestCase):
         
         learner.modelSelect(X, colProbs=colProbs)
 
+    def testFoldIn(self): 
+        m = 60 
+        n = 30 
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, 0.7, csarray=True).toScipyCsr()
+        X.sort_indices()
+        
+        learner = BprRecommender(k)
+        learner.maxIterations = 10
+        learner.learnModel(X[0:50, 0:25])
+        
+        #The BPR steps rank the items of the new users above the others 
+        Unew = learner.foldInU(X[50:, 0:25])
+        Z = Unew.dot(learner.V.T)
+        Xnew = X[50:, 0:25].toarray()
+        self.assertTrue(Z[Xnew != 0].mean() > Z[Xnew == 0].mean())
+        
+        #The new items are ranked highest by their users 
+        Vnew = learner.foldInV(scipy.sparse.csr_matrix(X[0:50, 25:].T))
+        Z = learner.U.dot(Vnew.T)
+        Xnew = X[0:50, 25:].toarray()
+        self.assertTrue(Z[Xnew != 0].mean() > Z[Xnew == 0].mean())
+        
+        learner = BprRecommender(k)
+        self.assertRaises(ValueError, learner.foldInV, scipy.sparse.csr_matrix(X[0:50, 25:].T))
+        
+    def testSampleNegatives(self): 
+        n = 10
+        indPtr = numpy.array([0, 3, 3, 13], numpy.uint32)
+        colInds = numpy.array([1, 4, 7] + range(n), numpy.uint32)
+        rowInds = numpy.array([0, 1, 2]*100, numpy.uint32)
+        
+        negInds = sampleNegatives(indPtr, colInds, rowInds, n)
+        self.assertTrue(numpy.all(negInds[rowInds == 0] < n))
+        self.assertTrue(numpy.intersect1d(negInds[rowInds == 0], [1, 4, 7]).shape[0] == 0)
+        self.assertTrue(numpy.all(negInds[rowInds == 1] < n))
+        #No item is found for a row with all of them 
+        nptst.assert_array_equal(negInds[rowInds == 2], n)
+        
+        self.assertRaises(ValueError, sampleNegatives, indPtr, colInds, numpy.array([3], numpy.uint32), n)
     
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -76,6 +76,37 @@ class IterativeSGDNorm2RegTest(unittest.TestCase):
             #print(Xhat)
             print(MCEvaluator.rootMeanSqError(Xhat, self.matrixList[i]))
             
+    def testLearnModelStratified(self):
+        k = 5
+        lmbda = 0.01
+        eps = 0.000001
+        tmax = 10000
+
+        learner = IterativeSGDNorm2Reg(k, lmbda, eps, tmax)
+        learner2 = IterativeSGDNorm2Reg(k, lmbda, eps, tmax, numBlocks=3)
+        self.assertEquals(learner2.baseLearner.numBlocks, 3)
+
+        indList = [X.nonzero() for X in self.matrixList]
+        XList = learner.predict(learner.learnModel(iter(self.matrixList)), indList)
+        XList2 = learner2.predict(learner2.learnModel(iter(self.matrixList)), indList)
+
+        #The stratified passes fit about as well as the sequential ones
+        for i, (Xhat, Xhat2) in enumerate(zip(XList, XList2)):
+            error = MCEvaluator.rootMeanSqError(Xhat, self.matrixList[i])
+            error2 = MCEvaluator.rootMeanSqError(Xhat2, self.matrixList[i])
+            self.assertTrue(error2 <= 2*error + 0.1)
+
+        #The time budget is respected
+        X = self.matrixList[2]
+        learner2.baseLearner.eps = 0
+        learner2.baseLearner.tmax = 100
+        P, Q = learner2.baseLearner.learnModel(X, storeAll=False)[0]
+        self.assertTrue(0 < learner2.baseLearner.t <= 100)
+        self.assertTrue(numpy.isfinite(P).all())
+        ZList = learner2.baseLearner.learnModel(X, storeAll=True)
+        self.assertEquals(len(ZList), 1)
+        self.assertTrue(learner2.baseLearner.t <= 100)
+
     def testModelSelect(self):
         ks = [3,4,5]
         lmbdas = [0.001, 0.01, 0.1, 1]
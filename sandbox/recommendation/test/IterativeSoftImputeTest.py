@@ -95,6 +95,23 @@ class IterativeSoftImputeTest(unittest.TestCase):
                 self.assertTrue(numpy.linalg.norm(Z -(U*s).dot(V.T))**2 < tol)
     
 
+    def testLearnModelFloat32(self): 
+        rho = 0.1 
+        eps = 0.001
+        k = 10
+        
+        iterativeSoftImpute = IterativeSoftImpute(rho, k=k, eps=eps, svdAlg="propack")
+        ZList = list(iterativeSoftImpute.learnModel(iter(self.matrixList)))
+        
+        iterativeSoftImpute.dtype = numpy.float32
+        ZList2 = list(iterativeSoftImpute.learnModel(iter(self.matrixList)))
+        
+        for (U, s, V), (U2, s2, V2) in zip(ZList, ZList2): 
+            self.assertEquals(U2.dtype, numpy.float32)
+            self.assertEquals(s2.dtype, numpy.float32)
+            self.assertEquals(V2.dtype, numpy.float32)
+            nptst.assert_array_almost_equal((U*s).dot(V.T), (U2*s2).dot(V2.T), 2)
+
     def testLearnModel2(self): 
         #Test the SVD updating solution in the case where we get an exact solution 
         lmbda = 0.0 
@@ -323,7 +340,47 @@ class IterativeSoftImputeTest(unittest.TestCase):
 
         nptst.assert_array_almost_equal(meanTestErrors, meanTestErrors2, 2)
 
-    def testWeightedLearning(self): 
+    def testPathMetrics(self):
+        shape = (20, 20)
+        r = 20
+        numInds = 150
+        noise = 0.2
+        X = ExpSU.SparseUtils.generateSparseLowRank(shape, r, numInds, noise)
+
+        iterativeSoftImpute = IterativeSoftImpute(0.1, k=None, svdAlg="arpack", updateAlg="initial")
+        iterativeSoftImpute.numProcesses = 1
+        rhos = numpy.linspace(0.5, 0.001, 10)
+        ks = numpy.array([3, 5], numpy.int)
+        cvInds = Sampling.randCrossValidation(3, X.nnz)
+        trainTestXs = [(ExpSU.SparseUtils.submatrix(X, trainInds), ExpSU.SparseUtils.submatrix(X, testInds)) for trainInds, testInds in cvInds]
+
+        metrics = iterativeSoftImpute.pathMetrics(trainTestXs, rhos, ks)
+        self.assertEquals(metrics.shape, (rhos.shape[0], ks.shape[0], len(cvInds)))
+
+        #The paths are the same when run in parallel
+        iterativeSoftImpute.numProcesses = 2
+        metrics2 = iterativeSoftImpute.pathMetrics(trainTestXs, rhos, ks)
+        nptst.assert_array_almost_equal(metrics, metrics2)
+
+        #Early stopping agrees with the full path until the metric worsens
+        iterativeSoftImpute.numProcesses = 1
+        iterativeSoftImpute.pathPatience = 1
+        metrics3 = iterativeSoftImpute.pathMetrics(trainTestXs, rhos, ks)
+
+        for m in range(ks.shape[0]):
+            for i in range(len(cvInds)):
+                increases = numpy.nonzero(numpy.diff(metrics[:, m, i]) > 0)[0]
+                if increases.shape[0] != 0:
+                    j = increases[0]+1
+                    nptst.assert_array_almost_equal(metrics3[0:j+1, m, i], metrics[0:j+1, m, i])
+                    nptst.assert_array_almost_equal(metrics3[j:, m, i], metrics[j, m, i])
+                else:
+                    nptst.assert_array_almost_equal(metrics3[:, m, i], metrics[:, m, i])
+
+        iterativeSoftImpute.metric = "auc"
+        self.assertRaises(ValueError, iterativeSoftImpute.pathMetrics, trainTestXs, rhos, ks)
+
+    def testWeightedLearning(self):
         #See if the weighted learning has any effect 
         shape = (20, 20) 
         r = 20 
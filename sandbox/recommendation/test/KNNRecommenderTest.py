@@ -0,0 +1,77 @@
+import os
+import sys
+import shutil
+import tempfile
+from sandbox.recommendation.KNNRecommender import KNNRecommender
+from sandbox.util.InteractionStore import InteractionStore
+import numpy
+import unittest
+import logging
+import scipy.sparse
+import numpy.testing as nptst
+
+class KNNRecommenderTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.set_printoptions(precision=3, suppress=True, linewidth=150)
+        numpy.random.seed(21)
+
+    def testLearnModel(self):
+        m = 40
+        n = 30
+        k = 5
+        X = scipy.sparse.rand(m, n, 0.2, format="csr")
+
+        Xd = X.toarray()
+        norms = numpy.sqrt((Xd**2).sum(0))
+        norms[norms == 0] = 1
+        S = (Xd/norms).T.dot(Xd/norms)
+        numpy.fill_diagonal(S, 0)
+
+        for blockSize, numThreads in [(1000, 1), (7, 4)]:
+            learner = KNNRecommender(k)
+            learner.blockSize = blockSize
+            learner.numThreads = numThreads
+            learner.learnModel(X)
+            W = learner.W.toarray()
+
+            #Each row of W holds the k largest similarities of an item to the others
+            self.assertEquals(learner.W.shape, (n, n))
+            for j in range(n):
+                nonzeros = numpy.flatnonzero(S[j, :])
+                self.assertEquals(learner.W[j, :].nnz, min(k, nonzeros.shape[0]))
+                self.assertEquals(W[j, j], 0)
+                nptst.assert_array_almost_equal(numpy.sort(W[j, W[j, :] != 0]), numpy.sort(S[j, :])[::-1][0:learner.W[j, :].nnz][::-1])
+
+            #Users are scored by their items' neighbours, excluding their own items
+            maxItems = 4
+            orderedItems = learner.predict(maxItems)
+            self.assertEquals(orderedItems.shape, (m, maxItems))
+            Z = X.dot(learner.W).toarray()
+            Z[Xd != 0] = 0
+
+            for i in range(m):
+                items = orderedItems[i, orderedItems[i, :] != -1]
+                self.assertEquals(items.shape[0], min(maxItems, numpy.sum(Z[i, :] != 0)))
+                self.assertTrue((Xd[i, items] == 0).all())
+                nptst.assert_array_almost_equal(Z[i, items], numpy.sort(Z[i, :])[::-1][0:items.shape[0]])
+
+    def testLearnModelStore(self):
+        X = scipy.sparse.rand(40, 30, 0.2, format="csr")
+        tempDir = tempfile.mkdtemp()
+
+        try:
+            store = InteractionStore.write(os.path.join(tempDir, "X.bin"), X)
+            learner = KNNRecommender(5)
+            learner.learnModel(X)
+            W = learner.W.toarray()
+            orderedItems = learner.predict(4)
+
+            learner.learnModel(store)
+            nptst.assert_array_almost_equal(learner.W.toarray(), W)
+            nptst.assert_array_equal(learner.predict(4), orderedItems)
+        finally:
+            shutil.rmtree(tempDir)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import sys
+from sandbox.recommendation.MaxAUCBatch import MaxAUCBatch
+from sandbox.recommendation.MaxAUCHinge import MaxAUCHinge
+from sandbox.util.SparseUtils import SparseUtils
+import numpy
+import scipy.sparse
+import unittest
+import logging
+import numpy.linalg
+import numpy.testing as nptst
+
+class MaxAUCBatchTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.set_printoptions(precision=4, suppress=True, linewidth=150)
+        numpy.random.seed(21)
+
+    def testDerivativeUV(self):
+        """
+        Average the mini-batch derivative over many samples and compare it to the exact
+        derivative of the hinge loss.
+        """
+        m = 20
+        n = 30
+        k = 3
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        Xcsr = scipy.sparse.csr_matrix((numpy.ones(colInds.shape[0], numpy.bool), colInds, indPtr), shape=(m, n))
+
+        learner = MaxAUCBatch(k, lmbdaU=0, lmbdaV=0, normalise=False, numAucSamples=n, numNegatives=n)
+        learner2 = MaxAUCHinge(k)
+        learner2.normalise = False
+        learner2.lmbdaU = 0
+        learner2.lmbdaV = 0
+
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+        gp = numpy.ones(n)
+        gq = numpy.ones(n)
+
+        rowInds = numpy.arange(m)
+        permutedColInds = numpy.arange(n, dtype=numpy.uint32)
+
+        numRuns = 500
+        dU = numpy.zeros((m, k))
+        for j in range(numRuns):
+            dU += learner.derivativeUV(Xcsr, indPtr, colInds, U, V, rowInds, permutedColInds, gp, gq)[0]
+        dU /= numRuns
+
+        dU2 = numpy.zeros((m, k))
+        for i in range(m):
+            dU2[i, :] = learner2.derivativeUi(indPtr, colInds, U, V, gp, gq, i)
+
+        self.assertTrue(numpy.linalg.norm(dU - dU2) <= 0.05*numpy.linalg.norm(dU2))
+
+        #The derivative of V is summed over the batch so repeated items are merged
+        dU, items, dV = learner.derivativeUV(Xcsr, indPtr, colInds, U, V, rowInds, permutedColInds, gp, gq)
+        self.assertEquals(numpy.unique(items).shape[0], items.shape[0])
+        self.assertEquals(dV.shape, (items.shape[0], k))
+
+    def testUpdateUVApprox(self):
+        m = 50
+        n = 40
+        k = 8
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+
+        gp = numpy.random.rand(n)
+        gp /= gp.sum()
+        gq = numpy.random.rand(n)
+        gq /= gq.sum()
+
+        permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
+        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+
+        for loss in ["hinge", "logistic", "sigmoid", "tanh"]:
+            learner = MaxAUCBatch(k, lmbdaV=0.1, numNegatives=20, loss=loss)
+            learner.batchSize = 10
+            learner.maxNormU = 0.5
+            learner.maxNormV = 0.5
+
+            U = numpy.random.rand(m, k)
+            V = numpy.random.rand(n, k)
+            muU = numpy.zeros((m, k))
+            muV = numpy.zeros((n, k))
+
+            learner.updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, 0, m, 0.1, 0.1)
+
+            #Every row is updated and projected onto the ball, and is its own average
+            self.assertTrue(numpy.isfinite(U).all())
+            self.assertTrue(numpy.isfinite(V).all())
+            self.assertTrue((numpy.sqrt((U**2).sum(1)) <= learner.maxNormU + 10**-6).all())
+            nptst.assert_array_almost_equal(muU, U)
+
+        #Single precision factors stay in single precision
+        U = numpy.random.rand(m, k).astype(numpy.float32)
+        V = numpy.random.rand(n, k).astype(numpy.float32)
+        learner.updateUVApprox(indPtr, colInds, U, V, U.copy(), V.copy(), permutedRowInds, permutedColInds, gp, gq, 0, m, 0.1, 0.1)
+        self.assertEquals(U.dtype, numpy.float32)
+        self.assertEquals(V.dtype, numpy.float32)
+
+        self.assertRaises(ValueError, MaxAUCBatch, k, loss="square")
+
+    def testObjectiveDecreases(self):
+        m = 100
+        n = 50
+        k = 8
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+
+        gp = numpy.ones(n)
+        gq = numpy.ones(n)
+        permutedColInds = numpy.arange(n, dtype=numpy.uint32)
+
+        learner = MaxAUCBatch(k, lmbdaV=0.1, numNegatives=n)
+        learner.batchSize = 20
+        learner2 = MaxAUCHinge(k)
+
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+
+        obj = learner2.objectiveApprox(indPtr, colInds, indPtr, colInds, U, V, gp, gq, full=True).mean()
+
+        for i in range(10):
+            permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
+            learner.updateUVApprox(indPtr, colInds, U, V, U.copy(), V.copy(), permutedRowInds, permutedColInds, gp, gq, i, m, 0.05, 0.05)
+
+        obj2 = learner2.objectiveApprox(indPtr, colInds, indPtr, colInds, U, V, gp, gq, full=True).mean()
+        self.assertTrue(obj2 < obj)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
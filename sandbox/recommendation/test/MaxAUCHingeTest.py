@@ -4,6 +4,7 @@ from sandbox.recommendation.MaxAUCHinge import MaxAUCHinge
 from sandbox.recommendation.MaxLocalAUC import MaxLocalAUC 
 from sandbox.util.SparseUtils import SparseUtils
 from sandbox.util.SparseUtilsCython import SparseUtilsCython 
+from sandbox.util.CythonUtils import seedRandom
 import numpy
 import unittest
 import logging
@@ -522,6 +523,94 @@ class MaxAUCHingeTest(unittest.TestCase):
         obj = learner.objective(indPtr, colInds, indPtr, colInds, U, V, gp, gq) 
         obj2 = learner.objective(indPtr, colInds, indPtr, colInds, U, V, gp, gq) 
         self.assertAlmostEquals(obj, obj2, 2)
+
+    def testUpdateUVApprox(self): 
+        m = 20 
+        n = 30 
+        k = 3 
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        
+        w = 0.1
+        learner = MaxAUCHinge(k, w)
+        learner.maxNormU = 0.5
+        learner.maxNormV = 0.5
+        
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+        muU = numpy.zeros((m, k))
+        muV = numpy.zeros((n, k))
+        
+        gp = numpy.random.rand(n)
+        gp /= gp.sum()        
+        gq = numpy.random.rand(n)
+        gq /= gq.sum()  
+        
+        permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
+        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+        
+        maxLocalAuc = MaxLocalAUC(k, w)
+        normGp, normGq = maxLocalAuc.computeNormGpq(indPtr, colInds, gp, gq, m)
+        
+        numIterations = 100
+        learner.updateUVApprox(indPtr, colInds, U, V, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, 0, numIterations, 0.1, 0.1)
+        
+        #Every row is updated and projected onto the ball, and is its own average
+        self.assertTrue(numpy.isfinite(U).all())
+        self.assertTrue(numpy.isfinite(V).all())
+        self.assertTrue((numpy.sqrt((U**2).sum(1)) <= learner.maxNormU + 10**-6).all())
+        self.assertTrue((numpy.sqrt((V**2).sum(1)) <= learner.maxNormV + 10**-6).all())
+        nptst.assert_array_almost_equal(muU, U)
+        nptst.assert_array_almost_equal(muV, V)
+        
+    def testUpdateUVApproxFloat32(self): 
+        m = 20 
+        n = 30 
+        k = 3 
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        
+        w = 0.1
+        learner = MaxAUCHinge(k, w)
+        learner.printStep = 1000
+        
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+        
+        gp = numpy.random.rand(n)
+        gp /= gp.sum()        
+        gq = numpy.random.rand(n)
+        gq /= gq.sum()  
+        
+        permutedRowInds = numpy.array(numpy.random.permutation(m), numpy.uint32)
+        permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+        
+        maxLocalAuc = MaxLocalAUC(k, w)
+        normGp, normGq = maxLocalAuc.computeNormGpq(indPtr, colInds, gp, gq, m)
+        
+        #The same random stream gives the same samples so the results only differ by rounding 
+        results = []
+        for dtype in [numpy.float64, numpy.float32]: 
+            U2 = numpy.array(U, dtype)
+            V2 = numpy.array(V, dtype)
+            muU = U2.copy()
+            muV = V2.copy()
+            
+            seedRandom(21)
+            learner.updateUVApprox(indPtr, colInds, U2, V2, muU, muV, permutedRowInds, permutedColInds, gp, gq, normGp, normGq, 0, 100, 0.1, 0.1)
+            self.assertEquals(U2.dtype, dtype)
+            
+            seedRandom(21)
+            obj = learner.objectiveApprox(indPtr, colInds, indPtr, colInds, U2, V2, gp, gq)
+            results.append((U2, V2, obj))
+        
+        nptst.assert_array_almost_equal(results[0][0], results[1][0], 4)
+        nptst.assert_array_almost_equal(results[0][1], results[1][1], 4)
+        self.assertAlmostEquals(results[0][2], results[1][2], 4)
+        
+        #The factors must all have the same type 
+        U2 = numpy.array(U, numpy.float32)
+        self.assertRaises(ValueError, learner.updateUVApprox, indPtr, colInds, U2, V, U2.copy(), V.copy(), permutedRowInds, permutedColInds, gp, gq, normGp, normGq, 0, 100, 0.1, 0.1)
         
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -1,8 +1,11 @@
 import os
 import sys
-from sandbox.recommendation.MaxLocalAUC import MaxLocalAUC, restrictOmega
+from sandbox.recommendation.MaxLocalAUC import MaxLocalAUC, BlockScheduler, restrictOmega
 from sandbox.util.SparseUtils import SparseUtils
+from sandbox.util.InteractionStore import InteractionStore
+from sandbox.util.PathDefaults import PathDefaults
 import numpy
+import scipy.sparse
 import unittest
 import logging
 import numpy.linalg 
@@ -66,6 +69,256 @@ class MaxLocalAUCTest(unittest.TestCase):
         U, V = maxLocalAuc.parallelLearnModel(X)
 
 
+    def testBlockSchedulerFailure(self): 
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.1, stochastic=True)
+        maxLocalAuc.numProcesses = 2
+        U, V = maxLocalAuc.initUV(X)
+        gi, gp, gq = maxLocalAuc.computeGipq(X)
+        normGp, normGq = maxLocalAuc.computeNormGpq(indPtr, colInds, gp, gq, m)
+        
+        #An exception in a worker is raised in the parent 
+        scheduler = BlockScheduler(maxLocalAuc, indPtr, colInds, U, V, gp, gq, normGp, normGq)
+        scheduler.pollTime = 0.1
+        scheduler.omegasList = None 
+        scheduler.start()
+        self.assertRaises(RuntimeError, scheduler.updateUV, 0)
+        self.assertEquals(scheduler.processList, [])
+        
+        #So is a worker which has been killed 
+        scheduler = BlockScheduler(maxLocalAuc, indPtr, colInds, U, V, gp, gq, normGp, normGq)
+        scheduler.pollTime = 0.1
+        scheduler.start()
+        processes = list(scheduler.processList)
+        scheduler.updateUV(0)
+        processes[0].terminate()
+        processes[0].join()
+        self.assertRaises(RuntimeError, scheduler.updateUV, 1)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def testHogwildLearnModel(self):
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+
+        u = 0.1
+        w = 1-u
+        eps = 0.05
+
+        maxLocalAuc = MaxLocalAUC(k, w, alpha=1.0, eps=eps, stochastic=True)
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.validationUsers = 0.0
+        maxLocalAuc.hogwild = True
+        maxLocalAuc.numProcesses = 4
+
+        U, V = maxLocalAuc.learnModel(X)
+
+        self.assertEquals(U.shape, (m, k))
+        self.assertEquals(V.shape, (n, k))
+        self.assertTrue(numpy.isfinite(U).all())
+        self.assertTrue(numpy.isfinite(V).all())
+
+    def testLearnModelFloat32(self): 
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.001, eps=10**-10, stochastic=True)
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.validationUsers = 0.0
+        maxLocalAuc.numProcesses = 1
+
+        U, V, trainMeasures, testMeasures, iterations, totalTime = maxLocalAuc.learnModel(X, verbose=True, randSeed=21)
+        
+        #With the same seed the single precision factors only differ by rounding 
+        maxLocalAuc.dtype = numpy.float32
+        U2, V2, trainMeasures2, testMeasures2, iterations2, totalTime2 = maxLocalAuc.learnModel(X, verbose=True, randSeed=21)
+
+        self.assertEquals(U2.dtype, numpy.float32)
+        self.assertEquals(V2.dtype, numpy.float32)
+        self.assertTrue(numpy.linalg.norm(U - U2) < 10**-3*numpy.linalg.norm(U))
+        self.assertTrue(numpy.linalg.norm(V - V2) < 10**-3*numpy.linalg.norm(V))
+        nptst.assert_array_almost_equal(trainMeasures[:, 0], trainMeasures2[:, 0], 3)
+        
+        #Full gradient descent is only implemented in double precision 
+        maxLocalAuc.stochastic = False 
+        self.assertRaises(ValueError, maxLocalAuc.learnModel, X)
+
+    def testLearnModelBatch(self): 
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.1, eps=10**-10, stochastic=True)
+        maxLocalAuc.maxIterations = 10
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.validationUsers = 0.0
+        maxLocalAuc.numProcesses = 1
+        maxLocalAuc.batchSize = 10
+        maxLocalAuc.batchNegatives = 10
+        maxLocalAuc.scaleAlpha = False
+        maxLocalAuc.rate = "constant"
+
+        U, V, trainMeasures, testMeasures, iterations, totalTime = maxLocalAuc.learnModel(X, verbose=True, randSeed=21)
+        
+        self.assertEquals(U.shape, (m, k))
+        self.assertEquals(V.shape, (n, k))
+        self.assertTrue(numpy.isfinite(U).all())
+        self.assertTrue(numpy.isfinite(V).all())
+        self.assertTrue(trainMeasures[-1, 0] < trainMeasures[0, 0])
+        
+        #The square loss has no mini-batch updates 
+        maxLocalAuc.loss = "square"
+        self.assertRaises(ValueError, maxLocalAuc.learnModel, X)
+
+    def testCheckpoint(self): 
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        fileName = PathDefaults.getTempDir() + "maxLocalAucCheckpoint.npz"
+        
+        if os.path.exists(fileName): 
+            os.remove(fileName)
+
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.1, eps=10**-10, stochastic=True)
+        maxLocalAuc.maxIterations = 10
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.numProcesses = 1
+        maxLocalAuc.scaleAlpha = False
+
+        U, V, trainMeasures, testMeasures, iterations, totalTime = maxLocalAuc.learnModel(X, verbose=True, randSeed=21)
+        
+        #Stop after 5 iterations and then resume from the checkpoint 
+        maxLocalAuc.checkpointFile = fileName
+        maxLocalAuc.checkpointStep = 5
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.learnModel(X, randSeed=21)
+        self.assertTrue(os.path.exists(fileName))
+        self.assertFalse(os.path.exists(fileName + ".tmp"))
+        
+        maxLocalAuc.maxIterations = 10
+        U2, V2, trainMeasures2, testMeasures2, iterations2, totalTime2 = maxLocalAuc.learnModel(X, verbose=True, randSeed=1, resume=True)
+        
+        self.assertEquals(iterations, iterations2)
+        nptst.assert_array_almost_equal(U, U2)
+        nptst.assert_array_almost_equal(V, V2)
+        nptst.assert_array_almost_equal(trainMeasures[:, [0, 1, 3]], trainMeasures2[:, [0, 1, 3]])
+        nptst.assert_array_almost_equal(testMeasures, testMeasures2)
+        
+        #The restored factors are cast to the dtype of the learner 
+        maxLocalAuc.dtype = numpy.float32
+        maxLocalAuc.learnModel(X, randSeed=1, resume=True)
+        self.assertEquals(maxLocalAuc.U.dtype, numpy.float32)
+        self.assertEquals(maxLocalAuc.lastU.dtype, numpy.float32)
+        
+        #Copies do not write to the same checkpoint 
+        self.assertEquals(maxLocalAuc.copy().checkpointFile, None)
+        os.remove(fileName)
+
+    def testLearnModelStore(self): 
+        m = 50
+        n = 20
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, csarray=True)
+        fileName = PathDefaults.getTempDir() + "maxLocalAucStore.bin"
+        store = InteractionStore.write(fileName, X)
+
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.1, eps=10**-10, stochastic=True)
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.numProcesses = 1
+        
+        #A store gives the same factors as the matrix it was written from 
+        U, V = maxLocalAuc.learnModel(X, randSeed=21)
+        U2, V2 = maxLocalAuc.learnModel(store, randSeed=21)
+        nptst.assert_array_almost_equal(U, U2)
+        nptst.assert_array_almost_equal(V, V2)
+        os.remove(fileName)
+
+    def testWarmStartSearch(self): 
+        m = 30 
+        n = 20 
+        k = 5 
+        
+        u = 0.5
+        w = 1-u
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, w, csarray=True)
+        
+        maxLocalAuc = MaxLocalAUC(k, w, eps=0.001, stochastic=True)
+        maxLocalAuc.maxIterations = 5
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.validationSize = 3
+        maxLocalAuc.validationUsers = 0
+        maxLocalAuc.numProcesses = 1
+        maxLocalAuc.searchMode = "warm"
+        maxLocalAuc.ks = numpy.array([2, 4])
+        maxLocalAuc.lmbdas = numpy.array([0.1, 0.5, 1.0])
+        
+        meanMetrics, paramDict = maxLocalAuc.modelSelectLmbda(X)
+        
+        self.assertEquals(meanMetrics.shape, tuple(paramDict[key].shape[0] for key in paramDict.keys()))
+        self.assertTrue(maxLocalAuc.k in maxLocalAuc.ks)
+        self.assertTrue(maxLocalAuc.lmbda in maxLocalAuc.lmbdas)
+
+    def testFoldIn(self): 
+        m = 60
+        n = 30
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, 0.7, csarray=True).toScipyCsr()
+        
+        maxLocalAuc = MaxLocalAUC(k, 0.9, alpha=0.1, eps=10**-10, stochastic=True)
+        maxLocalAuc.maxIterations = 20
+        maxLocalAuc.validationUsers = 0.0
+        maxLocalAuc.numProcesses = 1
+        maxLocalAuc.scaleAlpha = False
+        maxLocalAuc.learnModel(X[0:50, 0:25])
+        U, V = maxLocalAuc.U, maxLocalAuc.V
+        
+        #The new users score their own items above the others 
+        newUsers = maxLocalAuc.foldInUsers(X[50:, 0:25])
+        nptst.assert_array_equal(newUsers, numpy.arange(50, 60))
+        self.assertEquals(maxLocalAuc.U.shape, (60, k))
+        nptst.assert_array_equal(maxLocalAuc.U[0:50, :], U)
+        
+        Z = maxLocalAuc.U[newUsers, :].dot(V.T)
+        Xnew = X[50:, 0:25].toarray()
+        self.assertTrue(Z[Xnew != 0].mean() > Z[Xnew == 0].mean())
+        
+        #A second fold in uses the same buffer 
+        buffer = maxLocalAuc.rowBuffers["U"]
+        maxLocalAuc.foldInUsers(X[50:52, 0:25])
+        self.assertTrue(maxLocalAuc.rowBuffers["U"] is buffer)
+        self.assertEquals(maxLocalAuc.U.shape, (62, k))
+        
+        #The new items are scored highest by their users 
+        self.assertRaises(ValueError, maxLocalAuc.foldInItems, X[0:50, 25:])
+        newItems = maxLocalAuc.foldInItems(scipy.sparse.vstack([X[:, 25:], X[50:52, 25:]]))
+        nptst.assert_array_equal(newItems, numpy.arange(25, 30))
+        self.assertEquals(maxLocalAuc.V.shape, (30, k))
+        self.assertEquals(maxLocalAuc.gp.shape[0], 30)
+        
+        Z = U.dot(maxLocalAuc.V[newItems, :].T)
+        Xnew = X[0:50, 25:].toarray()
+        self.assertTrue(Z[Xnew != 0].mean() > Z[Xnew == 0].mean())
+        
+        orderedItems = maxLocalAuc.predict(5)
+        self.assertEquals(orderedItems.shape, (62, 5))
+        
+        #The factors of a float32 learner are folded in as float32 
+        maxLocalAuc.dtype = numpy.float32
+        self.assertEquals(maxLocalAuc.foldInU(X[50:, 0:25]).dtype, numpy.float32)
+        self.assertEquals(maxLocalAuc.foldInV(scipy.sparse.vstack([X[:, 25:], X[50:52, 25:]]).T.tocsr()).dtype, numpy.float32)
+
     @unittest.skip("")
     def testModelSelectMaxNorm(self): 
         m = 10 
@@ -131,6 +384,36 @@ class MaxLocalAUCTest(unittest.TestCase):
         
         maxLocalAuc.learningRateSelect(X)
 
+    def testSuccessiveHalvingSearch(self): 
+        m = 30 
+        n = 20 
+        k = 5 
+        
+        u = 0.5
+        w = 1-u
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, w, csarray=True)
+        
+        maxLocalAuc = MaxLocalAUC(k, w, eps=0.001, stochastic=True)
+        maxLocalAuc.maxIterations = 9
+        maxLocalAuc.recordStep = 1
+        maxLocalAuc.validationSize = 3
+        maxLocalAuc.validationUsers = 0
+        maxLocalAuc.numProcesses = 1
+        maxLocalAuc.searchMode = "halving"
+        maxLocalAuc.ks = numpy.array([2, 4, 8])
+        maxLocalAuc.lmbdas = numpy.array([0.1, 0.5, 1.0])
+        
+        meanMetrics, paramDict = maxLocalAuc.modelSelectLmbda(X)
+        
+        self.assertEquals(meanMetrics.shape, (3, 3))
+        self.assertTrue(maxLocalAuc.k in maxLocalAuc.ks)
+        self.assertTrue(maxLocalAuc.lmbda in maxLocalAuc.lmbdas)
+        
+        #The learning rate search minimises the objective 
+        maxLocalAuc.alphas = numpy.array([0.1, 0.2])
+        meanMetrics, paramDict = maxLocalAuc.learningRateSelect(X)
+        self.assertTrue(maxLocalAuc.alpha in maxLocalAuc.alphas)
+
     def testStr(self): 
         k=10
         u= 0.1
@@ -0,0 +1,60 @@
+import sys
+import numpy
+import unittest
+import logging
+import numpy.testing as nptst 
+from sandbox.recommendation.MipsIndex import MipsIndex
+from sandbox.util.MCEvaluator import MCEvaluator
+from sandbox.util.SparseUtils import SparseUtils
+
+class MipsIndexTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.set_printoptions(precision=3, suppress=True, linewidth=150)
+        numpy.random.seed(21)
+        
+        m = 50 
+        n = 200 
+        self.k = 5 
+        self.U = numpy.random.randn(m, self.k)
+        self.V = numpy.random.randn(n, self.k)
+        
+    def testBuild(self): 
+        index = MipsIndex(numClusters=10).build(self.V)
+        
+        self.assertEquals(index.centroids.shape, (10, self.k))
+        self.assertEquals(index.clusterPtr[-1], self.V.shape[0])
+        nptst.assert_array_equal(numpy.sort(index.clusterItems), numpy.arange(self.V.shape[0]))
+        
+    def testRecommendAtk(self): 
+        maxItems = 10 
+        
+        #Probing every cluster gives the exact result 
+        index = MipsIndex(numClusters=10, numProbes=10).build(self.V)
+        orderedItems, scores = index.recommendAtk(self.U, maxItems, blockSize=7, verbose=True)
+        orderedItems2, scores2 = MCEvaluator.recommendAtk(self.U, self.V, maxItems, verbose=True)
+        
+        nptst.assert_array_almost_equal(scores, scores2)
+        nptst.assert_array_equal(orderedItems, orderedItems2)
+        
+        #Now exclude some training items 
+        X = SparseUtils.generateSparseBinaryMatrix((self.U.shape[0], self.V.shape[0]), self.k, 0.8, csarray=True)
+        omegaList = SparseUtils.getOmegaList(X)
+        orderedItems = index.recommendAtk(self.U, maxItems, omegaList=omegaList)
+        orderedItems2 = MCEvaluator.recommendAtk(self.U, self.V, maxItems, omegaList=omegaList)
+        nptst.assert_array_equal(orderedItems, orderedItems2)
+        
+        #Partial probing should still find most of the items 
+        index.numProbes = 5
+        orderedItems = index.recommendAtk(self.U, maxItems)
+        orderedItems2 = MCEvaluator.recommendAtk(self.U, self.V, maxItems)
+        recall = numpy.mean([numpy.intersect1d(orderedItems[i, :], orderedItems2[i, :]).shape[0] for i in range(self.U.shape[0])])/float(maxItems)
+        self.assertTrue(recall > 0.5)
+        
+        #Fewer items than maxItems 
+        index = MipsIndex(numClusters=2, numProbes=2).build(self.V[0:8, :])
+        orderedItems = index.recommendAtk(self.U, maxItems)
+        self.assertTrue((orderedItems[:, -2:] == -1).all())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,12 @@
 
 import os
 import sys
+import shutil
+import tempfile
 from sandbox.recommendation.WeightedMf import WeightedMf 
+from sandbox.recommendation.WeightedMfKernels import updateFactors
 from sandbox.util.SparseUtils import SparseUtils
+from sandbox.util.InteractionStore import InteractionStore
 import numpy
 import unittest
 import logging
@@ -37,6 +41,70 @@ class WeightedMfTest(unittest.TestCase):
         
         learner.modelSelect(X)
 
+    def testLearnModel(self): 
+        m = 60 
+        n = 30 
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, 0.7, csarray=True).toScipyCsr()
+        X.sort_indices()
+        
+        #Enough conjugate gradient steps give the exact weighted least squares rows 
+        learner = WeightedMf(k, alpha=2)
+        V = numpy.random.randn(n, k)
+        U = numpy.zeros((m, k))
+        updateFactors(X.indptr, X.indices, numpy.array(X.data, numpy.float), U, V, learner.alpha, learner.lmbda, 2*k)
+        nptst.assert_array_almost_equal(U, learner.foldInRows(X, V))
+        
+        Xd = X.toarray()
+        for numThreads in [1, 4]: 
+            learner.numThreads = numThreads
+            learner.maxIterations = 10
+            U, V = learner.learnModel(X)
+            
+            self.assertEquals(U.shape, (m, k))
+            self.assertEquals(V.shape, (n, k))
+            Z = U.dot(V.T)
+            self.assertTrue(Z[Xd != 0].mean() > Z[Xd == 0].mean() + 0.5)
+        
+        #A sweep from the fixed point leaves the factors almost unchanged 
+        learner.maxIterations = 200 
+        U, V = learner.learnModel(X)
+        learner.maxIterations = 1 
+        U2, V2 = learner.learnModel(X, U, V)
+        nptst.assert_array_almost_equal(U.dot(V.T), U2.dot(V2.T), 3)
+        
+        #A store gives the same factors as the matrix it was written from 
+        tempDir = tempfile.mkdtemp()
+        try: 
+            store = InteractionStore.write(os.path.join(tempDir, "X.bin"), X)
+            U2, V2 = learner.learnModel(store, U, V)
+            nptst.assert_array_almost_equal(U2, learner.learnModel(X, U, V)[0])
+        finally: 
+            shutil.rmtree(tempDir)
+        
+        learner.alg = "svd" 
+        self.assertRaises(ValueError, learner.learnModel, X)
+        
+    def testFoldInRows(self): 
+        m = 20 
+        n = 30 
+        k = 5
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), k, 0.7, csarray=True).toScipyCsr()
+        X.sort_indices()
+        X.data *= numpy.random.randint(1, 4, X.nnz)
+        
+        #Each row solves the dense weighted least squares problem of WRMF 
+        learner = WeightedMf(k, alpha=2)
+        W = numpy.random.randn(n, k)
+        U = learner.foldInRows(X, W)
+        
+        Xd = X.toarray()
+        P = numpy.array(Xd != 0, numpy.float)
+        C = 1 + learner.alpha*Xd
+        
+        for i in range(m): 
+            A = (W.T*C[i, :]).dot(W) + learner.lmbda*numpy.eye(k)
+            nptst.assert_array_almost_equal(U[i, :], numpy.linalg.solve(A, W.T.dot(C[i, :]*P[i, :])))
     
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
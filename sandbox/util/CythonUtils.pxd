@@ -2,6 +2,92 @@
 import cython
 cimport numpy
 import numpy
+from libc.stdint cimport uint64_t
+from cython cimport floating
+
+cdef struct RandomState:
+    uint64_t s0
+    uint64_t s1
+
+cdef inline uint64_t nextRandom(RandomState* state) nogil:
+    """
+    The next 64 bits of the xorshift128+ stream given by state.
+    """
+    cdef uint64_t s1 = state.s0
+    cdef uint64_t s0 = state.s1
+    state.s0 = s0
+    s1 ^= s1 << 23
+    state.s1 = s1 ^ s0 ^ (s1 >> 17) ^ (s0 >> 26)
+    return state.s1 + s0
+
+cdef inline unsigned int randomInt(RandomState* state, unsigned int n) nogil:
+    """
+    A random integer in the range 0:n.
+    """
+    return <unsigned int>(((nextRandom(state) >> 32)*n) >> 32)
+
+cdef inline double randomUniform(RandomState* state) nogil:
+    """
+    A random double in the range [0, 1).
+    """
+    return (nextRandom(state) >> 11)*(1.0/9007199254740992.0)
+
+cdef inline double dotPtr(floating* x, floating* y, unsigned int k) nogil:
+    """
+    The dot product of the k elements at x and y, accumulated in double precision
+    for both float and double rows.
+    """
+    cdef double result = 0
+    cdef unsigned int s
+    for s in range(k):
+        result += <double>x[s]*y[s]
+    return result
+
+cdef inline bint worse(double score1, int item1, double score2, int item2) nogil:
+    """
+    Return true if (score1, item1) ranks below (score2, item2). Ties are broken in
+    favour of the smaller item index.
+    """
+    return score1 < score2 or (score1 == score2 and item1 > item2)
+
+cdef inline void siftDown(floating* heapScores, int* heapItems, unsigned int size, unsigned int pos) nogil:
+    """
+    Restore the min-heap property of the heap of the given size below pos.
+    """
+    cdef unsigned int child
+    cdef double score = heapScores[pos]
+    cdef int item = heapItems[pos]
+
+    while 2*pos+1 < size:
+        child = 2*pos+1
+        if child+1 < size and worse(heapScores[child+1], heapItems[child+1], heapScores[child], heapItems[child]):
+            child += 1
+        if not worse(heapScores[child], heapItems[child], score, item):
+            break
+        heapScores[pos] = heapScores[child]
+        heapItems[pos] = heapItems[child]
+        pos = child
+
+    heapScores[pos] = score
+    heapItems[pos] = item
+
+cdef inline void sortHeap(floating* heapScores, int* heapItems, unsigned int size) nogil:
+    """
+    Heap sort the min-heap of the given size in place so that the best item comes first.
+    """
+    cdef unsigned int end = size
+    cdef double tempScore
+    cdef int tempItem
+
+    while end > 1:
+        end -= 1
+        tempScore = heapScores[0]
+        tempItem = heapItems[0]
+        heapScores[0] = heapScores[end]
+        heapItems[0] = heapItems[end]
+        heapScores[end] = tempScore
+        heapItems[end] = tempItem
+        siftDown(heapScores, heapItems, end, 0)
 
 cdef double square(double d)
 cdef double dot(numpy.ndarray[double, ndim = 2, mode="c"] U, unsigned int i, numpy.ndarray[double, ndim = 2, mode="c"] V, unsigned int j, unsigned int k)
@@ -11,4 +97,10 @@ cdef unsigned int inverseChoice(numpy.ndarray[unsigned int, ndim=1, mode="c"] v,
 cdef unsigned int inverseChoiceArray(numpy.ndarray[unsigned int, ndim=1, mode="c"] v, numpy.ndarray[unsigned int, ndim=1, mode="c"] w)
 cdef numpy.ndarray[int, ndim=1, mode="c"] choice(numpy.ndarray[int, ndim=1, mode="c"] inds, unsigned int numSamples, numpy.ndarray[double, ndim=1, mode="c"] cumProbs)
 cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] uniformChoice(numpy.ndarray[unsigned int, ndim=1, mode="c"] inds, unsigned int numSamples)
-cdef double partialSum(numpy.ndarray[double, ndim=1, mode="c"] v, numpy.ndarray[int, ndim=1, mode="c"] inds)
\ No newline at end of file
+cdef double partialSum(numpy.ndarray[double, ndim=1, mode="c"] v, numpy.ndarray[int, ndim=1, mode="c"] inds)
+cdef void seedState(RandomState* state, uint64_t seed) nogil
+cdef void newStream(RandomState* state)
+cdef unsigned int inverseChoicePtr(unsigned int* v, unsigned int m, unsigned int n, RandomState* state) nogil
+cdef unsigned int inverseChoiceArrayPtr(unsigned int* v, unsigned int m, unsigned int* w, unsigned int n, RandomState* state) nogil
+cdef unsigned int uniformChoicePtr(unsigned int* inds, unsigned int numInds, unsigned int numSamples, unsigned int* sample, RandomState* state) nogil
+cdef unsigned int aliasChoice(double* aliasProbs, unsigned int* aliases, unsigned int n, RandomState* state) nogil
@@ -15,6 +15,58 @@ cdef extern from "math.h":
     bint isnan(double x)  
     double sqrt(double x)
 
+#The stream used by the samplers which hold the GIL, and to seed new streams 
+cdef RandomState globalState
+
+cdef inline uint64_t splitMix(uint64_t* x) nogil:
+    """
+    The next output of the splitmix64 generator, used to expand a seed.
+    """
+    cdef uint64_t z
+    x[0] += 0x9E3779B97F4A7C15ULL
+    z = x[0]
+    z = (z ^ (z >> 30))*0xBF58476D1CE4E5B9ULL
+    z = (z ^ (z >> 27))*0x94D049BB133111EBULL
+    return z ^ (z >> 31)
+
+cdef void seedState(RandomState* state, uint64_t seed) nogil:
+    """
+    Seed a xorshift128+ stream. 
+    """
+    state.s0 = splitMix(&seed)
+    state.s1 = splitMix(&seed)
+
+    if state.s0 == 0 and state.s1 == 0: 
+        state.s1 = 1
+
+cdef void newStream(RandomState* state):
+    """
+    Seed a new stream from the global one, for example for each thread. Must be 
+    called with the GIL. 
+    """
+    seedState(state, nextRandom(&globalState))
+
+def seedRandom(seed): 
+    """
+    Seed the global stream, from which the samplers and all new streams draw. 
+    """
+    seedState(&globalState, seed)
+
+def getRandomState(): 
+    """
+    The state of the global stream as an array, for example to save in a checkpoint. 
+    """
+    return numpy.array([globalState.s0, globalState.s1], numpy.uint64)
+
+def setRandomState(state): 
+    """
+    Restore the global stream from an array returned by getRandomState. 
+    """
+    globalState.s0 = state[0]
+    globalState.s1 = state[1]
+
+seedRandom(numpy.random.randint(0, 2**31-1))
+
 cdef inline int randint(int i):
     """
     Note that i must be less than RAND_MAX. 
@@ -91,10 +143,10 @@ cdef inline unsigned int getNonZeroRow(X, unsigned int i, unsigned int n):
     """
     Find a random nonzero element in the ith row of X
     """
-    cdef unsigned int q = numpy.random.randint(0, n)
+    cdef unsigned int q = randomInt(&globalState, n)
     
     while X[i, q] != 0:
-        q = numpy.random.randint(0, n)
+        q = randomInt(&globalState, n)
     return q
 
 @cython.profile(False)
@@ -102,13 +154,13 @@ cdef inline unsigned int inverseChoice(numpy.ndarray[unsigned int, ndim=1, mode=
     """
     Find a random nonzero element in the range 0:n not in v
     """
-    cdef unsigned int q = numpy.random.randint(0, n)
+    cdef unsigned int q
     cdef int inV = 1
     cdef unsigned int j 
     cdef unsigned int m = v.shape[0]
     
     while inV == 1:
-        q = numpy.random.randint(0, n)
+        q = randomInt(&globalState, n)
         inV = 0 
         for j in range(m): 
             if q == v[j]: 
@@ -131,8 +183,7 @@ cdef inline unsigned int inverseChoiceArray(numpy.ndarray[unsigned int, ndim=1,
     cdef unsigned int n = w.shape[0]
     
     while inV == 1:
-        q = w[numpy.random.randint(0, n)]
-        #q = w[randint(n)]
+        q = w[randomInt(&globalState, n)]
         inV = 0 
         for j in range(m): 
             if q == v[j]: 
@@ -154,7 +205,7 @@ cdef inline numpy.ndarray[int, ndim=1, mode="c"] choice(numpy.ndarray[int, ndim=
     cdef unsigned int i, j
     
     for j in range(numSamples):
-        p = numpy.random.rand()
+        p = randomUniform(&globalState)
         for i in range(cumProbs.shape[0]): 
             if cumProbs[i] > p: 
                 break 
@@ -178,7 +229,7 @@ cdef inline numpy.ndarray[unsigned int, ndim=1, mode="c"] uniformChoice(numpy.nd
         return inds 
     else: 
         for j in range(numSamples):
-            i = numpy.random.randint(0, inds.shape[0])
+            i = randomInt(&globalState, inds.shape[0])
             sampleArray[j] = inds[i]
         
         return sampleArray
@@ -197,3 +248,100 @@ cdef inline double partialSum(numpy.ndarray[double, ndim=1, mode="c"] v, numpy.n
         total += v[i]
     
     return total
+
+cdef unsigned int inverseChoicePtr(unsigned int* v, unsigned int m, unsigned int n, RandomState* state) nogil:
+    """
+    Find a random element in the range 0:n not in v[0:m]
+    """
+    cdef unsigned int q, j
+    cdef bint inV = True
+    
+    while inV:
+        q = randomInt(state, n)
+        inV = False
+        for j in range(m): 
+            if q == v[j]: 
+                inV = True 
+                break 
+    return q
+
+cdef unsigned int inverseChoiceArrayPtr(unsigned int* v, unsigned int m, unsigned int* w, unsigned int n, RandomState* state) nogil:
+    """
+    Find a random element in w[0:n] not in v[0:m]
+    """
+    cdef unsigned int q, j
+    cdef bint inV = True
+    
+    while inV:
+        q = w[randomInt(state, n)]
+        inV = False
+        for j in range(m): 
+            if q == v[j]: 
+                inV = True 
+                break 
+    return q
+
+cdef unsigned int uniformChoicePtr(unsigned int* inds, unsigned int numInds, unsigned int numSamples, unsigned int* sample, RandomState* state) nogil:
+    """
+    Write numSamples uniformly random elements of inds[0:numInds] into sample and 
+    return the number written. If numInds <= numSamples then all of inds is used. 
+    """
+    cdef unsigned int j
+
+    if numInds <= numSamples: 
+        for j in range(numInds): 
+            sample[j] = inds[j]
+        return numInds
+    else: 
+        for j in range(numSamples):
+            sample[j] = inds[randomInt(state, numInds)]
+        return numSamples
+
+cdef unsigned int aliasChoice(double* aliasProbs, unsigned int* aliases, unsigned int n, RandomState* state) nogil:
+    """
+    Draw an index in 0:n in constant time using a table from aliasTable. 
+    """
+    cdef unsigned int i = randomInt(state, n)
+
+    if randomUniform(state) < aliasProbs[i]: 
+        return i
+    else: 
+        return aliases[i]
+
+def aliasTable(probs): 
+    """
+    Create the table for sampling from the discrete distribution probs with Vose's 
+    alias method. Returns the arrays aliasProbs and aliases used by aliasChoice. 
+    """
+    cdef unsigned int n = probs.shape[0]
+    cdef numpy.ndarray[double, ndim=1, mode="c"] scaledProbs = numpy.array(probs, numpy.float)*n/numpy.sum(probs)
+    cdef numpy.ndarray[double, ndim=1, mode="c"] aliasProbs = numpy.ones(n, numpy.float)
+    cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] aliases = numpy.arange(n, dtype=numpy.uint32)
+    cdef unsigned int i, j 
+    small = [i for i in range(n) if scaledProbs[i] < 1]
+    large = [i for i in range(n) if scaledProbs[i] >= 1]
+
+    while len(small) != 0 and len(large) != 0: 
+        i = small.pop()
+        j = large.pop()
+        
+        aliasProbs[i] = scaledProbs[i]
+        aliases[i] = j
+        scaledProbs[j] = scaledProbs[j] + scaledProbs[i] - 1 
+        
+        if scaledProbs[j] < 1: 
+            small.append(j)
+        else: 
+            large.append(j)
+    
+    return aliasProbs, aliases
+    
+def aliasChoicePy(numpy.ndarray[double, ndim=1, mode="c"] aliasProbs, numpy.ndarray[unsigned int, ndim=1, mode="c"] aliases, unsigned int numSamples): 
+    cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] sample = numpy.zeros(numSamples, numpy.uint32)
+    cdef RandomState state
+    cdef unsigned int j
+    
+    newStream(&state)
+    for j in range(numSamples): 
+        sample[j] = aliasChoice(&aliasProbs[0], &aliases[0], aliases.shape[0], &state)
+    return sample
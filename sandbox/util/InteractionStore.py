@@ -0,0 +1,182 @@
+import os
+import numpy
+import scipy.sparse
+
+class InteractionStore(object):
+    """
+    A sparse matrix of user-item interactions in a single binary file, which holds
+    the CSR arrays of the matrix, the CSR arrays of its transpose (i.e. the CSC
+    arrays), optional values and the ids of the rows and columns. The file starts
+    with a header of HEADER_SIZE uint64 fields: the magic number, the version, m, n,
+    nnz, the flags and the byte offsets of the arrays. The indices are uint32 and
+    each array starts on a 64 byte boundary.
+
+    Opening a store maps the arrays with numpy.memmap, so indPtr and colInds can be
+    passed directly to the Cython kernels and every process which opens the same
+    file shares its pages. A store is pickled as its file name, so the workers of a
+    multiprocessing pool reopen the file rather than receive a copy of the data.
+
+    The learnModel methods of BprRecommender and CLiMF use the mapped arrays directly,
+    while MaxLocalAUC, WeightedMf and KNNRecommender read the store into memory with
+    toScipyCsr. Model selection still needs a scipy matrix or csarray.
+    """
+    MAGIC = 0x31305253434c4453
+    VERSION = 1
+    HEADER_SIZE = 16
+    ALIGNMENT = 64
+
+    HAS_VALUES = 1
+    HAS_ROW_IDS = 2
+    HAS_COL_IDS = 4
+
+    #The arrays in the order of their offsets in the header
+    ARRAYS = [("indPtr", numpy.uint32), ("colInds", numpy.uint32), ("vals", numpy.float64), ("indPtrT", numpy.uint32), ("rowInds", numpy.uint32), ("valsT", numpy.float64), ("rowIds", numpy.int64), ("colIds", numpy.int64)]
+
+    def __init__(self, fileName, mode="c"):
+        """
+        Open the store in fileName. The default mode "c" maps the arrays copy-on-write
+        so that they are writable, as the Cython kernels expect, without changing the
+        file. Use mode "r" for read-only arrays.
+        """
+        self.fileName = fileName
+        self.mode = mode
+
+        header = numpy.fromfile(fileName, numpy.uint64, InteractionStore.HEADER_SIZE)
+        if header.shape[0] != InteractionStore.HEADER_SIZE or header[0] != InteractionStore.MAGIC:
+            raise ValueError("Not an interaction store: " + fileName)
+        if header[1] != InteractionStore.VERSION:
+            raise ValueError("Unsupported interaction store version: " + str(header[1]))
+
+        m, n, self.nnz, self.flags = [int(x) for x in header[2:6]]
+        self.shape = (m, n)
+        lengths = [m+1, self.nnz, self.nnz, n+1, self.nnz, self.nnz, m, n]
+
+        for (name, dtype), length, offset in zip(InteractionStore.ARRAYS, lengths, header[6:]):
+            if offset == 0:
+                setattr(self, name, None)
+            elif length == 0:
+                setattr(self, name, numpy.zeros(0, dtype))
+            else:
+                setattr(self, name, numpy.memmap(fileName, dtype, mode, int(offset), (length, )))
+
+    @staticmethod
+    def write(fileName, X, rowIds=None, colIds=None, values=True):
+        """
+        Write the sparse matrix X, a scipy matrix or csarray, to fileName and return
+        the opened InteractionStore. Explicit zeros are removed. If values is False
+        then only the positions of the nonzeros are stored. The optional rowIds and
+        colIds are integer ids of the rows and columns of X.
+        """
+        if hasattr(X, "toScipyCsr"):
+            X = X.toScipyCsr()
+
+        X = scipy.sparse.csr_matrix(X, dtype=numpy.float64, copy=True)
+        X.eliminate_zeros()
+        X.sort_indices()
+        Xt = X.T.tocsr()
+        Xt.sort_indices()
+
+        if X.nnz >= 2**32 or max(X.shape) >= 2**32:
+            raise ValueError("Matrix is too large for uint32 indices: " + str(X.shape) + " with nnz=" + str(X.nnz))
+        if rowIds is not None and len(rowIds) != X.shape[0]:
+            raise ValueError("Expected " + str(X.shape[0]) + " row ids, not " + str(len(rowIds)))
+        if colIds is not None and len(colIds) != X.shape[1]:
+            raise ValueError("Expected " + str(X.shape[1]) + " column ids, not " + str(len(colIds)))
+
+        arrays = [X.indptr, X.indices, X.data if values else None, Xt.indptr, Xt.indices, Xt.data if values else None, rowIds, colIds]
+        flags = InteractionStore.HAS_VALUES*values + InteractionStore.HAS_ROW_IDS*(rowIds is not None) + InteractionStore.HAS_COL_IDS*(colIds is not None)
+        header = numpy.zeros(InteractionStore.HEADER_SIZE, numpy.uint64)
+        header[0:6] = [InteractionStore.MAGIC, InteractionStore.VERSION, X.shape[0], X.shape[1], X.nnz, flags]
+
+        #Write to a temporary file which is renamed so that a store is never half written
+        tempFileName = fileName + ".tmp"
+
+        with open(tempFileName, "wb") as fileObj:
+            header.tofile(fileObj)
+
+            for i, ((name, dtype), a) in enumerate(zip(InteractionStore.ARRAYS, arrays)):
+                if a is None:
+                    continue
+
+                offset = fileObj.tell()
+                padding = -offset % InteractionStore.ALIGNMENT
+                fileObj.write(b"\0"*padding)
+                header[6+i] = offset + padding
+                numpy.ascontiguousarray(a, dtype).tofile(fileObj)
+
+            fileObj.seek(0)
+            header.tofile(fileObj)
+            fileObj.flush()
+            os.fsync(fileObj.fileno())
+
+        os.rename(tempFileName, fileName)
+
+        return InteractionStore(fileName)
+
+    def omegaListPtr(self):
+        """
+        Return the uint32 arrays (indPtr, colInds) of the nonzero columns of each row,
+        as SparseUtils.getOmegaListPtr does.
+        """
+        return self.indPtr, self.colInds
+
+    def omegaListPtrT(self):
+        """
+        Return the uint32 arrays (indPtrT, rowInds) of the nonzero rows of each column.
+        """
+        return self.indPtrT, self.rowInds
+
+    def toScipyCsr(self):
+        """
+        Return the matrix as a scipy.sparse.csr_matrix. Note that scipy copies the
+        indices into int32 arrays, and the values are ones if none are stored.
+        """
+        vals = self.vals if self.vals is not None else numpy.ones(self.nnz)
+        return scipy.sparse.csr_matrix((vals, self.colInds, self.indPtr), shape=self.shape)
+
+    def toScipyCsc(self):
+        """
+        Return the matrix as a scipy.sparse.csc_matrix built from the column arrays.
+        """
+        vals = self.valsT if self.valsT is not None else numpy.ones(self.nnz)
+        return scipy.sparse.csc_matrix((vals, self.rowInds, self.indPtrT), shape=self.shape)
+
+    def translateRows(self, ids):
+        """
+        Return the indices of the rows with the given ids.
+        """
+        return InteractionStore.translate(self.rowIds, ids)
+
+    def translateCols(self, ids):
+        """
+        Return the indices of the columns with the given ids.
+        """
+        return InteractionStore.translate(self.colIds, ids)
+
+    @staticmethod
+    def translate(allIds, ids):
+        if allIds is None:
+            raise ValueError("The store has no ids")
+
+        ids = numpy.asarray(ids)
+        if allIds.shape[0] == 0 and ids.size != 0:
+            raise KeyError("Unknown ids: " + str(ids))
+
+        order = numpy.argsort(allIds, kind="mergesort")
+        positions = numpy.searchsorted(allIds[order], ids)
+        positions = numpy.minimum(positions, order.shape[0]-1)
+        inds = order[positions]
+
+        if numpy.any(allIds[inds] != ids):
+            raise KeyError("Unknown ids: " + str(ids))
+
+        return inds
+
+    def __getstate__(self):
+        return {"fileName": self.fileName, "mode": self.mode}
+
+    def __setstate__(self, state):
+        self.__init__(state["fileName"], state["mode"])
+
+    def __str__(self):
+        return "InteractionStore: " + self.fileName + " shape=" + str(self.shape) + " nnz=" + str(self.nnz)
@@ -5,7 +5,6 @@ from sandbox.util.Util import Util
 from sandbox.util.SparseUtils import SparseUtils 
 from sandbox.util.SparseUtilsCython import SparseUtilsCython 
 from sandbox.util.MCEvaluatorCython import MCEvaluatorCython
-from math import ceil 
 
 class MCEvaluator(object):
     """
@@ -169,41 +168,129 @@ class MCEvaluator(object):
         else: 
             return mrr.mean()
 
+    @staticmethod 
+    def rankingMetricsAtK(positiveArray, orderedItems, ks): 
+        """
+        Compute the precision, recall, F1, reciprocal rank and NDCG at each cutoff in 
+        ks for every row of orderedItems in one pass. positiveArray is a tuple 
+        (indPtr, colInds) or a sparse matrix of the real values. Returns a tuple of 5 
+        arrays of shape (orderedItems.shape[0], len(ks)). 
+        """
+        if type(positiveArray) != tuple: 
+            positiveArray = SparseUtils.getOmegaListPtr(positiveArray)        
+        
+        indPtr, colInds = positiveArray
+        orderedItems = numpy.ascontiguousarray(orderedItems, numpy.int32)
+        
+        return MCEvaluatorCython.rankingMetricsAtk(indPtr, colInds, orderedItems, ks)
+
     @staticmethod 
     def recommendAtk(U, V, k, blockSize=1000, omegaList=None, verbose=False): 
         """
         Compute the matrix Z = U V^T and then find the k largest indices for each row. 
+        Z is computed blockSize rows at a time. If omegaList is given then those items 
+        are excluded from the recommendations. It can be a list of arrays of items for 
+        each row, a tuple (indPtr, colInds) or a sparse matrix. Rows with fewer than k 
+        items to recommend are padded with -1. The scores are float32 if U and V 
+        are both float32 and float64 otherwise. 
         """
-        blocksize = 1000
-        numBlocks = int(ceil(U.shape[0]/float(blocksize)))
-        orderedItems = numpy.zeros((U.shape[0], k), numpy.int32)
-        scores = numpy.zeros((U.shape[0], k), numpy.float) 
-
-        for j in range(numBlocks):
-            logging.debug("Block " + str(j) + " of " + str(numBlocks))
-            endInd = min(U.shape[0], (j+1)*blocksize)
-            UV = U[j*blocksize:endInd, :].dot(V.T)
-            orderedItems[j*blocksize:endInd, :] = Util.argmaxN(UV, k)
-            
-            rowInds = numpy.repeat(numpy.arange(endInd-j*blocksize), k)
-            colInds = orderedItems[j*blocksize:endInd, :].flatten()           
-            
-            scores[j*blocksize:endInd, :] = numpy.reshape(UV[rowInds, colInds], (endInd-j*blocksize,k))
-            #orderedItems[j*blocksize:endInd, :] = Util.argmaxN2d(scores, k)
-            
-            #Now delete items in omegaList if given 
-            if omegaList != None: 
-                for i in range(j*blocksize, endInd):
-                    
-                    nonTrainItems = orderedItems[i, :][numpy.logical_not(numpy.in1d(orderedItems[i, :], omegaList[i]))]
-                    orderedItems[i, 0:nonTrainItems.shape[0]] = nonTrainItems
-                    orderedItems[i, nonTrainItems.shape[0]:] = -1
+        dtype = MCEvaluator.factorDtype(U, V)
+        U = numpy.ascontiguousarray(U, dtype)
+        V = numpy.ascontiguousarray(V, dtype)
+        indPtr, colInds = MCEvaluator.omegaToPtr(omegaList, U.shape[0])
+        orderedItems, scores = MCEvaluatorCython.recommendAtkPtr(U, V, k, indPtr, colInds, blockSize)
         
         if verbose: 
             return orderedItems, scores 
         else: 
             return orderedItems
         
+    @staticmethod 
+    def recommendAtkIter(U, V, k, blockSize=1000, omegaList=None): 
+        """
+        A generator version of recommendAtk which yields tuples (userBlock, orderedItems, 
+        scores) for consecutive blocks of at most blockSize users. userBlock is the 
+        array of row indices of the block, and orderedItems and scores have one row 
+        for each of them. Peak memory depends on blockSize and not on U.shape[0]. 
+        """
+        m = U.shape[0]
+        dtype = MCEvaluator.factorDtype(U, V)
+        V = numpy.ascontiguousarray(V, dtype)
+        indPtr, colInds = MCEvaluator.omegaToPtr(omegaList, m)
+        
+        for startRow in range(0, m, blockSize): 
+            endRow = min(m, startRow+blockSize)
+            blockU = numpy.ascontiguousarray(U[startRow:endRow, :], dtype)
+            blockIndPtr = numpy.array(indPtr[startRow:endRow+1] - indPtr[startRow], numpy.uint32)
+            blockColInds = numpy.ascontiguousarray(colInds[indPtr[startRow]:indPtr[endRow]])
+            
+            orderedItems, scores = MCEvaluatorCython.recommendAtkPtr(blockU, V, k, blockIndPtr, blockColInds, blockSize)
+            yield numpy.arange(startRow, endRow), orderedItems, scores 
+
+    @staticmethod 
+    def recommendAtkToFile(U, V, k, fileName, blockSize=1000, omegaList=None): 
+        """
+        Write the output of recommendAtk to the memory-mapped .npy files 
+        fileName + "Items.npy" and fileName + "Scores.npy", one block of users at a 
+        time. Returns the names of the two files, which can be read back with 
+        numpy.load(fileName, mmap_mode="r"). 
+        """
+        m = U.shape[0]
+        itemsFileName = fileName + "Items.npy"
+        scoresFileName = fileName + "Scores.npy"
+        
+        orderedItemsMap = numpy.lib.format.open_memmap(itemsFileName, mode="w+", dtype=numpy.int32, shape=(m, k))
+        scoresMap = numpy.lib.format.open_memmap(scoresFileName, mode="w+", dtype=MCEvaluator.factorDtype(U, V), shape=(m, k))
+        
+        for userBlock, orderedItems, scores in MCEvaluator.recommendAtkIter(U, V, k, blockSize, omegaList): 
+            logging.debug("Writing users " + str(userBlock[0]) + " to " + str(userBlock[-1]) + " of " + str(m))
+            orderedItemsMap[userBlock[0]:userBlock[-1]+1, :] = orderedItems
+            scoresMap[userBlock[0]:userBlock[-1]+1, :] = scores
+            orderedItemsMap.flush()
+            scoresMap.flush()
+        
+        del orderedItemsMap
+        del scoresMap
+        
+        return itemsFileName, scoresFileName
+        
+    @staticmethod 
+    def factorDtype(U, V): 
+        """
+        The type used to score U V^T: float32 if U and V are both float32 and 
+        float64 otherwise. 
+        """
+        if U.dtype == numpy.float32 and V.dtype == numpy.float32: 
+            return numpy.float32
+        else: 
+            return numpy.float64
+        
+    @staticmethod 
+    def omegaToPtr(omegaList, m): 
+        """
+        Convert a set of items per row into a tuple (indPtr, colInds) of uint32 arrays. 
+        omegaList can be None (no items), a list of arrays, a tuple (indPtr, colInds) or 
+        a sparse matrix with m rows. 
+        """
+        if omegaList is None: 
+            indPtr = numpy.zeros(m+1, numpy.uint32)
+            colInds = numpy.zeros(0, numpy.uint32)
+        elif type(omegaList) == tuple: 
+            indPtr, colInds = omegaList 
+        elif type(omegaList) == list: 
+            indPtr = numpy.zeros(m+1, numpy.uint32)
+            indPtr[1:] = numpy.cumsum([len(omegai) for omegai in omegaList])
+            colInds = numpy.zeros(indPtr[-1], numpy.uint32)
+            for i in range(m): 
+                colInds[indPtr[i]:indPtr[i+1]] = omegaList[i]
+        else: 
+            indPtr, colInds = SparseUtils.getOmegaListPtr(omegaList)
+        
+        indPtr = numpy.ascontiguousarray(indPtr, numpy.uint32)
+        colInds = numpy.ascontiguousarray(colInds, numpy.uint32)
+        
+        return indPtr, colInds
+        
     @staticmethod 
     def localAUC(positiveArray, U, V, w, numRowInds=None): 
         """
@@ -256,8 +343,9 @@ class MCEvaluator(object):
             positiveArray = SparseUtils.getOmegaListPtr(positiveArray)          
         
         indPtr, colInds = positiveArray
-        U = numpy.ascontiguousarray(U)
-        V = numpy.ascontiguousarray(V)        
+        dtype = MCEvaluator.factorDtype(U, V)
+        U = numpy.ascontiguousarray(U, dtype)
+        V = numpy.ascontiguousarray(V, dtype)        
         
         if r is None: 
             r = SparseUtilsCython.computeR(U, V, w, numAucSamples)
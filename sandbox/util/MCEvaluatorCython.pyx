@@ -8,38 +8,169 @@ import struct
 import numpy 
 cimport numpy
 import scipy.sparse 
+from cython.parallel import prange, parallel
+from libc.stdlib cimport malloc, free
+from cython cimport floating
 numpy.import_array()
-from sandbox.util.CythonUtils cimport dot, scale, choice, inverseChoice, uniformChoice, plusEquals
+from sandbox.util.CythonUtils cimport dot, dotPtr, scale, choice, inverseChoice, uniformChoice, plusEquals, worse, siftDown, sortHeap
 
+cdef extern from "math.h":
+    double INFINITY
+    double log2(double x) nogil
+
+@cython.profile(False)
+cdef inline void topkRow(floating* rowScores, unsigned int n, unsigned int k, int* items, floating* scores) nogil: 
+    """
+    Write the k largest elements of rowScores and their indices into scores and items, 
+    in descending order, using a min-heap of size k. Elements equal to -INFINITY are 
+    masked and if fewer than k remain the output is padded with -1. 
+    """
+    cdef unsigned int j
+    
+    for j in range(k): 
+        scores[j] = -INFINITY
+        items[j] = -1 
+        
+    for j in range(n): 
+        if rowScores[j] != -INFINITY and worse(scores[0], items[0], rowScores[j], j): 
+            scores[0] = rowScores[j]
+            items[0] = j 
+            siftDown(scores, items, k, 0)
+    
+    sortHeap(scores, items, k)
+
+
+@cython.profile(False)
+cdef inline void rankingMetricsRow(int* items, unsigned int maxK, unsigned int* omegai, unsigned int numOmegai, unsigned int* ks, unsigned int numKs, int* sortedItems, unsigned int* sortedRanks, char* hits, double* precisions, double* recalls, double* f1s, double* rrs, double* ndcgs) nogil: 
+    """
+    Compute precision, recall, F1, reciprocal rank and NDCG for a single row of 
+    recommended items at each of the ascending cutoffs ks. The items are sorted 
+    (with their ranks) so that each positive item is found with a binary search, 
+    and then one pass over the ranks accumulates every metric. 
+    """
+    cdef unsigned int j, c, numItems = 0, count = 0, low, high, mid 
+    cdef int item
+    cdef unsigned int rank 
+    cdef double dcg = 0, idcg = 0, rr = 0
+    
+    #Insertion sort of the valid items by index 
+    for j in range(maxK): 
+        hits[j] = 0 
+        item = items[j]
+        if item < 0: 
+            continue 
+        c = numItems 
+        while c > 0 and sortedItems[c-1] > item: 
+            sortedItems[c] = sortedItems[c-1]
+            sortedRanks[c] = sortedRanks[c-1]
+            c -= 1
+        sortedItems[c] = item 
+        sortedRanks[c] = j 
+        numItems += 1
+    
+    for j in range(numOmegai): 
+        low = 0 
+        high = numItems 
+        while low < high: 
+            mid = (low + high)/2
+            if <unsigned int>sortedItems[mid] < omegai[j]: 
+                low = mid + 1
+            else: 
+                high = mid 
+        if low < numItems and <unsigned int>sortedItems[low] == omegai[j]: 
+            hits[sortedRanks[low]] = 1
+    
+    c = 0 
+    for j in range(maxK): 
+        if hits[j]: 
+            count += 1
+            dcg += 1/log2(j+2)
+            if rr == 0: 
+                rr = 1/<double>(j+1)
+        if j < numOmegai: 
+            idcg += 1/log2(j+2)
+        
+        while c < numKs and ks[c] == j+1: 
+            precisions[c] = count/<double>ks[c]
+            if numOmegai != 0: 
+                recalls[c] = count/<double>numOmegai
+                ndcgs[c] = dcg/idcg
+            else: 
+                recalls[c] = 0
+                ndcgs[c] = 0
+            if precisions[c] + recalls[c] != 0: 
+                f1s[c] = 2*precisions[c]*recalls[c]/(precisions[c] + recalls[c])
+            else: 
+                f1s[c] = 0
+            rrs[c] = rr 
+            c += 1
 
 class MCEvaluatorCython(object):
     @staticmethod 
-    def recommendAtk(numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, unsigned int k, X): 
+    def recommendAtk(U, V, unsigned int k, X): 
         """
         Compute the matrix Z = U V^T and then find the k largest indices for each row 
         but exclude those in X. 
         """
-        cdef unsigned int m = U.shape[0]          
-        cdef numpy.ndarray[numpy.int32_t, ndim=2, mode="c"] orderedItems = numpy.zeros((U.shape[0], k), numpy.int32)
-        cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] scores = numpy.zeros(V.shape[0], numpy.float)
-        cdef unsigned int i = 0
-        cdef unsigned int itemInd 
-        cdef double minScore 
+        from sandbox.util.SparseUtils import SparseUtils
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        orderedItems, scores = MCEvaluatorCython.recommendAtkPtr(U, V, k, indPtr, colInds)
+                    
+        return orderedItems 
         
-        for i in range(m): 
-            scores = U[i, :].dot(V.T)
-            minScore = numpy.min(scores)-1           
-            itemInd = 0
+    @staticmethod 
+    def recommendAtkPtr(numpy.ndarray[floating, ndim=2, mode="c"] U, numpy.ndarray[floating, ndim=2, mode="c"] V, unsigned int k, numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, unsigned int blockSize=1000): 
+        """
+        Find the k largest elements of each row of Z = U V^T excluding the items 
+        colInds[indPtr[i]:indPtr[i+1]] for the ith row. Z is computed blockSize rows at 
+        a time with a single matrix product, and the rows of each block are selected 
+        in parallel with a min-heap of size k. Rows with fewer than k remaining items 
+        are padded with -1. Returns the ordered items and their scores. U and V are 
+        either both float32 or both float64 and the scores have the same type. 
+        """
+        cdef unsigned int m = U.shape[0]
+        cdef unsigned int n = V.shape[0]
+        cdef unsigned int startRow, numRows, i, r
+        cdef unsigned int ind 
+        cdef numpy.ndarray[int, ndim=2, mode="c"] orderedItems = numpy.zeros((m, k), numpy.int32)
+        cdef numpy.ndarray[floating, ndim=2, mode="c"] scores = numpy.zeros((m, k), U.dtype)
+        cdef numpy.ndarray[floating, ndim=2, mode="c"] blockScores
+        cdef floating* blockPtr 
+        cdef int* itemsPtr 
+        cdef floating* scoresPtr 
+        cdef unsigned int* indPtrPtr = &indPtr[0]
+        cdef unsigned int* colIndsPtr = NULL
+        
+        if indPtr.shape[0] != m+1: 
+            raise ValueError("indPtr must have length " + str(m+1))
+        if m == 0 or k == 0: 
+            return orderedItems, scores
+        if colInds.shape[0] != 0: 
+            colIndsPtr = &colInds[0]
+        
+        itemsPtr = &orderedItems[0, 0]
+        scoresPtr = &scores[0, 0]
+        blockSize = max(blockSize, 1)
+        
+        for startRow in range(0, m, blockSize): 
+            numRows = min(blockSize, m - startRow)
+            blockScores = numpy.ascontiguousarray(U[startRow:startRow+numRows, :].dot(V.T))
+            
+            if n == 0: 
+                orderedItems[startRow:startRow+numRows, :] = -1
+                continue 
+            
+            blockPtr = &blockScores[0, 0]
             
-            while itemInd != k: 
-                maxInd = numpy.argmax(scores)
-                scores[maxInd] = minScore
+            for r in prange(numRows, nogil=True, schedule="static"): 
+                i = startRow + r
                 
-                if X[i, maxInd] != 1: 
-                    orderedItems[i, itemInd] = maxInd
-                    itemInd += 1
+                for ind in range(indPtrPtr[i], indPtrPtr[i+1]): 
+                    blockPtr[r*n + colIndsPtr[ind]] = -INFINITY
                     
-        return orderedItems 
+                topkRow(blockPtr + r*n, n, k, itemsPtr + i*k, scoresPtr + i*k)
+        
+        return orderedItems, scores 
         
     @staticmethod  
     def precisionAtk(numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[int, ndim=2] indices): 
@@ -139,7 +270,59 @@ class MCEvaluatorCython(object):
         return rrs  
         
     @staticmethod
-    def localAUCApprox(numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] allIndPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] allColInds, numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, unsigned int numAucSamples, numpy.ndarray[double, ndim=1, mode="c"] r): 
+    def rankingMetricsAtk(numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[int, ndim=2, mode="c"] indices, ks): 
+        """
+        Compute the precision, recall, F1, reciprocal rank and NDCG at each cutoff in 
+        ks for every row of the predicted indices in a single pass, with the rows 
+        processed in parallel. The positive items of row i are 
+        colInds[indPtr[i]:indPtr[i+1]]. Returns a tuple of 5 arrays of shape 
+        (indices.shape[0], len(ks)) in that order. 
+        """
+        cdef unsigned int m = indices.shape[0]
+        cdef unsigned int maxK = indices.shape[1]
+        cdef unsigned int i
+        cdef numpy.ndarray[numpy.int_t, ndim=1] sortedInds = numpy.argsort(numpy.array(ks).ravel(), kind="mergesort")
+        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] sortedKs = numpy.array(numpy.array(ks).ravel()[sortedInds], numpy.uint32)
+        cdef unsigned int numKs = sortedKs.shape[0]
+        cdef numpy.ndarray[numpy.float_t, ndim=3, mode="c"] metrics = numpy.zeros((5, m, numKs), numpy.float)
+        cdef unsigned int* indPtrPtr = &indPtr[0]
+        cdef unsigned int* colIndsPtr = NULL
+        cdef unsigned int* ksPtr = NULL
+        cdef int* indicesPtr = NULL
+        cdef double* metricsPtr = &metrics[0, 0, 0]
+        cdef int* sortedItems 
+        cdef unsigned int* sortedRanks
+        cdef char* hits
+        
+        if indPtr.shape[0] < m+1: 
+            raise ValueError("indPtr must have length at least " + str(m+1))
+        if numKs == 0 or m == 0: 
+            return tuple(metrics)
+        if sortedKs[0] == 0 or sortedKs[numKs-1] > maxK: 
+            raise ValueError("Cutoffs must be between 1 and " + str(maxK))
+        if colInds.shape[0] != 0: 
+            colIndsPtr = &colInds[0]
+        
+        ksPtr = &sortedKs[0]
+        indicesPtr = &indices[0, 0]
+        
+        with nogil, parallel(): 
+            sortedItems = <int*>malloc(maxK*sizeof(int))
+            sortedRanks = <unsigned int*>malloc(maxK*sizeof(unsigned int))
+            hits = <char*>malloc(maxK*sizeof(char))
+            
+            for i in prange(m, schedule="static"): 
+                rankingMetricsRow(indicesPtr + i*maxK, maxK, colIndsPtr + indPtrPtr[i], indPtrPtr[i+1] - indPtrPtr[i], ksPtr, numKs, sortedItems, sortedRanks, hits, metricsPtr + i*numKs, metricsPtr + (m + i)*numKs, metricsPtr + (2*m + i)*numKs, metricsPtr + (3*m + i)*numKs, metricsPtr + (4*m + i)*numKs)
+            
+            free(sortedItems)
+            free(sortedRanks)
+            free(hits)
+        
+        metrics[:, :, sortedInds] = metrics.copy()
+        return tuple(metrics)
+        
+    @staticmethod
+    def localAUCApprox(numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] allIndPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] allColInds, numpy.ndarray[floating, ndim=2, mode="c"] U, numpy.ndarray[floating, ndim=2, mode="c"] V, unsigned int numAucSamples, numpy.ndarray[double, ndim=1, mode="c"] r): 
         """
         Compute the estimated local AUC for the score functions UV^T relative to a matrix 
         X with quantile vector r. If evaluating on a set of test observations then (indPtr, colInds)
@@ -170,9 +353,9 @@ class MCEvaluatorCython(object):
                 
                 for p in omegaiSample:                
                     q = inverseChoice(allOmegai, n)                
-                    uivp = dot(U, i, V, p, k)
+                    uivp = dotPtr(&U[i, 0], &V[p, 0], k)
     
-                    if uivp > ri and uivp > dot(U, i, V, q, k): 
+                    if uivp > ri and uivp > dotPtr(&U[i, 0], &V[q, 0], k): 
                         partialAuc += 1 
                             
                 localAucArr[i] = partialAuc/float(omegaiSample.shape[0])     
@@ -0,0 +1,177 @@
+import copy
+import itertools
+import multiprocessing
+import numpy
+import scipy.sparse
+import sharedmem
+
+#The executors of this process, which are inherited by forked pool workers
+executors = {}
+
+def runTask(args):
+    """
+    Evaluate a single learner on one fold of a ModelSelectExecutor. Used with
+    multiprocessing, so the task only contains indices and parameters.
+    """
+    executorId, evaluationMethod, foldInd, params = args
+    executor = executors[executorId]
+
+    return evaluationMethod(executor.getFold(foldInd) + (executor.getLearner(params), ))
+
+class ModelSelectExecutor(object):
+    """
+    Run model selection tasks over a set of folds in a pool of processes. Each fold
+    is published once into shared memory before the pool is created, so a task only
+    carries a fold index and a dictionary of parameters rather than a pickled copy
+    of the training and test data.
+    """
+    def __init__(self, learner, numProcesses=1, chunkSize=1):
+        """
+        :param learner: The learner to copy for each task
+
+        :param numProcesses: The number of processes, use 1 to run in the current process
+
+        :param chunkSize: The chunk size used with multiprocessing.Pool.imap
+        """
+        self.learner = learner
+        self.numProcesses = numProcesses
+        self.chunkSize = chunkSize
+        self.folds = []
+        self.foldCache = {} #The rebuilt folds of this process, see getFold
+        self.states = []
+
+        executors[id(self)] = self
+
+    def addFold(self, *data):
+        """
+        Publish the data of a fold, for example a (trainX, testX) pair, and return its
+        index. The elements can be numpy arrays, scipy sparse matrices, csarrays or
+        InteractionStores, which are already shared through their memory-mapped file.
+        """
+        self.folds.append(tuple(self.share(X) for X in data))
+        return len(self.folds)-1
+
+    def getFold(self, foldInd):
+        """
+        Return the data of a fold in the same form as it was added. The fold is
+        rebuilt once in each process and then reused by its later tasks, since
+        rebuilding a csarray copies the matrix.
+        """
+        if foldInd not in self.foldCache:
+            self.foldCache[foldInd] = tuple(self.unshare(X) for X in self.folds[foldInd])
+
+        return self.foldCache[foldInd]
+
+    def addState(self, **arrays):
+        """
+        Publish a set of named arrays, for example the factors U and V from which a
+        task resumes, and return its index. A task refers to the state with the
+        parameter "stateInd". The states must be added before map is called.
+        """
+        self.states.append(dict((key, self.share(a)) for key, a in arrays.items()))
+        return len(self.states)-1
+
+    def clearStates(self):
+        """
+        Release the states added with addState.
+        """
+        self.states = []
+
+    def getLearner(self, params):
+        """
+        Return a copy of the learner with the given parameters. A parameter which is
+        a method of the learner is called with the value, otherwise it is set as an
+        attribute. The parameter "stateInd" sets a copy of each array of that state
+        as an attribute.
+        """
+        learner = self.learner.copy()
+
+        for key, val in copy.deepcopy(params).items():
+            attr = getattr(learner, key, None)
+            if key == "stateInd":
+                for name, sharedA in self.states[val].items():
+                    setattr(learner, name, numpy.array(self.unshare(sharedA)))
+            elif callable(attr):
+                attr(val)
+            else:
+                setattr(learner, key, val)
+
+        return learner
+
+    def map(self, evaluationMethod, tasks):
+        """
+        Evaluate each task, which is a tuple (foldInd, params), by calling
+        evaluationMethod on the fold data followed by the learner. Returns the list of
+        results in the order of tasks.
+        """
+        paramList = [(id(self), evaluationMethod, foldInd, params) for foldInd, params in tasks]
+
+        if self.numProcesses != 1:
+            pool = multiprocessing.Pool(processes=self.numProcesses, maxtasksperchild=100)
+            
+            try:
+                results = list(pool.imap(runTask, paramList, self.chunkSize))
+            finally:
+                pool.terminate()
+        else:
+            results = list(itertools.imap(runTask, paramList))
+
+        return results
+
+    def close(self):
+        """
+        Release the shared folds and states.
+        """
+        self.folds = []
+        self.foldCache = {}
+        self.states = []
+        executors.pop(id(self), None)
+
+    @staticmethod
+    def shareArray(a):
+        sharedA = sharedmem.empty(a.shape, dtype=a.dtype)
+        sharedA[:] = a
+        return sharedA
+
+    @staticmethod
+    def share(X):
+        """
+        Copy X into shared memory. Sparse matrices are stored as their compressed
+        arrays and the matrix type.
+        """
+        if isinstance(X, numpy.ndarray):
+            return ("ndarray", ModelSelectExecutor.shareArray(X))
+        elif scipy.sparse.issparse(X):
+            if X.format not in ["csr", "csc"]:
+                X = X.tocsr()
+            arrays = tuple(ModelSelectExecutor.shareArray(a) for a in (X.data, X.indices, X.indptr))
+            return (X.format, arrays, X.shape)
+        elif hasattr(X, "omegaListPtr"):
+            return ("object", X)
+        elif hasattr(X, "toScipyCsr"):
+            Y = X.toScipyCsr()
+            arrays = tuple(ModelSelectExecutor.shareArray(a) for a in (Y.data, Y.indices, Y.indptr))
+            return ("csarray", arrays, Y.shape, X.storagetype)
+        else:
+            return ("object", X)
+
+    @staticmethod
+    def unshare(sharedX):
+        """
+        Rebuild an object stored with share. Arrays and scipy matrices are views of the
+        shared memory, but csarrays are copied in the process that uses them.
+        """
+        format = sharedX[0]
+
+        if format == "ndarray" or format == "object":
+            return sharedX[1]
+        elif format == "csr":
+            return scipy.sparse.csr_matrix(sharedX[1], shape=sharedX[2], copy=False)
+        elif format == "csc":
+            return scipy.sparse.csc_matrix(sharedX[1], shape=sharedX[2], copy=False)
+        elif format == "csarray":
+            import sppy
+            X = scipy.sparse.csr_matrix(sharedX[1], shape=sharedX[2], copy=False)
+            return sppy.csarray(X, storagetype=sharedX[3])
+        else:
+            raise ValueError("Unknown format: " + format)
@@ -211,56 +211,25 @@ class Sampling(object):
         else: 
             storagetype = "col"
             
-        if numRows == None: 
-            numRows = X.shape[0]
-            outputRows = False
-        else: 
-            outputRows = True
+        outputRows = numRows != None 
         
         trainTestXList = []
-        omegaList = SparseUtils.getOmegaList(X)
         m, n = X.shape
         
-        for i in range(k):
-            trainInd = 0 
-            testInd = 0            
-            
-            trainRowInds = numpy.zeros(X.nnz, numpy.int32)
-            trainColInds = numpy.zeros(X.nnz, numpy.int32)
-            
-            testRowInds = numpy.zeros(X.shape[0]*testSize, numpy.int32)
-            testColInds = numpy.zeros(X.shape[0]*testSize, numpy.int32)
-
-            rowSample = numpy.sort(numpy.random.choice(m, numRows, replace=False))
-
-            for j in range(m):
-                
-                if j in rowSample: 
-                    if colProbs == None: 
-                        inds = numpy.random.permutation(omegaList[j].shape[0])
-                    else: 
-                        probs = colProbs[omegaList[j]]
-                        probs /= probs.sum() 
-                        inds = numpy.random.choice(omegaList[j].shape[0], omegaList[j].shape[0], p=probs, replace=False)
-                    trainInds = inds[testSize:]
-                    testInds = inds[0:testSize]
-                else: 
-                    trainInds = numpy.arange(omegaList[j].shape[0]) 
-                    testInds = numpy.array([], numpy.int)
-                    
-                trainRowInds[trainInd:trainInd+trainInds.shape[0]] = numpy.ones(trainInds.shape[0], dtype=numpy.uint)*j
-                trainColInds[trainInd:trainInd+trainInds.shape[0]] = omegaList[j][trainInds]
-                trainInd += trainInds.shape[0]
-                
-                testRowInds[testInd:testInd+testInds.shape[0]] = numpy.ones(testInds.shape[0], dtype=numpy.uint)*j
-                testColInds[testInd:testInd+testInds.shape[0]] = omegaList[j][testInds]
-                testInd += testInds.shape[0]
-                
-            trainRowInds = trainRowInds[0:trainInd]   
-            trainColInds = trainColInds[0:trainInd] 
-      
-            testRowInds = testRowInds[0:testInd]   
-            testColInds = testColInds[0:testInd]
+        if scipy.sparse.issparse(X): 
+            X = X.tocsr()
+            #Sort a copy so that the caller's matrix is not changed 
+            if not X.has_sorted_indices: 
+                X = X.sorted_indices()
+            indPtr, colInds = X.indptr, X.indices
+        else: 
+            indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        
+        rowInds = numpy.repeat(numpy.arange(m, dtype=numpy.int32), numpy.diff(indPtr))
+        
+        for trainIndPtr, trainColInds, testIndPtr, testColInds, rowSample in Sampling.shuffleSplitRowsPtr(indPtr, colInds, k, testSize, numRows, colProbs, rowInds): 
+            trainRowInds = numpy.repeat(numpy.arange(m, dtype=numpy.int32), numpy.diff(trainIndPtr))
+            testRowInds = numpy.repeat(numpy.arange(m, dtype=numpy.int32), numpy.diff(testIndPtr))
             
             trainX = SparseUtils.sparseMatrix(numpy.ones(trainRowInds.shape[0], numpy.int), trainRowInds, trainColInds, X.shape, mattype, storagetype)
             testX = SparseUtils.sparseMatrix(numpy.ones(testRowInds.shape[0], numpy.int), testRowInds, testColInds, X.shape, mattype, storagetype)
@@ -272,6 +241,62 @@ class Sampling(object):
         
         return trainTestXList 
         
+    @staticmethod 
+    def shuffleSplitRowsPtr(indPtr, colInds, k, testSize, numRows=None, colProbs=None, rowInds=None): 
+        """
+        The same as shuffleSplitRows but the input and output are (indPtr, colInds) 
+        arrays. Each nonzero element gets a random key, the elements are sorted by 
+        (row, key) and the first testSize elements of each sampled row form the test 
+        set. Non-uniform colProbs use the keys 1-u^(1/p) which gives the same 
+        distribution as sampling without replacement. Returns a list of k tuples 
+        (trainIndPtr, trainColInds, testIndPtr, testColInds, rowSample). 
+        """
+        m = indPtr.shape[0]-1
+        nnz = indPtr[-1]
+        rowCounts = numpy.diff(indPtr)
+        
+        colInds = colInds[0:nnz]
+        
+        if numRows == None: 
+            numRows = m
+        if rowInds is None: 
+            rowInds = numpy.repeat(numpy.arange(m, dtype=numpy.int32), rowCounts)
+        if colProbs is not None: 
+            itemProbs = colProbs[colInds]
+        
+        #The rank of each position of the sorted elements within its row 
+        ranks = numpy.arange(nnz) - numpy.repeat(indPtr[0:-1], rowCounts)
+        trainTestList = []
+        
+        for i in range(k):
+            rowSample = numpy.sort(numpy.random.choice(m, numRows, replace=False))
+            
+            if colProbs is None: 
+                keys = numpy.random.rand(nnz)
+            else: 
+                keys = -numpy.expm1(numpy.log(numpy.random.rand(nnz))/itemProbs)
+            
+            sampledRows = numpy.zeros(m, numpy.bool)
+            sampledRows[rowSample] = True
+            
+            #Segmented sort using a single integer key (row, random key) per element 
+            keys = (rowInds.astype(numpy.uint64) << numpy.uint64(32)) | numpy.array(keys*(2**32-1), numpy.uint64)
+            sortedInds = numpy.argsort(keys)
+            
+            testMask = numpy.zeros(nnz, numpy.bool)
+            testMask[sortedInds] = ranks < testSize 
+            testMask = numpy.logical_and(testMask, sampledRows[rowInds])
+            trainMask = numpy.logical_not(testMask)
+            
+            trainIndPtr = numpy.zeros(m+1, indPtr.dtype)
+            trainIndPtr[1:] = numpy.cumsum(numpy.bincount(rowInds[trainMask], minlength=m))
+            testIndPtr = numpy.zeros(m+1, indPtr.dtype)
+            testIndPtr[1:] = numpy.cumsum(numpy.bincount(rowInds[testMask], minlength=m))
+            
+            trainTestList.append((trainIndPtr, colInds[trainMask], testIndPtr, colInds[testMask], rowSample))
+            
+        return trainTestList 
+        
     @staticmethod 
     def sampleUsers(X, k): 
         """
@@ -0,0 +1,76 @@
+#cython: profile=False
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: nonecheck=False
+import cython
+import numpy
+cimport numpy
+from cython.parallel import prange
+from cython cimport floating
+numpy.import_array()
+
+class SparseResidualCython(object):
+    """
+    Threaded kernels on a fixed CSR sparsity pattern, used by SparseResidualOperator.
+    All loops are parallel over the rows and write disjoint parts of the output.
+    """
+
+    @staticmethod
+    def residualVals(int[::1] indPtr, int[::1] colInds, double[::1] XVals, floating[:, ::1] P, floating[:, ::1] Q, double[::1] vals):
+        """
+        Write the values of X - P Q^T at the non-zeros of X into vals in place. The
+        dot products are accumulated in double precision.
+        """
+        cdef int m = indPtr.shape[0]-1
+        cdef int k = P.shape[1]
+        cdef int i, j, s
+        cdef unsigned int t
+        cdef double total
+
+        if Q.shape[1] != k:
+            raise ValueError("P and Q must have the same number of columns")
+        if vals.shape[0] != XVals.shape[0]:
+            raise ValueError("vals must have the same size as XVals")
+
+        for i in prange(m, nogil=True, schedule="static"):
+            for t in range(indPtr[i], indPtr[i+1]):
+                j = colInds[t]
+                total = 0
+                for s in range(k):
+                    total = total + P[i, s]*Q[j, s]
+                vals[t] = XVals[t] - total
+
+    @staticmethod
+    def gatherVals(int[::1] perm, double[::1] vals, double[::1] out):
+        """
+        Compute out = vals[perm] in place.
+        """
+        cdef int t
+
+        for t in prange(perm.shape[0], nogil=True, schedule="static"):
+            out[t] = vals[perm[t]]
+
+    @staticmethod
+    def csrMatmat(int[::1] indPtr, int[::1] colInds, double[::1] vals, double[:, ::1] W, double[:, ::1] out):
+        """
+        Compute out = Y W in place in which Y is the CSR matrix given by indPtr,
+        colInds and vals.
+        """
+        cdef int m = indPtr.shape[0]-1
+        cdef int p = W.shape[1]
+        cdef int i, j, c
+        cdef unsigned int t
+        cdef double val
+
+        if out.shape[0] != m or out.shape[1] != p:
+            raise ValueError("out has the wrong shape")
+
+        for i in prange(m, nogil=True, schedule="guided"):
+            for c in range(p):
+                out[i, c] = 0
+
+            for t in range(indPtr[i], indPtr[i+1]):
+                j = colInds[t]
+                val = vals[t]
+                for c in range(p):
+                    out[i, c] = out[i, c] + val*W[j, c]
@@ -0,0 +1,129 @@
+import numpy
+import scipy.sparse
+from sppy.linalg.GeneralLinearOperator import GeneralLinearOperator
+from sandbox.util.SparseResidualCython import SparseResidualCython
+
+class SparseResidualOperator(object):
+    """
+    The operator Y + U s V^T in which Y = P_Omega(X - U s V^T) is the residual of a
+    low rank matrix on the non-zeros Omega of X. The sparsity pattern of X is stored
+    once as CSR along with its transpose, and update() rewrites the residual values in
+    place, so each iteration of an iterative SVD allocates nothing of size nnz(X).
+    The products with Y are threaded Cython kernels over the rows.
+    """
+    def __init__(self, X):
+        Xr = scipy.sparse.csr_matrix(X, dtype=numpy.float, copy=True)
+        Xr.eliminate_zeros()
+        Xr.sort_indices()
+
+        self.shape = Xr.shape
+        self.indPtr = numpy.array(Xr.indptr, numpy.int32)
+        self.colInds = numpy.array(Xr.indices, numpy.int32)
+        self.XVals = numpy.ascontiguousarray(Xr.data)
+
+        #The transposed pattern, with perm mapping its non-zeros to those of X
+        nnz = self.XVals.shape[0]
+        T = scipy.sparse.csr_matrix((numpy.arange(nnz, dtype=numpy.int32), self.colInds, self.indPtr), shape=self.shape).T.tocsr()
+        T.sort_indices()
+        self.indPtrT = numpy.array(T.indptr, numpy.int32)
+        self.rowInds = numpy.array(T.indices, numpy.int32)
+        self.perm = numpy.array(T.data, numpy.int32)
+
+        self.vals = self.XVals.copy()
+        self.valsT = self.XVals[self.perm]
+
+        self.U = numpy.zeros((self.shape[0], 0))
+        self.s = numpy.zeros(0)
+        self.V = numpy.zeros((self.shape[1], 0))
+
+    def update(self, U, s, V):
+        """
+        Set the low rank matrix to U s V^T and recompute the residual values of Y
+        in place.
+        """
+        if U.shape[0] != self.shape[0] or V.shape[0] != self.shape[1]:
+            raise ValueError("X and U s V^T should have the same shape")
+
+        P = numpy.ascontiguousarray(U*s)
+        Q = numpy.ascontiguousarray(V, P.dtype)
+        SparseResidualCython.residualVals(self.indPtr, self.colInds, self.XVals, P, Q, self.vals)
+        SparseResidualCython.gatherVals(self.perm, self.vals, self.valsT)
+
+        self.U = U
+        self.s = s
+        self.V = V
+
+    def residualMatmat(self, W):
+        """
+        Compute Y W.
+        """
+        W = numpy.ascontiguousarray(W, numpy.float)
+        out = numpy.empty((self.shape[0], W.shape[1]))
+        SparseResidualCython.csrMatmat(self.indPtr, self.colInds, self.vals, W, out)
+        return out
+
+    def residualRmatmat(self, W):
+        """
+        Compute Y^T W.
+        """
+        W = numpy.ascontiguousarray(W, numpy.float)
+        out = numpy.empty((self.shape[1], W.shape[1]))
+        SparseResidualCython.csrMatmat(self.indPtrT, self.rowInds, self.valsT, W, out)
+        return out
+
+    def matmat(self, W):
+        return self.residualMatmat(W) + (self.U*self.s).dot(self.V.T.dot(W))
+
+    def rmatmat(self, W):
+        return self.residualRmatmat(W) + (self.V*self.s).dot(self.U.T.dot(W))
+
+    def matvec(self, w):
+        return self.matmat(numpy.reshape(w, (w.shape[0], 1))).ravel()
+
+    def rmatvec(self, w):
+        return self.rmatmat(numpy.reshape(w, (w.shape[0], 1))).ravel()
+
+    def residualMatvec(self, w):
+        return self.residualMatmat(numpy.reshape(w, (w.shape[0], 1))).ravel()
+
+    def residualRmatvec(self, w):
+        return self.residualRmatmat(numpy.reshape(w, (w.shape[0], 1))).ravel()
+
+    def asLinearOperator(self):
+        """
+        Return Y + U s V^T as a GeneralLinearOperator.
+        """
+        return GeneralLinearOperator(self.shape, self.matvec, self.rmatvec, self.matmat, self.rmatmat, dtype=numpy.float)
+
+    def residualOperator(self):
+        """
+        Return Y alone as a GeneralLinearOperator.
+        """
+        return GeneralLinearOperator(self.shape, self.residualMatvec, self.residualRmatvec, self.residualMatmat, self.residualRmatmat, dtype=numpy.float)
+
+    def rowBlocks(self, blockSize=1000):
+        """
+        Iterate over consecutive blocks of blockSize rows of Y + U s V^T as
+        GeneralLinearOperators, without forming the dense low rank part.
+        """
+        Y = self.residual()
+        US = self.U*self.s
+
+        for i in range(0, self.shape[0], blockSize):
+            j = min(i+blockSize, self.shape[0])
+            yield self.blockOperator(Y[i:j, :], US[i:j, :], self.U[i:j, :])
+
+    def blockOperator(self, Yb, USb, Ub):
+        def matmat(W):
+            return Yb.dot(W) + USb.dot(self.V.T.dot(W))
+
+        def rmatmat(W):
+            return Yb.T.dot(W) + (self.V*self.s).dot(Ub.T.dot(W))
+
+        return GeneralLinearOperator(Yb.shape, matmat, rmatmat, matmat, rmatmat, dtype=numpy.float)
+
+    def residual(self):
+        """
+        Return Y as a scipy.sparse.csr_matrix which shares its values with this object.
+        """
+        return scipy.sparse.csr_matrix((self.vals, self.colInds, self.indPtr), shape=self.shape, copy=False)
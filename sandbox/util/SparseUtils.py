@@ -242,6 +242,50 @@ class SparseUtils(object):
 
         return U2, s2, V2
 
+    @staticmethod
+    def spectralNorm(X, v=None, tol=10**-6, maxIter=50):
+        """
+        Estimate the largest singular value of the sparse matrix X using power
+        iterations on X^T X started from v, typically the top right singular vector
+        of a previous nearly identical matrix. The iterations stop when the residual
+        ||X^T X v - s^2 v|| is at most tol*s^2, as the change in s can be tiny while v
+        is still a mix of singular vectors with close singular values. When v is None
+        or the iterations do not converge we fall back to ARPACK. Returns the
+        singular value and the top right singular vector.
+
+        :param v: A warm start vector which is truncated or padded to X.shape[1]
+        """
+        n = X.shape[1]
+
+        if v is not None and n != 0:
+            if v.shape[0] >= n:
+                v = numpy.array(v[0:n], numpy.float)
+            else:
+                v = numpy.r_[v, numpy.random.rand(n-v.shape[0])*10**-3]
+
+            normV = numpy.linalg.norm(v)
+            if normV != 0:
+                v /= normV
+
+                for i in range(maxIter):
+                    u = X.dot(v)
+                    s2 = u.dot(u)
+                    w = X.T.dot(u)
+
+                    if s2 == 0:
+                        break
+
+                    residual = numpy.linalg.norm(w - s2*v)
+                    v = w/numpy.linalg.norm(w)
+
+                    if residual <= tol*s2:
+                        return numpy.sqrt(s2), v
+
+                logging.debug("Power iterations did not converge, using ARPACK")
+
+        Y = scipy.sparse.csc_matrix(X, dtype=numpy.float)
+        U, s, V = SparseUtils.svdArpack(Y, 1, kmax=20)
+        return s[0], V[:, 0]
 
     @staticmethod
     def svdSoft(X, lmbda, kmax=None):
@@ -664,14 +708,19 @@ class SparseUtils(object):
     def getOmegaListPtr(X): 
         """
         Returns two arrays omega, indPtr, such that omega[indPtr[i]:indPtr[i+1]] 
-        is the set of nonzero elements in the ith row of X. Only works on sppy 
-        matrices. 
-        """
-        if scipy.sparse.issparse(X): 
-            import sppy
-            X = sppy.csarray(X)
-        
-        indPtr, colInds = X.nonzeroRowsPtr()
+        is the set of nonzero elements in the ith row of X. Works on sppy matrices,
+        scipy matrices and InteractionStores, whose arrays are returned without a copy.
+        """
+        if hasattr(X, "omegaListPtr"):
+            return X.omegaListPtr()
+        elif scipy.sparse.issparse(X):
+            X = scipy.sparse.csr_matrix(X, copy=True)
+            X.eliminate_zeros()
+            X.sort_indices()
+            indPtr, colInds = X.indptr, X.indices
+        else:
+            indPtr, colInds = X.nonzeroRowsPtr()
+
         indPtr = numpy.array(indPtr, dtype=numpy.uint32)
         colInds = numpy.array(colInds, dtype=numpy.uint32)
         return indPtr, colInds
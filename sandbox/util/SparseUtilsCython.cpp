@@ -20,4 +20,25 @@ void partialReconstructValsPQCpp(int* rowInds, int*colInds, double* P, double* Q
  
         values[i] = sum;         
         }
-    }
\ No newline at end of file
+    }
+
+void partialReconstructValsPQFloatCpp(int* rowInds, int*colInds, float* P, float* Q, float* values, int size, int numCols) { 
+    /*
+    * The single precision version of partialReconstructValsPQCpp, the sums are 
+    * accumulated in double precision 
+    */
+    int i, j; 
+    int p, q; 
+    double sum; 
+
+    for(i=0;i<size;i++) {
+        sum = 0; 
+        p = rowInds[i]*numCols; 
+        q = colInds[i]*numCols;
+        for(j=0;j<numCols;j++) { 
+            sum += (double)P[p + j]*Q[q + j];
+            }
+ 
+        values[i] = (float)sum;         
+        }
+    }
@@ -8,12 +8,14 @@ import struct
 import numpy 
 cimport numpy
 import scipy.sparse 
+from cython cimport floating
 from sandbox.util.Util import Util
 from sandbox.util.CythonUtils cimport uniformChoice
 numpy.import_array()
 
 cdef extern from "SparseUtilsCython.cpp": 
     void partialReconstructValsPQCpp(int*, int*, double*, double*, double*, int, int) 
+    void partialReconstructValsPQFloatCpp(int*, int*, float*, float*, float*, int, int) 
 
 class SparseUtilsCython(object): 
     """
@@ -21,16 +23,21 @@ class SparseUtilsCython(object):
     """
         
     @staticmethod 
-    def partialReconstructValsPQ(numpy.ndarray[int, ndim=1] rowInds, numpy.ndarray[int, ndim=1] colInds, numpy.ndarray[double, ndim=2, mode="c"] P, numpy.ndarray[double, ndim=2, mode="c"] Q): 
+    def partialReconstructValsPQ(numpy.ndarray[int, ndim=1] rowInds, numpy.ndarray[int, ndim=1] colInds, numpy.ndarray[floating, ndim=2, mode="c"] P, numpy.ndarray[floating, ndim=2, mode="c"] Q): 
         """
         Given an array of unique indices inds, partially reconstruct $P*Q^T$. Do 
-        the heavy work in C++. 
+        the heavy work in C++. P and Q are both float32 or both float64, and the 
+        values have the same type. 
         """ 
         if P.shape[1] != Q.shape[1]: 
             raise ValueError("Matrices not aligned")
         
-        cdef numpy.ndarray[double, ndim=1, mode="c"] values = numpy.zeros(rowInds.shape[0])
-        partialReconstructValsPQCpp(&rowInds[0], &colInds[0], &P[0,0], &Q[0,0], &values[0], rowInds.shape[0], P.shape[1])          
+        cdef numpy.ndarray[floating, ndim=1, mode="c"] values = numpy.zeros(rowInds.shape[0], P.dtype)
+        
+        if floating is float: 
+            partialReconstructValsPQFloatCpp(&rowInds[0], &colInds[0], &P[0,0], &Q[0,0], &values[0], rowInds.shape[0], P.shape[1])          
+        else: 
+            partialReconstructValsPQCpp(&rowInds[0], &colInds[0], &P[0,0], &Q[0,0], &values[0], rowInds.shape[0], P.shape[1])          
         return values        
 
     @staticmethod 
@@ -81,23 +88,23 @@ class SparseUtilsCython(object):
         
     @staticmethod
     @cython.profile(False)  
-    def computeR(numpy.ndarray[double, ndim=2, mode="c"] U, numpy.ndarray[double, ndim=2, mode="c"] V, double w, unsigned int indsPerRow=50): 
+    def computeR(numpy.ndarray[floating, ndim=2, mode="c"] U, numpy.ndarray[floating, ndim=2, mode="c"] V, double w, unsigned int indsPerRow=50): 
         """
         Given a matrix Z = UV.T compute a vector r such r[i] is the uth quantile 
         of the ith row of Z. We sample indsPerRow elements in each row and use that 
         for computing quantiles. Thus u=0 implies the smallest element and u=1 implies 
-        the largest. 
+        the largest. The quantiles are always returned as doubles. 
         """
         cdef int m = U.shape[0]
         cdef int n = V.shape[0]
         #indsPerRow = min(indsPerRow, n)
         cdef numpy.ndarray[numpy.float_t, ndim=1, mode="c"] r = numpy.zeros(m, numpy.float)
-        cdef numpy.ndarray[numpy.float_t, ndim=2, mode="c"] tempRows = numpy.zeros((m, indsPerRow), numpy.float)
+        cdef numpy.ndarray[floating, ndim=2, mode="c"] tempRows
         cdef numpy.ndarray[numpy.int_t, ndim=1, mode="c"] colInds = numpy.zeros(indsPerRow, numpy.int)
 
         colInds = numpy.random.choice(n, indsPerRow, replace=True)
         tempRows = U.dot(V[colInds, :].T)
-        r = numpy.percentile(tempRows, w*100.0, 1)
+        r = numpy.array(numpy.percentile(tempRows, w*100.0, 1), numpy.float)
         
         return r  
         
@@ -125,6 +132,52 @@ class SparseUtilsCython(object):
         
         return r  
     
+    @staticmethod
+    def partitionOmega(numpy.ndarray[unsigned int, ndim=1, mode="c"] indPtr, numpy.ndarray[unsigned int, ndim=1, mode="c"] colInds, numpy.ndarray[unsigned int, ndim=1, mode="c"] permutedColInds, unsigned int numBlocks): 
+        """
+        Split the nonzero elements given by (indPtr, colInds) into numBlocks column 
+        blocks, where the bth block contains the columns 
+        permutedColInds[b*blockSize:(b+1)*blockSize]. Returns a list of tuples 
+        (blockIndPtr, blockColInds), one for each block, in which the rows and the 
+        order within each row are the same as the input. The work is O(nnz + n + numBlocks*m). 
+        """
+        cdef unsigned int m = indPtr.shape[0]-1
+        cdef unsigned int n = permutedColInds.shape[0]
+        cdef unsigned int blockSize = (n + numBlocks - 1)/numBlocks
+        cdef unsigned int i, j, b, ind
+        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] colBlocks = numpy.zeros(n, numpy.uint32)
+        cdef numpy.ndarray[unsigned int, ndim=2, mode="c"] blockIndPtrs = numpy.zeros((numBlocks, m+1), numpy.uint32)
+        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] blockColInds = numpy.zeros(colInds.shape[0], numpy.uint32)
+        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] blockStarts = numpy.zeros(numBlocks+1, numpy.uint32)
+        cdef numpy.ndarray[unsigned int, ndim=1, mode="c"] blockPtrs 
+        
+        for j in range(n): 
+            colBlocks[permutedColInds[j]] = j/blockSize
+            
+        #Count the nonzeros in each row of each block 
+        for i in range(m): 
+            for ind in range(indPtr[i], indPtr[i+1]): 
+                blockIndPtrs[colBlocks[colInds[ind]], i+1] += 1
+        
+        for b in range(numBlocks): 
+            for i in range(m): 
+                blockIndPtrs[b, i+1] += blockIndPtrs[b, i]
+            blockStarts[b+1] = blockStarts[b] + blockIndPtrs[b, m]
+        
+        #Now scatter the column indices into place, row by row 
+        blockPtrs = blockStarts[0:numBlocks].copy()
+        for i in range(m): 
+            for ind in range(indPtr[i], indPtr[i+1]): 
+                b = colBlocks[colInds[ind]]
+                blockColInds[blockPtrs[b]] = colInds[ind]
+                blockPtrs[b] += 1
+        
+        omegasList = []
+        for b in range(numBlocks): 
+            omegasList.append((blockIndPtrs[b, :], blockColInds[blockStarts[b]:blockStarts[b+1]]))
+        
+        return omegasList
+    
     @staticmethod
     def centerRowsCsarray(X):
         """
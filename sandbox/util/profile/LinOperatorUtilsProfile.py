@@ -7,6 +7,7 @@ from sandbox.util.Sampling import Sampling
 from sandbox.util.ProfileUtils import ProfileUtils
 from exp.util.SparseUtils import SparseUtils
 from exp.util.LinOperatorUtils import LinOperatorUtils
+from sandbox.util.SparseResidualOperator import SparseResidualOperator
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
@@ -76,9 +77,27 @@ class LinOperatorUtilsProfile(object):
                 L.matmat(W)
         
         ProfileUtils.profile('run()', globals(), locals())
+
+    def profileSparseResidualOp(self):
+        #One iteration of SoftImpute: update the residual then multiply 
+        p = 300
+        U = numpy.random.rand(self.X.shape[0], self.r)
+        s = numpy.random.rand(self.r)
+        V = numpy.random.rand(self.X.shape[1], self.r)
+        W = numpy.random.rand(self.X.shape[1], p)
+        L = SparseResidualOperator(self.X)
+        
+        def run(): 
+            numRuns = 1 
+            for i in range(numRuns): 
+                L.update(U, s, V)
+                L.asLinearOperator().matmat(W)
+        
+        ProfileUtils.profile('run()', globals(), locals())
    
 if __name__ == '__main__':     
     profiler = LinOperatorUtilsProfile()
     #An advantage to be parallel when nnz > 10^8 
     #profiler.profileAsLinearOperator2() #42s 
     profiler.profileParallelSparseOp2() #37s
+    #profiler.profileSparseResidualOp()
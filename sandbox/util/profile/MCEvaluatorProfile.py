@@ -31,8 +31,39 @@ class MCEvaluatorProfile(object):
         
         ProfileUtils.profile("MCEvaluator.precisionAtK(X, U, V, 10)", globals(), locals())
         
+    def profileRecommendAtk(self): 
+        m = 100000 
+        n = 20000 
+        k = 64 
+        U = numpy.random.rand(m, k)
+        V = numpy.random.rand(n, k)
+        
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), 10, csarray=True)
+        omegaList = SparseUtils.getOmegaListPtr(X)
+        
+        ProfileUtils.profile("MCEvaluator.recommendAtk(U, V, 20, omegaList=omegaList)", globals(), locals())
+
+    def profileRankingMetricsAtK(self): 
+        m = 100000 
+        n = 20000 
+        ks = [1, 3, 5, 10, 20]
+        
+        X = SparseUtils.generateSparseBinaryMatrix((m, n), 10, csarray=True)
+        positiveArray = SparseUtils.getOmegaListPtr(X)
+        orderedItems = numpy.array(numpy.argsort(numpy.random.rand(m, 200), 1)[:, 0:20], numpy.int32)
+        
+        def separateMetrics(): 
+            for k in ks: 
+                MCEvaluator.f1AtK(positiveArray, orderedItems, k)
+                MCEvaluator.mrrAtK(positiveArray, orderedItems, k)
+        
+        ProfileUtils.profile("separateMetrics()", globals(), locals())
+        ProfileUtils.profile("MCEvaluator.rankingMetricsAtK(positiveArray, orderedItems, ks)", globals(), locals())
+
         
         
 
 profiler = MCEvaluatorProfile()
-profiler.profilePrecisionAtK()
\ No newline at end of file
+profiler.profilePrecisionAtK()
+#profiler.profileRecommendAtk()
+#profiler.profileRankingMetricsAtK()
\ No newline at end of file
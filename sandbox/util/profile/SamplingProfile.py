@@ -23,6 +23,19 @@ class SamplingProfile(object):
 
         ProfileUtils.profile('Sampling.shuffleSplitRows(X, k2, testSize)', globals(), locals())
         
+    def profileShuffleSplitRowsPtr(self):
+        #About 50M nonzero elements 
+        m = 1000000
+        n = 100000
+        counts = numpy.random.poisson(50, m)
+        indPtr = numpy.array(numpy.r_[0, numpy.cumsum(counts)], numpy.uint32)
+        colInds = numpy.array(numpy.random.randint(0, n, indPtr[-1]), numpy.uint32)
+
+        k2 = 3
+        testSize = 5
+
+        ProfileUtils.profile('Sampling.shuffleSplitRowsPtr(indPtr, colInds, k2, testSize)', globals(), locals())
+        
     def profileSampleUsers(self): 
         m = 10000
         n = 50000
@@ -40,4 +53,5 @@ class SamplingProfile(object):
 if __name__ == '__main__':     
     profiler = SamplingProfile()
     #profiler.profileShuffleSplitRows() 
+    #profiler.profileShuffleSplitRowsPtr() 
     profiler.profileSampleUsers() 
\ No newline at end of file
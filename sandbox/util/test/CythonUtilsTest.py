@@ -1,7 +1,7 @@
 import unittest
 import numpy
 import numpy.testing as nptst
-from sandbox.util.CythonUtils import inverseChoicePy, inverseChoiceArrayPy, choicePy, dotPy
+from sandbox.util.CythonUtils import inverseChoicePy, inverseChoiceArrayPy, choicePy, dotPy, aliasTable, aliasChoicePy, seedRandom, getRandomState, setRandomState
 
 class  CythonUtilsTest(unittest.TestCase):
     def testInverseChoicePy(self):
@@ -67,6 +67,46 @@ class  CythonUtilsTest(unittest.TestCase):
         for i in range(m): 
             for j in range(n): 
                 self.assertAlmostEquals(U[i, :].dot(V[j, :]), dotPy(U, i, V, j, k))
+
+
+    def testAliasChoicePy(self): 
+        probs = numpy.array([0.1, 0.0, 0.5, 0.15, 0.25])
+        aliasProbs, aliases = aliasTable(probs)
+        
+        runs = 100000
+        sample = aliasChoicePy(aliasProbs, aliases, runs)
+        nptst.assert_array_almost_equal(numpy.bincount(sample, minlength=probs.shape[0])/float(runs), probs, 2)
+        
+        #Unnormalised weights give the same distribution 
+        aliasProbs2, aliases2 = aliasTable(probs*10)
+        nptst.assert_array_almost_equal(aliasProbs, aliasProbs2)
+        nptst.assert_array_equal(aliases, aliases2)
+        
+        #A single item 
+        aliasProbs, aliases = aliasTable(numpy.array([2.0]))
+        nptst.assert_array_equal(aliasChoicePy(aliasProbs, aliases, 10), numpy.zeros(10))
+
+    def testSeedRandom(self): 
+        n = 100
+        a = numpy.array(numpy.random.choice(n, 50, replace=False), numpy.uint32)
+        aliasProbs, aliases = aliasTable(numpy.random.rand(n))
+        
+        seedRandom(21)
+        sample1 = [inverseChoicePy(a, n) for i in range(100)]
+        sample2 = aliasChoicePy(aliasProbs, aliases, 100)
+        
+        seedRandom(21)
+        nptst.assert_array_equal(sample1, [inverseChoicePy(a, n) for i in range(100)])
+        nptst.assert_array_equal(sample2, aliasChoicePy(aliasProbs, aliases, 100))
+        
+        seedRandom(22)
+        self.assertFalse((sample2 == aliasChoicePy(aliasProbs, aliases, 100)).all())
+        
+        #Restoring a saved state repeats the stream 
+        state = getRandomState()
+        sample1 = aliasChoicePy(aliasProbs, aliases, 100)
+        setRandomState(state)
+        nptst.assert_array_equal(sample1, aliasChoicePy(aliasProbs, aliases, 100))
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
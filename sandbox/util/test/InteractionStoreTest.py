@@ -0,0 +1,90 @@
+import os
+import sys
+import pickle
+import shutil
+import logging
+import tempfile
+import unittest
+import numpy
+import scipy.sparse
+import numpy.testing as nptst
+from sandbox.util.InteractionStore import InteractionStore
+from sandbox.util.SparseUtils import SparseUtils
+
+class InteractionStoreTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.random.seed(21)
+        self.tempDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tempDir, "X.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def testWrite(self):
+        m = 30
+        n = 20
+        X = scipy.sparse.rand(m, n, 0.2, format="csc")
+        rowIds = numpy.random.permutation(1000)[0:m]
+        colIds = numpy.arange(n)*3
+
+        store = InteractionStore.write(self.fileName, X, rowIds, colIds)
+        self.assertEquals(store.shape, (m, n))
+        self.assertEquals(store.nnz, X.nnz)
+        self.assertTrue(isinstance(store.indPtr, numpy.memmap))
+        self.assertEquals(store.indPtr.dtype, numpy.uint32)
+        self.assertEquals(store.colInds.dtype, numpy.uint32)
+        self.assertEquals(store.indPtr.ctypes.data % InteractionStore.ALIGNMENT, 0)
+
+        nptst.assert_array_equal(store.toScipyCsr().toarray(), X.toarray())
+        nptst.assert_array_equal(store.toScipyCsc().toarray(), X.toarray())
+
+        indPtr, colInds = SparseUtils.getOmegaListPtr(X)
+        nptst.assert_array_equal(store.indPtr, indPtr)
+        nptst.assert_array_equal(store.colInds, colInds)
+        self.assertTrue(SparseUtils.getOmegaListPtr(store)[1] is store.colInds)
+
+        indPtrT, rowInds = SparseUtils.getOmegaListPtr(X.T)
+        nptst.assert_array_equal(store.omegaListPtrT()[0], indPtrT)
+        nptst.assert_array_equal(store.omegaListPtrT()[1], rowInds)
+
+        #The ids map back to the rows and columns
+        nptst.assert_array_equal(store.translateRows(rowIds[[3, 0, 7]]), [3, 0, 7])
+        nptst.assert_array_equal(store.translateCols([57, 0]), [19, 0])
+        self.assertRaises(KeyError, store.translateCols, [1])
+        self.assertRaises(KeyError, InteractionStore.translate, numpy.array([], numpy.int64), [1])
+
+        #The copy-on-write arrays can be changed without changing the file
+        store.colInds[0] = 0
+        nptst.assert_array_equal(InteractionStore(self.fileName).colInds, colInds)
+
+        #A pickled store is reopened from the file
+        store2 = pickle.loads(pickle.dumps(store))
+        self.assertTrue(isinstance(store2.colInds, numpy.memmap))
+        nptst.assert_array_equal(store2.colInds, colInds)
+
+    def testWriteNoValues(self):
+        X = scipy.sparse.lil_matrix((10, 8))
+        X[2, 3] = 2
+        X[7, 0] = 1
+        X[9, 7] = 0
+
+        store = InteractionStore.write(self.fileName, X, values=False)
+        self.assertEquals(store.nnz, 2)
+        self.assertEquals(store.vals, None)
+        self.assertEquals(store.rowIds, None)
+        nptst.assert_array_equal(store.toScipyCsr().toarray(), X.toarray() != 0)
+        self.assertRaises(ValueError, store.translateRows, [0])
+
+        store = InteractionStore.write(self.fileName, scipy.sparse.csr_matrix((5, 4)))
+        self.assertEquals(store.nnz, 0)
+        nptst.assert_array_equal(store.indPtr, numpy.zeros(6))
+
+        self.assertRaises(ValueError, InteractionStore.write, self.fileName, X, rowIds=numpy.arange(3))
+
+        with open(self.fileName, "wb") as fileObj:
+            fileObj.write(b"not a store")
+        self.assertRaises(ValueError, InteractionStore, self.fileName)
+
+if __name__ == "__main__":
+    unittest.main()
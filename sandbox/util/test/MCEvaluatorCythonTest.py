@@ -56,6 +56,38 @@ class  MCEvaluatorCythonTest(unittest.TestCase):
         
         nptst.assert_array_equal(orderedItems, orderedItems2)
 
+
+    def testRecommendAtkPtr(self): 
+        m = 30 
+        n = 20 
+        r = 3
+        U = numpy.random.randn(m, r)
+        V = numpy.random.randn(n, r)
+        Z = U.dot(V.T)
+        
+        omegaList = []
+        for i in range(m): 
+            omegaList.append(numpy.sort(numpy.random.permutation(n)[0:5]))
+        
+        indPtr = numpy.array(numpy.r_[0, numpy.cumsum([5]*m)], numpy.uint32)
+        colInds = numpy.array(numpy.concatenate(omegaList), numpy.uint32)
+        
+        for blockSize in [1, 7, 1000]: 
+            k = 10
+            orderedItems, scores = MCEvaluatorCython.recommendAtkPtr(U, V, k, indPtr, colInds, blockSize)
+            
+            for i in range(m): 
+                Zi = Z[i, :].copy()
+                Zi[omegaList[i]] = -numpy.inf
+                inds = numpy.argsort(-Zi)[0:k]
+                nptst.assert_array_equal(orderedItems[i, :], inds)
+                nptst.assert_array_almost_equal(scores[i, :], Zi[inds])
+        
+        #Ask for more items than there are so the rows are padded 
+        k = n
+        orderedItems, scores = MCEvaluatorCython.recommendAtkPtr(U, V, k, indPtr, colInds)
+        nptst.assert_array_equal(orderedItems[:, n-5:], -1)
+        self.assertTrue((orderedItems[:, 0:n-5] >= 0).all())
             
     def testReciprocalRankAtk(self): 
         m = 20 
@@ -96,6 +128,41 @@ class  MCEvaluatorCythonTest(unittest.TestCase):
         rrs = MCEvaluatorCython.reciprocalRankAtk(indPtr, colInds, orderedItems)
         nptst.assert_array_equal(rrs, numpy.ones(m)*0.5)     
             
+    def testRankingMetricsAtk(self): 
+        m = 30 
+        n = 50 
+        maxK = 8 
+        
+        orderedItems = numpy.zeros((m, maxK), numpy.int32)
+        omegaList = []
+        for i in range(m): 
+            orderedItems[i, :] = numpy.random.permutation(n)[0:maxK]
+            omegaList.append(numpy.sort(numpy.random.permutation(n)[0:numpy.random.randint(0, 10)]))
+        orderedItems[0, -2:] = -1 
+        
+        indPtr = numpy.array(numpy.r_[0, numpy.cumsum([len(omegai) for omegai in omegaList])], numpy.uint32)
+        colInds = numpy.array(numpy.concatenate(omegaList), numpy.uint32)
+        
+        ks = [5, 1, 8]
+        precisions, recalls, f1s, rrs, ndcgs = MCEvaluatorCython.rankingMetricsAtk(indPtr, colInds, orderedItems, ks)
+        self.assertEquals(precisions.shape, (m, len(ks)))
+        
+        for j, k in enumerate(ks): 
+            nptst.assert_array_almost_equal(precisions[:, j], MCEvaluatorCython.precisionAtk(indPtr, colInds, orderedItems[:, 0:k]))
+            nptst.assert_array_almost_equal(recalls[:, j], MCEvaluatorCython.recallAtk(indPtr, colInds, orderedItems[:, 0:k]))
+            nptst.assert_array_almost_equal(rrs[:, j], MCEvaluatorCython.reciprocalRankAtk(indPtr, colInds, orderedItems[:, 0:k]))
+            
+            denominator = precisions[:, j] + recalls[:, j]
+            denominator += denominator == 0
+            nptst.assert_array_almost_equal(f1s[:, j], 2*precisions[:, j]*recalls[:, j]/denominator)
+            
+            for i in range(m): 
+                discounts = 1/numpy.log2(numpy.arange(k)+2)
+                dcg = (numpy.in1d(orderedItems[i, 0:k], omegaList[i])*discounts).sum()
+                idcg = discounts[0:min(k, omegaList[i].shape[0])].sum()
+                ndcg = dcg/idcg if idcg != 0 else 0
+                self.assertAlmostEquals(ndcgs[i, j], ndcg)
+            
     def testStratifiedRecallAtk(self): 
         m = 20 
         n = 50 
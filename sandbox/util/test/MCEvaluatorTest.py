@@ -6,8 +6,11 @@ import sklearn.metrics
 import numpy.testing as nptst 
 from sandbox.util.MCEvaluator import MCEvaluator
 from sandbox.util.SparseUtils import SparseUtils
+from sandbox.util.SparseUtilsCython import SparseUtilsCython
+from sandbox.util.CythonUtils import seedRandom
 from sandbox.util.Util import Util 
 from sandbox.util.Sampling import Sampling 
+from sandbox.util.PathDefaults import PathDefaults
 
 class  MCEvaluatorTest(unittest.TestCase):
     def setUp(self): 
@@ -76,6 +79,72 @@ class  MCEvaluatorTest(unittest.TestCase):
             items = numpy.intersect1d(items, orderedItems2[i, :])
             nptst.assert_array_equal(items, numpy.sort(orderedItems2[i, :]))
         
+
+    def testRecommendAtkIter(self): 
+        m = 25 
+        n = 50 
+        k = 10
+        U = numpy.random.rand(m, 3)
+        V = numpy.random.rand(n, 3)
+        
+        omegaList = []
+        for i in range(m): 
+            omegaList.append(numpy.random.permutation(n)[0:5])
+        
+        orderedItems, scores = MCEvaluator.recommendAtk(U, V, k, omegaList=omegaList, verbose=True)
+        
+        blockSize = 7
+        orderedItems2 = numpy.zeros((0, k), numpy.int32)
+        scores2 = numpy.zeros((0, k))
+        for userBlock, blockItems, blockScores in MCEvaluator.recommendAtkIter(U, V, k, blockSize, omegaList): 
+            self.assertTrue(userBlock.shape[0] <= blockSize)
+            nptst.assert_array_equal(userBlock, numpy.arange(orderedItems2.shape[0], orderedItems2.shape[0]+userBlock.shape[0]))
+            orderedItems2 = numpy.r_[orderedItems2, blockItems]
+            scores2 = numpy.r_[scores2, blockScores]
+            
+        nptst.assert_array_equal(orderedItems, orderedItems2)
+        nptst.assert_array_almost_equal(scores, scores2)
+        
+        fileName = PathDefaults.getTempDir() + "recommendAtk"
+        itemsFileName, scoresFileName = MCEvaluator.recommendAtkToFile(U, V, k, fileName, blockSize, omegaList)
+        nptst.assert_array_equal(orderedItems, numpy.load(itemsFileName, mmap_mode="r"))
+        nptst.assert_array_almost_equal(scores, numpy.load(scoresFileName, mmap_mode="r"))
+        
+        
+    def testRecommendAtkFloat32(self): 
+        m = 30 
+        n = 50 
+        k = 10
+        U = numpy.random.rand(m, 5)
+        V = numpy.random.rand(n, 5)
+        
+        omegaList = []
+        for i in range(m): 
+            omegaList.append(numpy.random.permutation(n)[0:5])
+        
+        orderedItems, scores = MCEvaluator.recommendAtk(U, V, k, omegaList=omegaList, verbose=True)
+        orderedItems2, scores2 = MCEvaluator.recommendAtk(numpy.array(U, numpy.float32), numpy.array(V, numpy.float32), k, omegaList=omegaList, verbose=True)
+        
+        self.assertEquals(scores2.dtype, numpy.float32)
+        nptst.assert_array_almost_equal(scores, scores2, 5)
+        
+        #Items can only differ where the scores are within rounding error 
+        for i in range(m): 
+            if (numpy.diff(scores[i, :]) < -10**-5).all(): 
+                nptst.assert_array_equal(orderedItems[i, :], orderedItems2[i, :])
+        
+        #Mixed types are scored in double precision 
+        orderedItems3, scores3 = MCEvaluator.recommendAtk(numpy.array(U, numpy.float32), V, k, omegaList=omegaList, verbose=True)
+        self.assertEquals(scores3.dtype, numpy.float64)
+        
+        #The local AUC uses the same samples for both types 
+        X = scipy.sparse.rand(m, n, 0.2, "csr")
+        r = SparseUtilsCython.computeR(U, V, 0.5, n)
+        seedRandom(21)
+        localAuc = MCEvaluator.localAUCApprox(X, U, V, 0.5, 50, r)
+        seedRandom(21)
+        localAuc2 = MCEvaluator.localAUCApprox(X, numpy.array(U, numpy.float32), numpy.array(V, numpy.float32), 0.5, 50, r)
+        self.assertAlmostEquals(localAuc, localAuc2, 2)
         
     def testPrecisionAtK(self): 
         m = 10 
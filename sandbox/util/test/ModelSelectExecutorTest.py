@@ -0,0 +1,104 @@
+import unittest
+import numpy
+import scipy.sparse 
+import numpy.testing as nptst 
+from sandbox.util.ModelSelectExecutor import ModelSelectExecutor
+
+def computeSum(args): 
+    X, y, learner = args 
+    return X.sum()*learner.alpha + y.sum()*learner.beta 
+
+def computeStateSum(args): 
+    X, learner = args 
+    return learner.U.sum() + learner.V.sum() 
+
+class DummyLearner(object): 
+    def __init__(self): 
+        self.alpha = 1.0 
+        self.beta = 1.0 
+        
+    def setBeta(self, beta): 
+        self.beta = beta 
+        
+    def copy(self): 
+        learner = DummyLearner()
+        learner.alpha = self.alpha 
+        learner.beta = self.beta 
+        return learner 
+
+class ModelSelectExecutorTest(unittest.TestCase):
+    def setUp(self): 
+        numpy.random.seed(21)
+    
+    def testShare(self): 
+        X = numpy.random.rand(5, 3)
+        nptst.assert_array_equal(ModelSelectExecutor.unshare(ModelSelectExecutor.share(X)), X)
+        
+        Y = scipy.sparse.rand(10, 8, 0.3, format="csr")
+        Y2 = ModelSelectExecutor.unshare(ModelSelectExecutor.share(Y))
+        self.assertEquals(Y2.format, "csr")
+        nptst.assert_array_equal(Y2.toarray(), Y.toarray())
+        
+        Y = scipy.sparse.rand(10, 8, 0.3, format="coo")
+        Y2 = ModelSelectExecutor.unshare(ModelSelectExecutor.share(Y))
+        nptst.assert_array_equal(Y2.toarray(), Y.toarray())
+        
+    def testMap(self): 
+        folds = [(scipy.sparse.rand(10, 8, 0.3, format="csc"), numpy.random.rand(10)) for i in range(3)]
+        
+        for numProcesses in [1, 2]: 
+            executor = ModelSelectExecutor(DummyLearner(), numProcesses)
+            foldInds = [executor.addFold(X, y) for X, y in folds]
+            
+            tasks = []
+            results = []
+            for foldInd in foldInds: 
+                for alpha in [0.5, 2.0]: 
+                    tasks.append((foldInd, {"alpha": alpha, "setBeta": 3.0}))
+                    X, y = folds[foldInd]
+                    results.append(X.sum()*alpha + y.sum()*3.0)
+            
+            nptst.assert_array_almost_equal(executor.map(computeSum, tasks), results)
+            executor.close()
+            
+    def testGetFold(self): 
+        X = scipy.sparse.rand(10, 8, 0.3, format="csr")
+        executor = ModelSelectExecutor(DummyLearner())
+        
+        try: 
+            foldInd = executor.addFold(X)
+            
+            #A fold is rebuilt once and then reused 
+            X2 = executor.getFold(foldInd)[0]
+            nptst.assert_array_equal(X2.toarray(), X.toarray())
+            self.assertTrue(executor.getFold(foldInd)[0] is X2)
+        finally: 
+            executor.close()
+            
+        self.assertEquals(executor.foldCache, {})
+        
+    def testAddState(self): 
+        X = scipy.sparse.rand(10, 8, 0.3, format="csr")
+        states = [(numpy.random.rand(10, 3), numpy.random.rand(8, 3)) for i in range(3)]
+        
+        for numProcesses in [1, 2]: 
+            executor = ModelSelectExecutor(DummyLearner(), numProcesses)
+            
+            try: 
+                foldInd = executor.addFold(X)
+                stateInds = [executor.addState(U=U, V=V) for U, V in states]
+                nptst.assert_array_equal(stateInds, numpy.arange(3))
+                
+                tasks = [(foldInd, {"stateInd": stateInd}) for stateInd in stateInds]
+                results = [U.sum() + V.sum() for U, V in states]
+                nptst.assert_array_almost_equal(executor.map(computeStateSum, tasks), results)
+                
+                executor.clearStates()
+                self.assertEquals(executor.addState(U=states[0][0], V=states[0][1]), 0)
+            finally: 
+                executor.close()
+                
+            self.assertEquals(executor.states, [])
+        
+if __name__ == '__main__':
+    unittest.main()
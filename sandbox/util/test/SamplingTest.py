@@ -1,6 +1,7 @@
 
 import unittest
 import numpy 
+import scipy.sparse 
 import numpy.testing as nptst 
 from sandbox.util.Sampling import Sampling 
 from sandbox.util.SparseUtils import SparseUtils 
@@ -232,6 +233,46 @@ class  SamplingTest(unittest.TestCase):
 
         nptst.assert_array_equal(trainTestXs[0][0].toarray(), trainTestXs2[0][0].toarray())
         nptst.assert_array_equal(trainTestXs[0][1].toarray(), trainTestXs2[0][1].toarray())
+        
+        #A scipy matrix with unsorted indices is split but not changed 
+        Y = scipy.sparse.csr_matrix((numpy.ones(4), numpy.array([2, 0, 1, 0]), numpy.array([0, 2, 4])), shape=(2, 3))
+        colInds = Y.indices.copy()
+        trainTestXs = Sampling.shuffleSplitRows(Y, 1, 1, csarray=False)
+        nptst.assert_array_equal(Y.indices, colInds)
+        self.assertFalse(Y.has_sorted_indices)
+        nptst.assert_array_equal((trainTestXs[0][0] + trainTestXs[0][1]).toarray(), Y.toarray())
+
+    def testShuffleSplitRowsPtr(self): 
+        m = 20
+        n = 30
+        numpy.random.seed(21)
+        
+        X = numpy.random.rand(m, n) < 0.5
+        X[0, :] = 0 
+        indPtr = numpy.array(numpy.r_[0, numpy.cumsum(X.sum(1))], numpy.uint32)
+        colInds = numpy.array(numpy.nonzero(X)[1], numpy.uint32)
+        
+        k2 = 3 
+        testSize = 2
+        numRows = 10 
+        trainTestList = Sampling.shuffleSplitRowsPtr(indPtr, colInds, k2, testSize, numRows=numRows)
+        self.assertEquals(len(trainTestList), k2)
+        
+        for trainIndPtr, trainColInds, testIndPtr, testColInds, rowSample in trainTestList: 
+            self.assertEquals(rowSample.shape[0], numRows)
+            self.assertEquals(trainIndPtr[-1] + testIndPtr[-1], indPtr[-1])
+            
+            for i in range(m): 
+                omegai = colInds[indPtr[i]:indPtr[i+1]]
+                trainOmegai = trainColInds[trainIndPtr[i]:trainIndPtr[i+1]]
+                testOmegai = testColInds[testIndPtr[i]:testIndPtr[i+1]]
+                
+                nptst.assert_array_equal(numpy.sort(numpy.r_[trainOmegai, testOmegai]), omegai)
+                
+                if i in rowSample: 
+                    self.assertEquals(testOmegai.shape[0], min(testSize, omegai.shape[0]))
+                else: 
+                    self.assertEquals(testOmegai.shape[0], 0)
 
     def testSampleUsers(self): 
         m = 10
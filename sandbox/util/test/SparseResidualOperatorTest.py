@@ -0,0 +1,97 @@
+import sys
+import logging
+import unittest
+import numpy
+import scipy.sparse
+import numpy.testing as nptst
+from sandbox.util.SparseResidualOperator import SparseResidualOperator
+from sandbox.util.SparseUtils import SparseUtils
+
+class SparseResidualOperatorTest(unittest.TestCase):
+    def setUp(self):
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+        numpy.set_printoptions(precision=4, suppress=True, linewidth=150)
+        numpy.random.seed(21)
+
+    def testProducts(self):
+        m = 30
+        n = 20
+        k = 4
+        X = scipy.sparse.rand(m, n, 0.2, format="csc")
+        Xd = numpy.array(X.todense())
+        mask = Xd != 0
+
+        L = SparseResidualOperator(X)
+
+        for dtype in [numpy.float64, numpy.float32]:
+            for i in range(2):
+                U = numpy.array(numpy.random.rand(m, k), dtype)
+                s = numpy.array(numpy.random.rand(k), dtype)
+                V = numpy.array(numpy.random.rand(n, k), dtype)
+                L.update(U, s, V)
+
+                Z = (U*s).dot(V.T)
+                Y = (Xd - Z)*mask
+                A = Y + Z
+
+                nptst.assert_array_almost_equal(L.residual().todense(), Y, 5)
+
+                W = numpy.random.rand(n, 3)
+                nptst.assert_array_almost_equal(L.matmat(W), A.dot(W), 5)
+                nptst.assert_array_almost_equal(L.residualMatmat(W), Y.dot(W), 5)
+                W = numpy.random.rand(m, 3)
+                nptst.assert_array_almost_equal(L.rmatmat(W), A.T.dot(W), 5)
+                nptst.assert_array_almost_equal(L.residualRmatmat(W), Y.T.dot(W), 5)
+
+                w = numpy.random.rand(n)
+                nptst.assert_array_almost_equal(L.matvec(w), A.dot(w), 5)
+                w = numpy.random.rand(m)
+                nptst.assert_array_almost_equal(L.rmatvec(w), A.T.dot(w), 5)
+
+        #The values are updated in place
+        vals = L.vals
+        L.update(U, s, V)
+        self.assertTrue(vals is L.vals)
+
+        self.assertRaises(ValueError, L.update, U[1:, :], s, V)
+
+    def testRowBlocks(self):
+        m = 25
+        n = 10
+        X = scipy.sparse.rand(m, n, 0.3, format="csc")
+        U = numpy.random.rand(m, 3)
+        s = numpy.random.rand(3)
+        V = numpy.random.rand(n, 3)
+
+        L = SparseResidualOperator(X)
+        L.update(U, s, V)
+        A = L.matmat(numpy.eye(n))
+
+        W = numpy.random.rand(n, 2)
+        blocks = list(L.rowBlocks(7))
+        self.assertEquals([B.shape[0] for B in blocks], [7, 7, 7, 4])
+        nptst.assert_array_almost_equal(numpy.vstack([B.matmat(W) for B in blocks]), A.dot(W))
+
+        W = numpy.random.rand(m, 2)
+        nptst.assert_array_almost_equal(sum(B.rmatmat(W[i*7:i*7+B.shape[0], :]) for i, B in enumerate(blocks)), A.T.dot(W))
+
+    def testEmptyRows(self):
+        m = 10
+        n = 8
+        X = scipy.sparse.lil_matrix((m, n))
+        X[2, 3] = 1.5
+        X[7, 0] = -2
+
+        L = SparseResidualOperator(X)
+        U = numpy.random.rand(m, 2)
+        s = numpy.ones(2)
+        V = numpy.random.rand(n, 2)
+        L.update(U, s, V)
+
+        Y = L.residual()
+        self.assertEquals(Y.nnz, 2)
+        self.assertAlmostEquals(Y[2, 3], 1.5 - U[2, :].dot(V[3, :]))
+        self.assertAlmostEquals(Y[7, 0], -2 - U[7, :].dot(V[0, :]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -72,6 +72,23 @@ class SparseUtilsCythonTest(unittest.TestCase):
             nptst.assert_almost_equal(X, Y)
         
 
+    def testPartialReconstructPQFloat32(self): 
+        m = 20 
+        n = 30 
+        P = numpy.random.randn(m, 5)
+        Q = numpy.random.randn(n, 5)
+        
+        A = scipy.sparse.rand(m, n, 0.2)
+        X = SparseUtilsCython.partialReconstructPQ(A.nonzero(), P, Q)
+        X2 = SparseUtilsCython.partialReconstructPQ(A.nonzero(), numpy.array(P, numpy.float32), numpy.array(Q, numpy.float32))
+        
+        self.assertEquals(X2.dtype, numpy.float32)
+        nptst.assert_array_almost_equal(X.toarray(), X2.toarray(), 5)
+        
+        r = SparseUtilsCython.computeR(numpy.array(P, numpy.float32), numpy.array(Q, numpy.float32), 0.5, 10)
+        self.assertEquals(r.dtype, numpy.float)
+        self.assertEquals(r.shape[0], m)
+
     def testPartialOuterProduct(self):
         m = 15        
         n = 10
@@ -236,5 +253,31 @@ class SparseUtilsCythonTest(unittest.TestCase):
         self.assertAlmostEqual(X.nnz/float(m*n), density, 2)
         self.assertEquals(X.shape, (m, n))
 
+    def testPartitionOmega(self): 
+        m = 50 
+        n = 30 
+        density = 0.2
+        X = scipy.sparse.rand(m, n, density, format="csr")
+        X.data[:] = 1
+        X.sort_indices()
+        
+        indPtr = numpy.array(X.indptr, numpy.uint32)
+        colInds = numpy.array(X.indices, numpy.uint32)
+        
+        for numBlocks in [1, 3, 4, 7]: 
+            permutedColInds = numpy.array(numpy.random.permutation(n), numpy.uint32)
+            omegasList = SparseUtilsCython.partitionOmega(indPtr, colInds, permutedColInds, numBlocks)
+            blockSize = int(numpy.ceil(float(n)/numBlocks))
+            
+            self.assertEquals(len(omegasList), numBlocks)
+            self.assertEquals(sum([blockColInds.shape[0] for blockIndPtr, blockColInds in omegasList]), colInds.shape[0])
+            
+            for b, (blockIndPtr, blockColInds) in enumerate(omegasList): 
+                blockCols = permutedColInds[b*blockSize:(b+1)*blockSize]
+                
+                for i in range(m): 
+                    omegai = colInds[indPtr[i]:indPtr[i+1]]
+                    nptst.assert_array_equal(blockColInds[blockIndPtr[i]:blockIndPtr[i+1]], omegai[numpy.in1d(omegai, blockCols)])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -197,7 +197,42 @@ class SparseUtilsCythonTest(unittest.TestCase):
         nptst.assert_array_almost_equal(numpy.abs(U), numpy.abs(U2[:, 0:k2]), 3)
         nptst.assert_array_almost_equal(numpy.abs(V), numpy.abs(V2[:, 0:k2]), 3)
         
-    def testCentreRows(self): 
+    def testSpectralNorm(self):
+        shape = (500, 100)
+        r = 5
+        k = 1000
+
+        X = SparseUtils.generateSparseLowRank(shape, r, k)
+        s2 = numpy.linalg.norm(X.todense(), 2)
+
+        s, v = SparseUtils.spectralNorm(X)
+        self.assertAlmostEquals(s, s2)
+
+        #Warm start on a perturbed matrix, and on a matrix with more columns
+        Y = X.copy()
+        Y.data += numpy.random.randn(Y.nnz)*0.01
+        s, v2 = SparseUtils.spectralNorm(Y, v)
+        self.assertAlmostEquals(s, numpy.linalg.norm(Y.todense(), 2), 4)
+
+        Y = scipy.sparse.hstack([X, X[:, 0:10]]).tocsc()
+        s, v2 = SparseUtils.spectralNorm(Y, v)
+        self.assertAlmostEquals(s, numpy.linalg.norm(Y.todense(), 2), 4)
+        self.assertEquals(v2.shape[0], Y.shape[1])
+
+        #A warm start mixing two close singular vectors changes s slowly, so it
+        #falls back to ARPACK rather than stopping early
+        Y = scipy.sparse.csc_matrix(numpy.diag(numpy.r_[10, 9.99, numpy.ones(8)]))
+        v = numpy.r_[1, 1, numpy.zeros(8)]
+        s, v2 = SparseUtils.spectralNorm(Y, v)
+        self.assertAlmostEquals(s, 10)
+        self.assertAlmostEquals(abs(v2[0]), 1)
+
+        #Integer matrices are fine
+        Y = scipy.sparse.csc_matrix(numpy.array([[1, 0], [0, 3]]))
+        self.assertAlmostEquals(SparseUtils.spectralNorm(Y)[0], 3)
+        self.assertAlmostEquals(SparseUtils.spectralNorm(Y, numpy.ones(2))[0], 3)
+
+    def testCentreRows(self):
         shape = (50, 10)
         r = 5 
         k = 100 
@@ -6,14 +6,19 @@ from Cython.Distutils import build_ext
 
 ext_modules = [Extension("sandbox.predictors.TreeCriterion", ["sandbox/predictors/TreeCriterion.pyx"]),
     Extension("sandbox.util.SparseUtilsCython", ["sandbox/util/SparseUtilsCython.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),
-    Extension("sandbox.recommendation.SGDNorm2RegCython", ["sandbox/recommendation/SGDNorm2RegCython.pyx"], include_dirs=[numpy.get_include()]), 
+    Extension("sandbox.recommendation.SGDNorm2RegCython", ["sandbox/recommendation/SGDNorm2RegCython.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-fopenmp"], extra_link_args=["-fopenmp"]), 
     Extension("sandbox.util.CythonUtils", ["sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]), 
+    Extension("sandbox.recommendation.MaxAUCKernels", ["sandbox/recommendation/MaxAUCKernels.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),
+    Extension("sandbox.recommendation.BprKernels", ["sandbox/recommendation/BprKernels.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", "-fopenmp"], extra_link_args=["-fopenmp"]),
+    Extension("sandbox.recommendation.WeightedMfKernels", ["sandbox/recommendation/WeightedMfKernels.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", "-fopenmp"], extra_link_args=["-fopenmp"]),
+    Extension("sandbox.recommendation.KNNKernels", ["sandbox/recommendation/KNNKernels.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", "-fopenmp"], extra_link_args=["-fopenmp"]),
     Extension("sandbox.recommendation.MaxAUCTanh", ["sandbox/recommendation/MaxAUCTanh.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),
     Extension("sandbox.recommendation.MaxAUCHinge", ["sandbox/recommendation/MaxAUCHinge.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),
     Extension("sandbox.recommendation.MaxAUCSquare", ["sandbox/recommendation/MaxAUCSquare.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),
     Extension("sandbox.recommendation.MaxAUCLogistic", ["sandbox/recommendation/MaxAUCLogistic.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]), 
     Extension("sandbox.recommendation.MaxAUCSigmoid", ["sandbox/recommendation/MaxAUCSigmoid.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]),    
-    Extension("sandbox.util.MCEvaluatorCython", ["sandbox/util/MCEvaluatorCython.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", ]), 
+    Extension("sandbox.util.MCEvaluatorCython", ["sandbox/util/MCEvaluatorCython.pyx", "sandbox/util/CythonUtils.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", "-fopenmp"], extra_link_args=["-fopenmp"]), 
+    Extension("sandbox.util.SparseResidualCython", ["sandbox/util/SparseResidualCython.pyx"], include_dirs=[numpy.get_include()], extra_compile_args=["-O3", "-fopenmp"], extra_link_args=["-fopenmp"]), 
 ]
 
 setup(